@@ -1,16 +1,187 @@
 # audio_io.py
+import math
+import threading
 import sounddevice as sd
 import numpy as np
-from config import SAMPLE_RATE, BLOCK_SIZE, CHANNELS
+from audio_source import AudioSource
+from resample import AudioConverter
+from metrics import get_latency_metrics
+from config import (SAMPLE_RATE, BLOCK_SIZE, CHANNELS, AUDIO_RING_BUFFER_SECONDS, AUDIO_OVERFLOW_POLICY,
+                    AUDIO_CAPTURE_NATIVE_FORMAT, AUDIO_CAPTURE_MAX_CHANNELS)
 
-class AudioRecorder:
-    def __init__(self, device_id=None, sample_rate=SAMPLE_RATE, block_size=BLOCK_SIZE, channels=CHANNELS):
-        self.sample_rate = sample_rate
-        self.block_size = block_size
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest")
+# 记录最近多少个录音块的采集时间（用于把采样位置换算成采集时刻）
+CAPTURE_LOG_SIZE = 256
+
+
+class AudioRingBuffer:
+    """
+    预分配、固定容量的 int16 单生产者/单消费者环形缓冲区。
+
+    生产者（PortAudio 回调线程）只修改写位置，消费者只修改读位置，位置均为单调递增的绝对采样计数，
+    因此读写两端都不需要加锁，回调中也不会分配任何内存。
+
+    缓冲区满时的背压策略:
+      - "drop_oldest": 直接覆盖最旧的音频，消费者下次读取时跳过被覆盖的部分。
+      - "drop_newest": 保留尚未读取的音频，丢弃新到达的采样。
+    两种情况都会累加 overrun_count（溢出次数）和 dropped_samples（丢失的采样数）。
+    """
+
+    def __init__(self, capacity: int, overflow_policy: str = AUDIO_OVERFLOW_POLICY):
+        if capacity <= 0:
+            raise ValueError(f"Ring buffer capacity must be positive, got {capacity}.")
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}. Expected one of {OVERFLOW_POLICIES}.")
+        self.capacity = int(capacity)
+        self.overflow_policy = overflow_policy
+        self._data = np.zeros(self.capacity, dtype=np.int16)
+        # _reserve_pos 在拷贝前发布，_write_pos 在拷贝完成后发布；
+        # 消费者用 _reserve_pos 判断自己拷贝的数据是否在拷贝过程中被覆盖
+        self._reserve_pos = 0
+        self._write_pos = 0
+        self._read_pos = 0
+        self.overrun_count = 0
+        self.dropped_samples = 0
+
+    def write(self, samples: np.ndarray) -> int:
+        """写入一维 int16 采样（可以是 indata 的视图），返回实际写入的采样数。仅由生产者调用。"""
+        n = len(samples)
+        if n == 0:
+            return 0
+        write_pos = self._write_pos
+
+        if self.overflow_policy == "drop_newest":
+            free = self.capacity - (write_pos - self._read_pos)
+            if n > free:
+                self.overrun_count += 1
+                self.dropped_samples += n - free
+                samples = samples[:free]
+                n = free
+                if n == 0:
+                    return 0
+        elif n > self.capacity:
+            # 单个块就超过了容量，只有最后 capacity 个采样能留下来
+            write_pos += n - self.capacity
+            samples = samples[n - self.capacity:]
+            n = self.capacity
+
+        self._reserve_pos = write_pos + n
+        start = write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        if first < n:
+            self._data[:n - first] = samples[first:]
+        self._write_pos = write_pos + n
+        return n
+
+    def _sync_read_pos(self) -> int:
+        """drop_oldest 策略下，若生产者已覆盖未读数据，则把读位置推进到最旧的有效采样。"""
+        read_pos = self._read_pos
+        lag = self._write_pos - read_pos
+        if lag > self.capacity:
+            self.overrun_count += 1
+            self.dropped_samples += lag - self.capacity
+            read_pos = self._write_pos - self.capacity
+            self._read_pos = read_pos
+        return read_pos
+
+    def available(self) -> int:
+        """当前可读取的采样数。"""
+        return min(self._write_pos - self._read_pos, self.capacity)
+
+    def peek_views(self, max_frames: int = None):
+        """
+        以零拷贝方式返回未读数据的 numpy 视图（环绕时为两段）。
+        视图只在调用 consume() 之前有效；drop_oldest 策略下若消费者落后太多，视图内容可能被生产者覆盖。
+        """
+        read_pos = self._sync_read_pos()
+        n = self._write_pos - read_pos
+        if max_frames is not None:
+            n = min(n, max_frames)
+        if n <= 0:
+            return ()
+        start = read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        if first == n:
+            return (self._data[start:start + n],)
+        return self._data[start:], self._data[:n - first]
+
+    def consume(self, n: int):
+        """将读位置前移 n 个采样，配合 peek_views() 使用。"""
+        self._read_pos = min(self._read_pos + n, self._write_pos)
+
+    def read(self, max_frames: int = None):
+        """读取并移除未读数据，返回 int16 数组的拷贝；没有数据时返回 None。"""
+        views = self.peek_views(max_frames)
+        if not views:
+            return None
+        read_pos = self._read_pos
+        out = np.concatenate(views) if len(views) > 1 else views[0].copy()
+        # 拷贝过程中生产者可能覆盖了开头的一部分，丢弃这部分可能被撕裂的数据
+        torn = self._reserve_pos - self.capacity - read_pos
+        if torn > 0:
+            self.overrun_count += 1
+            self.dropped_samples += min(torn, len(out))
+            out = out[torn:]
+        self._read_pos = read_pos + len(views[0]) + (len(views[1]) if len(views) > 1 else 0)
+        return out if len(out) else None
+
+    def clear(self):
+        """丢弃所有未读数据。仅由消费者调用。"""
+        self._read_pos = self._write_pos
+
+    def reset(self):
+        """重置位置与计数器。只能在没有生产者写入时调用（例如录音流启动前）。"""
+        self._reserve_pos = self._write_pos = self._read_pos = 0
+        self.overrun_count = 0
+        self.dropped_samples = 0
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "available": self.available(),
+            "overrun_count": self.overrun_count,
+            "dropped_samples": self.dropped_samples,
+            "policy": self.overflow_policy,
+        }
+
+
+class AudioRecorder(AudioSource):
+    """
+    实时麦克风录音来源：PortAudio 回调把音频写进环形缓冲区，处理线程通过 read() 取出。
+    native_format=True 时以设备原生的采样率和声道数录音，环形缓冲区中保存原始的交错采样，
+    read() 中再降混并重采样为 sample_rate 单声道（见 resample.py），回调里不做任何转换。
+    """
+
+    def __init__(self, device_id=None, sample_rate=SAMPLE_RATE, block_size=BLOCK_SIZE, channels=CHANNELS,
+                 buffer_seconds=AUDIO_RING_BUFFER_SECONDS, overflow_policy=AUDIO_OVERFLOW_POLICY, clock=None,
+                 native_format=AUDIO_CAPTURE_NATIVE_FORMAT):
+        super().__init__(sample_rate, block_size, clock)
         self.channels = channels
         self.device_id = device_id
+        self.native_format = native_format
+        self.buffer_seconds = buffer_seconds
+        self.overflow_policy = overflow_policy
         self.stream = None
-        self._buffer = []
+        # 实际打开设备使用的格式，start_recording() 时确定
+        self.capture_rate = sample_rate
+        self.capture_channels = channels
+        self._converter = None
+        self._ring = AudioRingBuffer(int(buffer_seconds * sample_rate) * channels, overflow_policy)
+        # 预分配的 (块结束时对应的输出采样位置, clock.now()) 环形记录，回调中只做赋值
+        self._capture_log = np.zeros((CAPTURE_LOG_SIZE, 2), dtype=np.float64)
+        self._capture_count = 0
+        # 回调写入一个块后通知阻塞在 read() 上的处理线程
+        self._data_ready = threading.Condition()
+
+    def _capture_format(self):
+        """返回 (采样率, 声道数)：原生格式取设备的默认采样率和（不超过上限的）输入声道数。"""
+        if not self.native_format:
+            return self.sample_rate, self.channels
+        info = sd.query_devices(self.device_id, "input")
+        rate = int(info["default_samplerate"]) or self.sample_rate
+        channels = max(1, min(int(info["max_input_channels"]), AUDIO_CAPTURE_MAX_CHANNELS))
+        return rate, channels
 
     @staticmethod
     def list_audio_input_devices():
@@ -34,44 +205,112 @@ class AudioRecorder:
 
     def start_recording(self):
         """开始录音流"""
+        self._capture_count = 0
         try:
+            rate, channels = self._capture_format()
+            if (rate, channels) != (self.capture_rate, self.capture_channels) or self._ring.capacity % channels:
+                self._ring = AudioRingBuffer(int(self.buffer_seconds * rate) * channels, self.overflow_policy)
+            self.capture_rate, self.capture_channels = rate, channels
+            self._ring.reset()
+            self._converter = (AudioConverter(rate, channels, self.sample_rate)
+                               if (rate, channels) != (self.sample_rate, 1) else None)
             self.stream = sd.InputStream(
-                samplerate=self.sample_rate,
-                blocksize=self.block_size,
-                channels=self.channels,
+                samplerate=rate,
+                blocksize=max(1, round(self.block_size * rate / self.sample_rate)),
+                channels=channels,
                 dtype='int16',
                 callback=self._audio_callback,
                 device=self.device_id
             )
             self.stream.start()
             current_device_info = sd.query_devices(self.device_id) if self.device_id is not None else sd.query_devices(sd.default.device[0])
-            print(f"开始录音，设备: {current_device_info['name']}, 采样率: {self.sample_rate} Hz, 块大小: {self.block_size} 采样")
+            print(f"开始录音，设备: {current_device_info['name']}, 采样率: {rate} Hz, 声道: {channels}, "
+                  f"块大小: {self.block_size} 采样 (输出 {self.sample_rate} Hz 单声道)")
         except Exception as e:
             print(f"启动录音失败: {e}")
             self.stream = None
             raise
 
-    def _audio_callback(self, indata, frames, time, status):
+    def _audio_callback(self, indata, frames, time_info, status):
         """ sounddevice 回调函数，每当有音频数据可用时被调用 """
         if status:
             print(f"录音状态警告: {status}")
-        self._buffer.append(bytes(indata))
+        # indata 是回调缓冲区（交错存放的各声道），按原样拷进预分配的环形缓冲区，不产生新的音频数组
+        self._ring.write(indata.reshape(-1))
+        entry = self._capture_log[self._capture_count % CAPTURE_LOG_SIZE]
+        entry[0] = self._ring._write_pos / self.capture_channels * self.sample_rate / self.capture_rate
+        entry[1] = self.clock.now()
+        self._capture_count += 1
+        with self._data_ready:
+            self._data_ready.notify_all()
+
+    def capture_time(self, sample_position: int):
+        """
+        返回第 sample_position 个采样（从开始录音算起）被回调收到时的 clock.now()，用于延迟统计。
+        超出记录范围时返回最接近的记录；还没有任何记录时返回 None。
+        """
+        count = self._capture_count
+        if count == 0:
+            return None
+        oldest = max(0, count - CAPTURE_LOG_SIZE)
+        for i in range(oldest, count):
+            end_pos, captured_at = self._capture_log[i % CAPTURE_LOG_SIZE]
+            if end_pos >= sample_position:
+                return float(captured_at)
+        return float(self._capture_log[(count - 1) % CAPTURE_LOG_SIZE][1])
+
+    def read(self, timeout: float = None, max_frames: int = None, min_frames: int = 1):
+        """
+        取出缓冲区中所有未读的音频（至多约 max_frames 个输出采样），返回 sample_rate 单声道 int16。
+        未读音频不足 min_frames 时阻塞等待回调写入，最多等待 timeout 秒，超时返回 None；录音流停止后返回剩余的音频。
+        录音块大小可以任意，不必与 min_frames 对齐。
+        """
+        ratio = self.capture_rate / self.sample_rate
+        channels = self.capture_channels
+        raw_min = min(max(1, math.ceil(min_frames * ratio)) * channels, self._ring.capacity)
+        raw_max = None if max_frames is None else max(1, int(max_frames * ratio)) * channels
+        if self._ring.available() < raw_min:
+            with self._data_ready:
+                ready = self._data_ready.wait_for(
+                    lambda: self._ring.available() >= raw_min or self.stream is None, timeout)
+            if not ready:
+                return None
+        raw = self._ring.read(raw_max)
+        if raw is None or self._converter is None:
+            return raw
+        audio = self._converter.process(raw)
+        if not len(audio):
+            return None
+        return (np.clip(audio, -1.0, 32767 / 32768) * 32768).astype(np.int16)
 
-    def get_audio_chunk(self):
-        """获取并清空缓冲区中的一个音频块"""
-        if self._buffer:
-            chunk = b''.join(self._buffer)
-            self._buffer = []
-            return chunk
-        return None
+    def get_buffer_stats(self):
+        """返回环形缓冲区的溢出统计（以及格式转换的耗时统计）"""
+        stats = self._ring.stats()
+        if self._converter:
+            stats["conversion"] = self._converter.stats()
+        return stats
 
     def stop_recording(self):
         """停止录音流"""
         if self.stream and self.stream.active:
             self.stream.stop()
             self.stream.close()
+            stats = self._ring.stats()
             print("录音已停止。")
+            if stats["overrun_count"]:
+                print(f"录音缓冲区溢出 {stats['overrun_count']} 次，共丢失 {stats['dropped_samples']} 个采样 "
+                      f"(策略: {stats['policy']})")
+            if self._converter and self._converter.audio_seconds:
+                conversion = self._converter.stats()
+                print(f"格式转换 {conversion['src_rate']} Hz x{conversion['channels']} -> {self.sample_rate} Hz 单声道: "
+                      f"耗时 {conversion['processing_seconds']:.2f} 秒 / 音频 {conversion['audio_seconds']:.0f} 秒 "
+                      f"({conversion['load']:.2%}, 每相 {conversion['taps']} 抽头)")
+                get_latency_metrics().record_model(f"resample {conversion['src_rate']} Hz x{conversion['channels']}",
+                                                   conversion["processing_seconds"], conversion["audio_seconds"])
         self.stream = None
+        # 唤醒仍在等待音频的处理线程
+        with self._data_ready:
+            self._data_ready.notify_all()
 
 # 示例使用 (在 main.py 中调用)
 if __name__ == "__main__":
@@ -88,13 +327,11 @@ if __name__ == "__main__":
     if input_devices:
         recorder = AudioRecorder(device_id=input_devices[0]['id'])
         recorder.start_recording()
-        import time
         try:
             while True:
-                chunk = recorder.get_audio_chunk()
-                if chunk:
-                    print(f"捕获到音频块大小: {len(chunk)} 字节")
-                time.sleep(0.1)
+                samples = recorder.read(timeout=1.0)
+                if samples is not None:
+                    print(f"捕获到音频块大小: {samples.nbytes} 字节")
         except KeyboardInterrupt:
             print("用户中断。")
         finally:
@@ -0,0 +1,283 @@
+# audio_source.py
+# 音频来源抽象：实时麦克风 (audio_io.AudioRecorder)、文件回放、合成测试信号，以及可替换的时钟。
+# 处理循环只调用 read() 阻塞等待下一块音频，不再自己 sleep 轮询；文件/合成来源配合 ManualClock 可以不受墙钟限制地全速运行
+import threading
+import time
+
+import numpy as np
+
+from config import SAMPLE_RATE, BLOCK_SIZE, LATENCY_PROFILES, LATENCY_PROFILE, ADAPTIVE_CHUNK_TARGET_LOAD
+
+
+class SystemClock:
+    """真实时钟：now() 为 time.perf_counter()，timestamp() 为界面显示用的本地时间。"""
+
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def timestamp(self) -> str:
+        return time.strftime("[%H:%M:%S] ")
+
+
+class ManualClock:
+    """
+    确定性的虚拟时钟：sleep() 不真正等待，而是直接把时间往前拨。
+    用于测试和基准测试，让按实时速度回放的来源也能瞬间跑完，且分段时刻每次都相同。
+    """
+
+    def __init__(self, start: float = 0.0):
+        self._now = float(start)
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        with self._lock:
+            return self._now
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def advance(self, seconds: float):
+        if seconds > 0:
+            with self._lock:
+                self._now += seconds
+
+    def timestamp(self) -> str:
+        seconds = int(self.now())
+        return f"[{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}] "
+
+
+def get_latency_profile(name: str = None) -> dict:
+    """返回 config.LATENCY_PROFILES 中的延迟档位，name 为 None 时使用默认档位。"""
+    name = name or LATENCY_PROFILE
+    if name not in LATENCY_PROFILES:
+        raise ValueError(f"Unknown latency profile: {name}. Expected one of {tuple(LATENCY_PROFILES)}.")
+    return {"name": name, **LATENCY_PROFILES[name]}
+
+
+def ms_to_samples(ms: float, sample_rate=SAMPLE_RATE) -> int:
+    return max(1, int(sample_rate * ms / 1000))
+
+
+class AdaptiveChunkSize:
+    """
+    每次送给识别器的音频长度，在 [min_samples, max_samples] 范围内按处理耗时自适应调整。
+    平均负载（处理耗时 / 音频时长）超过 target_load 时块大小加倍，减少调用次数、降低 CPU 开销；
+    低于 target_load 的四分之一时减半，让结果更新得更及时。
+    """
+
+    def __init__(self, min_samples: int, max_samples: int, sample_rate=SAMPLE_RATE,
+                 target_load=ADAPTIVE_CHUNK_TARGET_LOAD, smoothing=0.3):
+        self.min_samples = int(min_samples)
+        self.max_samples = max(int(max_samples), self.min_samples)
+        self.sample_rate = sample_rate
+        self.target_load = target_load
+        self.smoothing = smoothing
+        self.samples = self.min_samples
+        self.load = None
+
+    def update(self, processing_seconds: float, num_samples: int) -> int:
+        """记录处理 num_samples 个采样所用的时间，返回下一次应读取的块大小。"""
+        if num_samples <= 0:
+            return self.samples
+        load = processing_seconds * self.sample_rate / num_samples
+        self.load = load if self.load is None else self.load + self.smoothing * (load - self.load)
+        if self.load > self.target_load and self.samples < self.max_samples:
+            self.samples = min(self.max_samples, self.samples * 2)
+            self.load = None
+        elif self.load < self.target_load / 4 and self.samples > self.min_samples:
+            self.samples = max(self.min_samples, self.samples // 2)
+            self.load = None
+        return self.samples
+
+
+class AudioSource:
+    """
+    16 kHz 单声道 int16 音频来源的公共接口，Pipeline 只依赖这些方法。
+    read() 阻塞到有新音频、超时或来源关闭/结束为止；finished 为 True 表示不会再有新音频（文件放完）。
+    录音块大小 (block_size) 与消费者每次读取的长度 (read 的 min_frames) 互相独立，中间由缓冲区衔接。
+    """
+    device_id = None
+
+    def __init__(self, sample_rate=SAMPLE_RATE, block_size=BLOCK_SIZE, clock=None):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.clock = clock or SystemClock()
+
+    @property
+    def finished(self) -> bool:
+        return False
+
+    def start_recording(self):
+        raise NotImplementedError
+
+    def stop_recording(self):
+        raise NotImplementedError
+
+    def read(self, timeout: float = None, max_frames: int = None, min_frames: int = 1):
+        """
+        返回至少 min_frames、至多 max_frames 个 int16 采样；超时返回 None。
+        来源已关闭或已结束时返回剩下不足 min_frames 的音频，没有剩余时返回 None。
+        """
+        raise NotImplementedError
+
+    def get_audio_samples(self, max_frames=None):
+        """非阻塞读取，没有数据时返回 None。"""
+        return self.read(timeout=0, max_frames=max_frames)
+
+    def get_audio_chunk(self):
+        """非阻塞读取原始字节（供 Vosk 使用）。"""
+        samples = self.get_audio_samples()
+        return None if samples is None else samples.tobytes()
+
+    def capture_time(self, sample_position: int):
+        """第 sample_position 个采样被采集的时刻（clock.now() 的时间基准），未知时返回 None。"""
+        return None
+
+    def get_buffer_stats(self):
+        return {"overrun_count": 0, "dropped_samples": 0}
+
+
+class ArrayAudioSource(AudioSource):
+    """
+    按 block_size 分块回放一段内存中的 int16 音频。
+    speed > 0 时按 speed 倍实时速度放出（用 clock.sleep 等待每块的到达时刻）；speed = 0 时尽快放出，
+    此时若给了 ready 回调，只有 ready() 返回 True 才放出下一块，用于让下游处理完再送数据（基准测试测吞吐）。
+    """
+
+    def __init__(self, samples: np.ndarray, speed: float = 1.0, sample_rate=SAMPLE_RATE, block_size=BLOCK_SIZE,
+                 clock=None, ready=None, name="array"):
+        super().__init__(sample_rate, block_size, clock)
+        self.samples = np.asarray(samples, dtype=np.int16)
+        self.speed = speed
+        self.ready = ready
+        self.name = name
+        self.started_at = None
+        self._pos = 0
+        self._stopped = threading.Event()
+        self._capture_positions = []
+        self._capture_times = []
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r}, speed={self.speed})"
+
+    @property
+    def finished(self) -> bool:
+        return self._pos >= len(self.samples)
+
+    def start_recording(self):
+        self._pos = 0
+        self._stopped.clear()
+        self._capture_positions = []
+        self._capture_times = []
+        self.started_at = self.clock.now()
+        print(f"开始回放音频: {self.name}, {len(self.samples) / self.sample_rate:.1f} 秒, 速度: {self.speed or '最快'}")
+
+    def stop_recording(self):
+        self._stopped.set()
+
+    def read(self, timeout: float = None, max_frames: int = None, min_frames: int = 1):
+        if self.started_at is None or self.finished or self._stopped.is_set():
+            return None
+        # 按整块放出，凑够 min_frames 为止
+        blocks = max(1, -(-min_frames // self.block_size))
+        end = min(self._pos + blocks * self.block_size, len(self.samples))
+        if max_frames is not None:
+            end = min(end, self._pos + max_frames)
+
+        if self.speed > 0:
+            due = self.started_at + end / self.sample_rate / self.speed
+            wait = due - self.clock.now()
+            if timeout is not None and wait > timeout:
+                self._wait(timeout)
+                return None
+            self._wait(wait)
+        elif self.ready is not None:
+            # 等待下游空闲；ready 不提供通知机制，只能按短间隔检查
+            deadline = None if timeout is None else self.clock.now() + timeout
+            while not self.ready():
+                if self._stopped.is_set() or (deadline is not None and self.clock.now() >= deadline):
+                    return None
+                self._wait(0.005)
+        if self._stopped.is_set():
+            return None
+
+        self._capture_positions.append(end)
+        self._capture_times.append(self.clock.now())
+        samples = self.samples[self._pos:end]
+        self._pos = end
+        return samples
+
+    def _wait(self, seconds: float):
+        if seconds <= 0:
+            return
+        if isinstance(self.clock, SystemClock):
+            # 真实时钟下可被 stop_recording() 提前唤醒
+            self._stopped.wait(seconds)
+        else:
+            self.clock.sleep(seconds)
+
+    def capture_time(self, sample_position: int):
+        if not self._capture_positions:
+            return None
+        for end, captured_at in zip(self._capture_positions, self._capture_times):
+            if end >= sample_position:
+                return captured_at
+        return self._capture_times[-1]
+
+
+class FileAudioSource(ArrayAudioSource):
+    """回放 WAV/FLAC 文件（解码并重采样为 16 kHz 单声道），末尾补一段静音，保证最后一句话能被 VAD 判定为结束。"""
+
+    def __init__(self, path: str, speed: float = 1.0, trailing_silence: float = 2.0, **kwargs):
+        from batch_transcribe import iter_audio_blocks
+
+        audio = np.concatenate(list(iter_audio_blocks(path)) or [np.zeros(0, dtype=np.float32)])
+        sample_rate = kwargs.get("sample_rate", SAMPLE_RATE)
+        audio = np.concatenate((audio, np.zeros(int(trailing_silence * sample_rate), dtype=np.float32)))
+        samples = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        super().__init__(samples, speed=speed, name=path, **kwargs)
+
+
+def synthesize_speech_like(pattern=((1.5, 1.0), (2.5, 1.0)), sample_rate=SAMPLE_RATE, pitch=160.0,
+                           amplitude=0.3, seed=0) -> np.ndarray:
+    """
+    生成类似语音的测试信号：pattern 为 [(发声秒数, 静音秒数), ...]。
+    发声部分是带谐波的基音，按约 4 Hz 的音节节奏调制幅度并加少量噪声，能可靠地触发能量/WebRTC VAD。
+    """
+    rng = np.random.default_rng(seed)
+    pieces = []
+    for speech_seconds, silence_seconds in pattern:
+        t = np.arange(int(speech_seconds * sample_rate)) / sample_rate
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+        envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4.0 * t) ** 2
+        pieces.append(amplitude * envelope * voiced / 2.3 + rng.normal(0, 0.01, len(t)))
+        pieces.append(rng.normal(0, 0.001, int(silence_seconds * sample_rate)))
+    audio = np.concatenate(pieces) if pieces else np.zeros(0)
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+class ToneAudioSource(ArrayAudioSource):
+    """合成的测试音源（见 synthesize_speech_like），不需要麦克风和音频文件。"""
+
+    def __init__(self, pattern=((1.5, 1.0), (2.5, 1.0)), speed: float = 1.0, **kwargs):
+        samples = synthesize_speech_like(pattern, kwargs.get("sample_rate", SAMPLE_RATE))
+        super().__init__(samples, speed=speed, name="tone", **kwargs)
+
+
+def create_audio_source(spec=None, speed: float = 1.0, clock=None, block_size=BLOCK_SIZE):
+    """
+    根据描述创建音频来源:
+      None 或整数    -> 实时录音（系统默认设备或指定的设备 ID）
+      "tone"         -> 合成测试信号
+      其他字符串      -> 音频文件路径
+    """
+    if spec is None or isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        from audio_io import AudioRecorder
+        return AudioRecorder(device_id=int(spec) if spec is not None else None, block_size=block_size, clock=clock)
+    if spec == "tone":
+        return ToneAudioSource(speed=speed, clock=clock, block_size=block_size)
+    return FileAudioSource(spec, speed=speed, clock=clock, block_size=block_size)
@@ -0,0 +1,265 @@
+# batch_transcribe.py
+# 离线批量识别 + 翻译：把录好的 WAV/FLAC 文件切块后分发到多进程并行处理，再按顺序拼接成带时间戳的文稿
+# 用法: python batch_transcribe.py meeting.wav recordings/ --stt "Whisper 英文 (small)" --workers 4 --format srt
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+
+import numpy as np
+
+from vad import create_vad, SpeechSegmenter
+from resample import StreamingResampler, downmix
+from config import (STT_MODELS, HF_TRANSLATION_MODELS, SAMPLE_RATE, DEFAULT_INPUT_LANGUAGE_MODEL,
+                    DEFAULT_TRANSLATION_MODEL, VAD_BACKEND, BATCH_SPLIT_MODE, BATCH_CHUNK_SECONDS, BATCH_CHUNK_OVERLAP_SECONDS, MT_MAX_BATCH_SIZE)
+
+AUDIO_EXTENSIONS = (".wav", ".flac")
+
+
+@dataclass
+class TranscriptSegment:
+    start: float
+    end: float
+    text: str
+    translation: str = ""
+
+
+# ---------------------------------------------------------------- 音频解码
+
+def iter_audio_blocks(path: str, block_seconds: float = 10.0):
+    """流式解码音频文件，逐块产出 16 kHz 单声道 float32 采样，不会一次性把整个文件读进内存。"""
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as wav:
+            # 16 位 PCM 直接用标准库解码，其他位深交给下面的 soundfile
+            if wav.getsampwidth() == 2:
+                rate, channels = wav.getframerate(), wav.getnchannels()
+                resampler = StreamingResampler(rate, SAMPLE_RATE)
+                frames_per_block = int(rate * block_seconds)
+                while True:
+                    raw = wav.readframes(frames_per_block)
+                    if not raw:
+                        break
+                    yield resampler.process(downmix(np.frombuffer(raw, dtype=np.int16), channels))
+                return
+
+    try:
+        import soundfile as sf
+    except ImportError:
+        if path.lower().endswith(".wav"):
+            raise Exception(f"Only 16-bit PCM WAV is supported without soundfile: {path}")
+        raise Exception(f"Reading '{path}' requires the 'soundfile' package: pip install soundfile")
+    rate = sf.info(path).samplerate
+    resampler = StreamingResampler(rate, SAMPLE_RATE)
+    for block in sf.blocks(path, blocksize=int(rate * block_seconds), dtype="float32", always_2d=True):
+        yield resampler.process(block.mean(axis=1))
+
+
+def iter_chunks(path: str, split_mode: str, chunk_seconds: float, overlap_seconds: float):
+    """按 VAD 或固定窗口（带重叠）切块，产出 (开始秒, 结束秒, 音频)。"""
+    if split_mode == "vad":
+        segmenter = SpeechSegmenter(create_vad(VAD_BACKEND, SAMPLE_RATE),
+                                    max_segment_samples=int(chunk_seconds * SAMPLE_RATE))
+        for block in iter_audio_blocks(path):
+            for segment in segmenter.push(block):
+                yield segment.start / SAMPLE_RATE, segment.end / SAMPLE_RATE, segment.audio
+        for segment in segmenter.flush():
+            yield segment.start / SAMPLE_RATE, segment.end / SAMPLE_RATE, segment.audio
+        return
+
+    window = int(chunk_seconds * SAMPLE_RATE)
+    hop = window - int(overlap_seconds * SAMPLE_RATE)
+    if hop <= 0:
+        raise Exception("Chunk overlap must be shorter than the chunk length.")
+    buffer = np.zeros(0, dtype=np.float32)
+    offset = 0
+    for block in iter_audio_blocks(path):
+        buffer = np.concatenate((buffer, block))
+        while len(buffer) >= window:
+            yield offset / SAMPLE_RATE, (offset + window) / SAMPLE_RATE, buffer[:window].copy()
+            buffer = buffer[hop:]
+            offset += hop
+    if len(buffer) > (window - hop):
+        yield offset / SAMPLE_RATE, (offset + len(buffer)) / SAMPLE_RATE, buffer
+
+
+# ---------------------------------------------------------------- 工作进程
+
+_worker_stt = None
+_worker_translator = None
+_worker_language = None
+
+
+def _init_worker(stt_model_name: str, mt_model_name: str, torch_threads: int):
+    """每个工作进程各自加载一份识别和翻译模型。"""
+    global _worker_stt, _worker_translator, _worker_language
+    import torch
+    from stt_model import SpeechToText
+    from mt_model import create_translator
+
+    torch.set_num_threads(torch_threads)
+    _worker_stt = SpeechToText(model_name=stt_model_name, sample_rate=SAMPLE_RATE)
+    _worker_language = STT_MODELS.get(stt_model_name, {}).get("code")
+    _worker_translator = create_translator(mt_model_name) if mt_model_name else None
+
+
+def _transcribe_chunk(audio: np.ndarray) -> str:
+    if _worker_stt.model_type == "vosk":
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        _worker_stt.recognizer.AcceptWaveform(pcm)
+        return _worker_stt.finalize_transcription().strip()
+    return _worker_stt.transcribe_full_audio_whisper(audio, language=_worker_language).strip()
+
+
+def _translate_texts(texts: list) -> list:
+    if _worker_translator is None:
+        return [""] * len(texts)
+    return _worker_translator.translate_batch(texts)
+
+
+# ---------------------------------------------------------------- 拼接与输出
+
+def _normalize(word: str) -> str:
+    return re.sub(r"[^\w]", "", word).lower()
+
+
+def remove_overlap(previous_text: str, text: str, max_words: int = 20) -> str:
+    """去掉 text 开头与 previous_text 结尾重复的词（固定窗口重叠部分会被识别两次）。"""
+    prev_words = [_normalize(w) for w in previous_text.split()]
+    words = text.split()
+    norm_words = [_normalize(w) for w in words]
+    for n in range(min(max_words, len(prev_words), len(words)), 0, -1):
+        if prev_words[-n:] == norm_words[:n]:
+            return " ".join(words[n:])
+    return text
+
+
+def format_time(seconds: float, separator: str = ".") -> str:
+    hours, rem = divmod(seconds, 3600)
+    minutes, secs = divmod(rem, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{int(secs):02d}{separator}{int((secs % 1) * 1000):03d}"
+
+
+def write_transcript(segments: list, path: str, output_format: str):
+    with open(path, "w", encoding="utf-8") as f:
+        if output_format == "json":
+            json.dump([asdict(segment) for segment in segments], f, ensure_ascii=False, indent=2)
+        elif output_format == "srt":
+            for i, segment in enumerate(segments, 1):
+                text = segment.text + (f"\n{segment.translation}" if segment.translation else "")
+                f.write(f"{i}\n{format_time(segment.start, ',')} --> {format_time(segment.end, ',')}\n{text}\n\n")
+        else:
+            for segment in segments:
+                stamp = f"[{format_time(segment.start)} --> {format_time(segment.end)}] "
+                f.write(f"{stamp}原文: {segment.text}\n")
+                if segment.translation:
+                    f.write(f"{stamp}译文: {segment.translation}\n")
+                f.write("\n")
+
+
+def collect_audio_files(inputs: list) -> list:
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if name.lower().endswith(AUDIO_EXTENSIONS))
+        elif item.lower().endswith(AUDIO_EXTENSIONS):
+            files.append(item)
+        else:
+            print(f"Skipping unsupported input: {item}")
+    return files
+
+
+def process_file(pool: ProcessPoolExecutor, path: str, workers: int, split_mode: str, chunk_seconds: float,
+                 overlap_seconds: float, translate: bool) -> list:
+    """切块并行识别，按顺序拼接后再并行翻译。同一时间最多只有 workers*2 个块在内存中等待处理。"""
+    pending = []
+    segments = []
+    max_in_flight = workers * 2
+
+    def collect(block=False):
+        while pending and (block or pending[0][2].done() or len(pending) >= max_in_flight):
+            start, end, future = pending.pop(0)
+            segments.append(TranscriptSegment(start, end, future.result()))
+
+    for start, end, audio in iter_chunks(path, split_mode, chunk_seconds, overlap_seconds):
+        pending.append((start, end, pool.submit(_transcribe_chunk, audio)))
+        collect()
+    collect(block=True)
+
+    # 固定窗口模式下去掉重叠部分的重复文本
+    if split_mode == "fixed" and overlap_seconds > 0:
+        for previous, segment in zip(segments, segments[1:]):
+            segment.text = remove_overlap(previous.text, segment.text)
+    segments = [segment for segment in segments if segment.text]
+
+    if translate and segments:
+        texts = [segment.text for segment in segments]
+        batches = [texts[i:i + MT_MAX_BATCH_SIZE] for i in range(0, len(texts), MT_MAX_BATCH_SIZE)]
+        translations = [t for batch in pool.map(_translate_texts, batches) for t in batch]
+        for segment, translation in zip(segments, translations):
+            segment.translation = translation
+    return segments
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline batch transcription and translation of audio files.")
+    parser.add_argument("inputs", nargs="+", help="WAV/FLAC files or directories")
+    parser.add_argument("--stt", default=DEFAULT_INPUT_LANGUAGE_MODEL, help="STT model display name from config.py")
+    parser.add_argument("--mt", default=DEFAULT_TRANSLATION_MODEL, help="MT model display name from config.py")
+    parser.add_argument("--no-translate", action="store_true", help="only transcribe")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="number of worker processes, each loads its own models")
+    parser.add_argument("--split", choices=("vad", "fixed"), default=BATCH_SPLIT_MODE, help="chunking mode")
+    parser.add_argument("--chunk-seconds", type=float, default=BATCH_CHUNK_SECONDS)
+    parser.add_argument("--overlap-seconds", type=float, default=BATCH_CHUNK_OVERLAP_SECONDS,
+                        help="window overlap for --split fixed")
+    parser.add_argument("--format", choices=("txt", "srt", "json"), default="txt")
+    parser.add_argument("--output-dir", default=None, help="default: next to each input file")
+    args = parser.parse_args(argv)
+
+    files = collect_audio_files(args.inputs)
+    if not files:
+        print("No audio files found.")
+        return 1
+
+    mt_model_name = None if args.no_translate else args.mt
+    if mt_model_name is not None:
+        # 与 Pipeline._load_models 相同的检查：语言不匹配时不必启动工作进程、加载模型
+        input_lang_code = STT_MODELS.get(args.stt, {}).get("code")
+        mt_model_info = HF_TRANSLATION_MODELS.get(mt_model_name)
+        if not mt_model_info:
+            print(f"Configuration error: Could not find information for translation model '{mt_model_name}'.")
+            return 1
+        mt_src_lang = mt_model_info["src"]
+        if input_lang_code and mt_src_lang != "multilingual" and mt_src_lang != input_lang_code:
+            print(f"Language mismatch: Recognition model '{args.stt}' (Language: {input_lang_code}) "
+                  f"is incompatible with translation model '{mt_model_name}' (Source Language: {mt_src_lang}).")
+            return 1
+    torch_threads = max(1, (os.cpu_count() or 1) // args.workers)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.stt, mt_model_name, torch_threads)) as pool:
+        for path in files:
+            started = time.perf_counter()
+            segments = process_file(pool, path, args.workers, args.split, args.chunk_seconds,
+                                    args.overlap_seconds, mt_model_name is not None)
+            output_dir = args.output_dir or os.path.dirname(os.path.abspath(path))
+            os.makedirs(output_dir, exist_ok=True)
+            base_name = os.path.splitext(os.path.basename(path))[0]
+            output_path = os.path.join(output_dir, f"{base_name}.transcript.{args.format}")
+            write_transcript(segments, output_path, args.format)
+            audio_seconds = segments[-1].end if segments else 0.0
+            elapsed = time.perf_counter() - started
+            print(f"{path}: {len(segments)} segments, {elapsed:.1f}s "
+                  f"(RTF {elapsed / audio_seconds:.2f}) -> {output_path}" if audio_seconds else
+                  f"{path}: no speech found -> {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
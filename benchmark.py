@@ -0,0 +1,331 @@
+# benchmark.py
+# 基准测试：把录好的 WAV/FLAC 语料回放给完整的流水线（真实的 SpeechToText / MachineTranslator / VAD 分段），
+# 统计实时率、首个临时结果延迟、最终结果延迟、翻译延迟、峰值内存以及 WER / BLEU，结果写成 JSON 便于在版本之间对比
+# 用法: python benchmark.py benchmarks/corpus --stt "Whisper 英文 (tiny)" --stt "Whisper 英文 (small)" --speed 0
+#
+# 语料目录中每个音频文件旁可以放参考文本: <文件名>.txt 为参考原文（用于 WER），<文件名>.tgt.txt 为参考译文（用于 BLEU）
+import argparse
+import collections
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from audio_source import FileAudioSource, get_latency_profile, ms_to_samples
+from batch_transcribe import collect_audio_files
+from pipeline import (Pipeline, PartialEvent, FinalEvent, TranslationEvent, ModelLoadEvent, ErrorEvent,
+                      PROCESSING_PLACEHOLDER)
+from vad import create_vad
+from config import (SAMPLE_RATE, BLOCK_SIZE, VAD_BACKEND, DEFAULT_INPUT_LANGUAGE_MODEL, DEFAULT_TRANSLATION_MODEL,
+                    LATENCY_PROFILES, LATENCY_PROFILE)
+
+# ---------------------------------------------------------------- 语料与评分
+
+def load_corpus(inputs: list) -> list:
+    corpus = []
+    for path in collect_audio_files(inputs):
+        base = os.path.splitext(path)[0]
+        item = {"path": path, "reference": None, "translation_reference": None}
+        for key, suffix in (("reference", ".txt"), ("translation_reference", ".tgt.txt")):
+            if os.path.exists(base + suffix):
+                with open(base + suffix, encoding="utf-8") as f:
+                    item[key] = f.read().strip()
+        corpus.append(item)
+    return corpus
+
+
+def speech_onsets(audio: np.ndarray) -> list:
+    """用流水线同一套 VAD 找出每句话开始的采样位置，作为首个临时结果延迟的起点。"""
+    vad = create_vad(VAD_BACKEND, SAMPLE_RATE)
+    samples = audio.astype(np.float32) / 32768.0
+    onsets = []
+    for i in range(0, len(samples), BLOCK_SIZE):
+        onsets.extend(event.offset for event in vad.process(samples[i:i + BLOCK_SIZE]) if event.kind == "start")
+    return onsets
+
+
+def _is_cjk(text: str) -> bool:
+    return re.search(r"[぀-ヿ㐀-鿿가-힯]", text) is not None
+
+
+def tokenize(text: str) -> list:
+    """中日韩文本按字切分，其他语言按词切分；忽略大小写和标点。"""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    if _is_cjk(text):
+        return [ch for ch in text if not ch.isspace()]
+    return text.split()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    ref, hyp = tokenize(reference), tokenize(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def corpus_bleu(references: list, hypotheses: list, max_n: int = 4) -> float:
+    """语料级 BLEU-4（0-100），零匹配的阶数按 0.1 平滑。"""
+    matches, totals = [0] * max_n, [0] * max_n
+    ref_length = hyp_length = 0
+    for reference, hypothesis in zip(references, hypotheses):
+        ref, hyp = tokenize(reference), tokenize(hypothesis)
+        ref_length += len(ref)
+        hyp_length += len(hyp)
+        for n in range(1, max_n + 1):
+            ref_counts = collections.Counter(tuple(ref[i:i + n]) for i in range(len(ref) - n + 1))
+            hyp_counts = collections.Counter(tuple(hyp[i:i + n]) for i in range(len(hyp) - n + 1))
+            matches[n - 1] += sum(min(count, ref_counts[gram]) for gram, count in hyp_counts.items())
+            totals[n - 1] += max(len(hyp) - n + 1, 0)
+    if hyp_length == 0:
+        return 0.0
+    log_precision = sum(math.log((m if m else 0.1) / t) if t else math.log(0.1) for m, t in zip(matches, totals))
+    brevity = 1.0 if hyp_length > ref_length else math.exp(1 - ref_length / hyp_length)
+    return 100.0 * brevity * math.exp(log_precision / max_n)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位是 KB，macOS 上是字节
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def _summarize(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000.0,
+        "p50_ms": values[len(values) // 2] * 1000.0,
+        "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))] * 1000.0,
+        "max_ms": values[-1] * 1000.0,
+    }
+
+
+# ---------------------------------------------------------------- 运行
+
+def run_file(pipeline: Pipeline, item: dict, stt_model_name: str, mt_model_name: str, speed: float,
+             drain_timeout: float, latency_profile: str = None) -> dict:
+    # speed = 0 时等流水线处理完上一块再送下一块
+    block_size = ms_to_samples(get_latency_profile(latency_profile)["capture_ms"])
+    recorder = FileAudioSource(item["path"], speed=speed, ready=pipeline.is_idle, block_size=block_size)
+    audio_seconds = len(recorder.samples) / SAMPLE_RATE
+    onsets = speech_onsets(recorder.samples)
+    events = []
+
+    def on_event(event):
+        events.append((time.perf_counter(), event))
+        pipeline.mark_rendered(event)
+
+    pipeline.metrics.reset()
+    pipeline.subscribe(on_event)
+    try:
+        load_started = time.perf_counter()
+        pipeline.start(recorder, stt_model_name, mt_model_name, latency_profile=latency_profile)
+        load_seconds = recorder.started_at - load_started
+
+        while not pipeline.input_finished:
+            time.sleep(0.02)
+        # 等待最后的识别和翻译完成：流水线连续 0.5 秒处于空闲状态即认为处理完毕
+        deadline = time.perf_counter() + drain_timeout
+        idle_since = None
+        while time.perf_counter() < deadline:
+            if pipeline.is_idle():
+                idle_since = idle_since or time.perf_counter()
+                if time.perf_counter() - idle_since >= 0.5:
+                    break
+            else:
+                idle_since = None
+            time.sleep(0.02)
+        processing_seconds = (idle_since or time.perf_counter()) - recorder.started_at
+    finally:
+        pipeline.stop()
+        pipeline.unsubscribe(on_event)
+    snapshot = pipeline.metrics.snapshot()
+
+    finals = [event.text for _, event in events if isinstance(event, FinalEvent) and event.text]
+    translations = [event.text for _, event in events if isinstance(event, TranslationEvent) and not event.partial]
+    # Whisper 的 "(Processing...)" 占位不算识别结果
+    partial_times = [t for t, event in events
+                     if isinstance(event, PartialEvent) and event.text != PROCESSING_PLACEHOLDER]
+    errors = [event.message for _, event in events if isinstance(event, ErrorEvent)]
+
+    # 首个临时结果延迟：从一句话开始（VAD 起点的采集时刻）到这之后第一次出现临时结果
+    first_partial = []
+    for onset in onsets:
+        onset_time = recorder.capture_time(onset)
+        later = [t for t in partial_times if onset_time is not None and t >= onset_time]
+        if later:
+            first_partial.append(later[0] - onset_time)
+
+    hypothesis, translation = " ".join(finals), " ".join(translations)
+    result = {
+        "file": item["path"],
+        "audio_seconds": audio_seconds,
+        "load_seconds": load_seconds,
+        "processing_seconds": processing_seconds,
+        "rtf": processing_seconds / audio_seconds if audio_seconds else None,
+        "model_rtf": {name: stats["rtf"] for name, stats in snapshot["models"].items()},
+        "first_partial_latency": _summarize(first_partial),
+        "final_latency": snapshot["stages"].get("e2e_final", {"count": 0}),
+        "translation_latency": snapshot["stages"].get("e2e", {"count": 0}),
+        "stages": {stage: {k: v for k, v in s.items() if k != "buckets"} for stage, s in snapshot["stages"].items()},
+        "hypothesis": hypothesis,
+        "translation": translation,
+        "wer": word_error_rate(item["reference"], hypothesis) if item["reference"] is not None else None,
+        "bleu": corpus_bleu([item["translation_reference"]], [translation])
+        if item["translation_reference"] is not None else None,
+        "errors": errors,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return result
+
+
+def run_config(corpus: list, stt_model_name: str, mt_model_name: str, speed: float, drain_timeout: float,
+               latency_profile: str = LATENCY_PROFILE) -> dict:
+    pipeline = Pipeline()
+    load_events = []
+    pipeline.subscribe(lambda event: load_events.append(event) if isinstance(event, ModelLoadEvent) else None)
+
+    files = []
+    for item in corpus:
+        print(f"[{stt_model_name} | {mt_model_name} | {latency_profile}] {item['path']}...", flush=True)
+        result = run_file(pipeline, item, stt_model_name, mt_model_name, speed, drain_timeout, latency_profile)
+        print(f"    RTF {result['rtf']:.2f}, final p50 {result['final_latency'].get('p50_ms', 0):.0f} ms, "
+              f"WER {result['wer'] if result['wer'] is not None else 'n/a'}", flush=True)
+        files.append(result)
+
+    audio_seconds = sum(f["audio_seconds"] for f in files)
+    processing_seconds = sum(f["processing_seconds"] for f in files)
+    scored = [f for f in files if f["wer"] is not None]
+    translated = [(item, f) for item, f in zip(corpus, files) if item["translation_reference"] is not None]
+    summary = {
+        "files": len(files),
+        "audio_seconds": audio_seconds,
+        "rtf": processing_seconds / audio_seconds if audio_seconds else None,
+        "model_load_seconds": {event.model_name: event.seconds for event in load_events if event.status == "ready"},
+        "first_partial_p50_ms": _median(f["first_partial_latency"].get("p50_ms") for f in files),
+        "final_p50_ms": _median(f["final_latency"].get("p50_ms") for f in files),
+        "translation_p50_ms": _median(f["translation_latency"].get("p50_ms") for f in files),
+        # 按参考文本长度加权的整体 WER
+        "wer": sum(f["wer"] * len(tokenize(item["reference"])) for item, f in zip(corpus, files)
+                   if f["wer"] is not None) / max(1, sum(len(tokenize(item["reference"])) for item in corpus
+                                                         if item["reference"] is not None)) if scored else None,
+        "bleu": corpus_bleu([item["translation_reference"] for item, _ in translated],
+                            [f["translation"] for _, f in translated]) if translated else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return {"stt": stt_model_name, "mt": mt_model_name, "latency_profile": latency_profile, "summary": summary,
+            "files": files}
+
+
+def _median(values):
+    values = sorted(v for v in values if v is not None)
+    return values[len(values) // 2] if values else None
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare_with_baseline(results: dict, baseline_path: str):
+    """打印与之前一次结果相比的变化，数值变差时标记出来。"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(run["stt"], run["mt"], run.get("latency_profile", LATENCY_PROFILE)): run["summary"]
+                for run in baseline.get("runs", [])}
+    # 指标名 -> 数值越大越好?
+    metrics = {"rtf": False, "final_p50_ms": False, "translation_p50_ms": False, "first_partial_p50_ms": False,
+               "wer": False, "bleu": True, "peak_rss_mb": False}
+    print(f"\nCompared with {baseline_path} (revision {baseline.get('revision')}):")
+    for run in results["runs"]:
+        label = f"[{run['stt']} | {run['mt']} | {run['latency_profile']}]"
+        old = previous.get((run["stt"], run["mt"], run["latency_profile"]))
+        if old is None:
+            print(f"  {label} not in baseline")
+            continue
+        print(f"  {label}")
+        for name, higher_is_better in metrics.items():
+            new_value, old_value = run["summary"].get(name), old.get(name)
+            if new_value is None or old_value is None:
+                continue
+            worse = new_value < old_value if higher_is_better else new_value > old_value
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            flag = "  <-- regression" if worse and abs(change) > 5 else ""
+            print(f"    {name:22s} {old_value:10.3f} -> {new_value:10.3f} ({change:+.1f}%){flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark STT/MT latency and accuracy over recorded audio.")
+    parser.add_argument("inputs", nargs="+", help="WAV/FLAC files or corpus directories")
+    parser.add_argument("--stt", action="append", help="STT model display name (repeat to compare several)")
+    parser.add_argument("--mt", action="append", help="MT model display name (repeat to compare several)")
+    parser.add_argument("--latency-profile", action="append", choices=tuple(LATENCY_PROFILES),
+                        help="latency profile from config.py (repeat to compare several)")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="replay speed: 1.0 = real time, 0 = as fast as the pipeline keeps up (default)")
+    parser.add_argument("--drain-timeout", type=float, default=120.0,
+                        help="max seconds to wait for results after the audio ends")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="previous results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.inputs)
+    if not corpus:
+        print("No audio files found.")
+        return 1
+
+    results = {
+        "revision": _git_revision(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "speed": args.speed,
+        "corpus": [item["path"] for item in corpus],
+        "runs": [],
+    }
+    for stt_model_name in args.stt or [DEFAULT_INPUT_LANGUAGE_MODEL]:
+        for mt_model_name in args.mt or [DEFAULT_TRANSLATION_MODEL]:
+            for latency_profile in args.latency_profile or [LATENCY_PROFILE]:
+                results["runs"].append(run_config(corpus, stt_model_name, mt_model_name, args.speed,
+                                                  args.drain_timeout, latency_profile))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nResults written to '{args.output}'.")
+    for run in results["runs"]:
+        s = run["summary"]
+        print(f"  [{run['stt']} | {run['mt']} | {run['latency_profile']}] RTF {s['rtf']:.2f}, "
+              f"final p50 {s['final_p50_ms'] or 0:.0f} ms, translation p50 {s['translation_p50_ms'] or 0:.0f} ms, WER {s['wer']}, BLEU {s['bleu']}, "
+              f"peak RSS {s['peak_rss_mb'] or 0:.0f} MB")
+    if args.baseline:
+        compare_with_baseline(results, args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# cli.py
+# 无界面的命令行入口，适合在没有显示器的服务器上运行
+# 用法: python cli.py --device 1 --stt "Vosk 美式英文 (小)" --mt "英文->中文 (Helsinki-NLP)" --format jsonl
+#       python cli.py --input meeting.wav --speed 0    # 回放音频文件代替麦克风
+#       python cli.py --mt "英文->中文 (Helsinki-NLP)" --mt "英文->日文 (Helsinki-NLP)"    # 同时翻译成多种语言
+import argparse
+import json
+import queue
+import sys
+import time
+
+from audio_io import AudioRecorder
+from audio_source import create_audio_source, get_latency_profile, ms_to_samples
+from pipeline import Pipeline, PartialEvent, FinalEvent, TranslationEvent, ErrorEvent, event_to_dict
+from config import (STT_MODELS, HF_TRANSLATION_MODELS, DEFAULT_INPUT_LANGUAGE_MODEL, DEFAULT_TRANSLATION_MODEL,
+                    LATENCY_PROFILES, LATENCY_PROFILE)
+
+
+def print_event(event, output_format: str, show_partials: bool, show_target: bool = False):
+    if output_format == "jsonl":
+        if show_partials or (not isinstance(event, PartialEvent) and not getattr(event, "partial", False)):
+            print(json.dumps(event_to_dict(event), ensure_ascii=False), flush=True)
+        return
+
+    if isinstance(event, PartialEvent):
+        if show_partials:
+            print(f"\r{event.timestamp}{event.text}", end="", file=sys.stderr, flush=True)
+    elif isinstance(event, FinalEvent):
+        if event.text:
+            print(f"\r{event.timestamp}原文: {event.text}", flush=True)
+    elif isinstance(event, TranslationEvent):
+        label = f"译文[{event.target_lang}]" if show_target else "译文"
+        if not event.partial:
+            print(f"{event.timestamp}{label}: {event.text}", flush=True)
+        elif show_partials:
+            print(f"\r{event.timestamp}{label}: {event.text} ...", end="", file=sys.stderr, flush=True)
+    elif isinstance(event, ErrorEvent):
+        print(f"[{event.source}] {event.message}", file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless real-time speech translation.")
+    parser.add_argument("--list-devices", action="store_true", help="list audio input devices and exit")
+    parser.add_argument("--list-models", action="store_true", help="list configured STT/MT models and exit")
+    parser.add_argument("--device", type=int, default=None, help="audio input device id (default: system default)")
+    parser.add_argument("--input", default=None,
+                        help="replay a WAV/FLAC file (or 'tone' for a synthetic test signal) instead of recording")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed for --input, 0 = as fast as possible")
+    parser.add_argument("--stt", default=DEFAULT_INPUT_LANGUAGE_MODEL, help="STT model display name from config.py")
+    parser.add_argument("--mt", action="append", default=None,
+                        help="MT model display name from config.py; repeat to translate into several target languages "
+                             f"from one recognition stream (default: {DEFAULT_TRANSLATION_MODEL})")
+    parser.add_argument("--latency-profile", choices=tuple(LATENCY_PROFILES), default=LATENCY_PROFILE,
+                        help="trade latency for CPU: capture block and recognizer chunk sizes (see config.py)")
+    parser.add_argument("--format", choices=("text", "jsonl"), default="text", help="output format")
+    parser.add_argument("--show-partials", action="store_true", help="also output partial results")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    parser.add_argument("--metrics-json", default=None,
+                        help="write per-stage latency histograms and model RTF to this file on exit")
+    args = parser.parse_args(argv)
+
+    if args.list_devices:
+        for dev in AudioRecorder.list_audio_input_devices():
+            print(f"{dev['id']}: {dev['name']} ({dev['hostapi']})")
+        return 0
+    if args.list_models:
+        print("STT models:")
+        for name in STT_MODELS:
+            print(f"  {name}")
+        print("MT models:")
+        for name in HF_TRANSLATION_MODELS:
+            print(f"  {name}")
+        return 0
+
+    mt_models = args.mt or [DEFAULT_TRANSLATION_MODEL]
+    show_target = len(mt_models) > 1
+    pipeline = Pipeline()
+    events = pipeline.subscribe_queue()
+    try:
+        if args.input:
+            block_size = ms_to_samples(get_latency_profile(args.latency_profile)["capture_ms"])
+            source = create_audio_source(args.input, speed=args.speed, clock=pipeline.clock, block_size=block_size)
+        else:
+            source = args.device
+        pipeline.start(source, args.stt, mt_models, latency_profile=args.latency_profile)
+    except Exception as e:
+        print(f"Failed to start translator: {e}", file=sys.stderr)
+        return 1
+
+    deadline = time.monotonic() + args.duration if args.duration else None
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            try:
+                event = events.get(timeout=0.2)
+            except queue.Empty:
+                # 回放的文件放完且所有结果都已输出后退出
+                if pipeline.input_finished and pipeline.is_idle():
+                    break
+                continue
+            print_event(event, args.format, args.show_partials, show_target)
+            pipeline.mark_rendered(event)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+
+    # 输出停止前已排队的结果
+    drain_until = time.monotonic() + 2.0
+    while time.monotonic() < drain_until:
+        try:
+            event = events.get(timeout=0.2)
+        except queue.Empty:
+            break
+        print_event(event, args.format, args.show_partials, show_target)
+        pipeline.mark_rendered(event)
+
+    if args.metrics_json:
+        pipeline.metrics.dump_json(args.metrics_json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,10 +13,18 @@ VOSK_MODELS = {
                            "url": "https://alphacephei.com/vosk/models/vosk-model-en-in-0.5.zip"},
     "Vosk 印度英文 (小)": {"type": "vosk", "code": "en", "path": "models/vosk-model-small-en-in-0.4",
                            "url": "https://alphacephei.com/vosk/models/vosk-model-small-en-in-0.4.zip"},
+    "Vosk 中文 (小)": {"type": "vosk", "code": "zh", "path": "models/vosk-model-small-cn-0.22",
+                       "url": "https://alphacephei.com/vosk/models/vosk-model-small-cn-0.22.zip"},
+    "Vosk 日文 (小)": {"type": "vosk", "code": "ja", "path": "models/vosk-model-small-ja-0.22",
+                       "url": "https://alphacephei.com/vosk/models/vosk-model-small-ja-0.22.zip"},
 }
 
 # Whisper 语音模型配置
-# 格式: "UI显示名称": {"type": "whisper", "model_id": "模型ID"}
+# 格式: "UI显示名称": {"type": "whisper", "model_id": "模型ID", "backend": "推理后端"}
+# backend 可选 (不填则使用 WHISPER_DEFAULT_BACKEND):
+#   "transformers"   - transformers pipeline, fp32
+#   "torch-int8"     - torch 动态 int8 量化 (仅 CPU)，首次使用时缓存到 models/<模型名>-torch-int8
+#   "faster-whisper" - CTranslate2 int8 引擎 (需 pip install faster-whisper)，首次使用时转换到 models/<模型名>-ct2-int8
 WHISPER_MODELS = {
     "Whisper 英文 (tiny)": {"type": "whisper", "model_path": "models/whisper-tiny.en",
                             "model_id": "openai/whisper-tiny.en", },
@@ -30,17 +38,77 @@ WHISPER_MODELS = {
                                "model_id": "openai/whisper-small", },
     "Whisper 多语言 (medium)": {"type": "whisper", "model_path": "models/whisper-medium",
                                 "model_id": "openai/whisper-medium", },
+    "Whisper 英文 (small, int8)": {"type": "whisper", "model_path": "models/whisper-small.en",
+                                   "model_id": "openai/whisper-small.en", "backend": "faster-whisper", },
+    "Whisper 英文 (medium, int8)": {"type": "whisper", "model_path": "models/whisper-medium.en",
+                                    "model_id": "openai/whisper-medium.en", "backend": "faster-whisper", },
 }
+WHISPER_DEFAULT_BACKEND = "transformers"
 
 # 合并所有 STT 模型
 STT_MODELS = {**VOSK_MODELS, **WHISPER_MODELS}
 
 # Hugging Face 翻译模型配置
-# 格式: "UI显示名称": {"src": "源语言代码", "tgt": "目标语言代码", "model_id": "HuggingFace模型ID"}
+# 格式: "UI显示名称": {"src": "源语言代码", "tgt": "目标语言代码", "model_id": "HuggingFace模型ID", "backend": "推理后端"}
+# backend 可选 (不填则使用 MT_DEFAULT_BACKEND):
+#   "transformers" - 原始 fp32 模型
+#   "torch-int8"   - torch 动态 int8 量化 (仅 CPU)，首次使用时缓存到 models/<模型名>-torch-int8
+#   "ctranslate2"  - CTranslate2 int8 引擎 (需 pip install ctranslate2)，首次使用时转换到 models/<模型名>-ct2-int8
+# 经中转语言的链式翻译: {"src": ..., "tgt": ..., "chain": ["X->英文 的模型名", "英文->Y 的模型名"]}，
+#   只需要每种语言与中转语言（英文）之间的直接模型，常驻模型数随语言数线性增长；
+#   中间译文按每一跳的模型写入译文缓存，同时翻译成多个目标语言时，经过同一中转语言的目标共享同一份中间译文
 HF_TRANSLATION_MODELS = {
     "英文->中文 (Helsinki-NLP)": {"src": "en", "tgt": "zh", "model_path": "models/opus-mt-en-zh", "model_id": "Helsinki-NLP/opus-mt-en-zh",},
+    "英文->中文 (Helsinki-NLP, int8)": {"src": "en", "tgt": "zh", "model_path": "models/opus-mt-en-zh",
+                                        "model_id": "Helsinki-NLP/opus-mt-en-zh", "backend": "ctranslate2",},
+    "英文->日文 (Helsinki-NLP)": {"src": "en", "tgt": "ja", "model_path": "models/opus-mt-en-jap", "model_id": "Helsinki-NLP/opus-mt-en-jap",},
+    "英文->德文 (Helsinki-NLP)": {"src": "en", "tgt": "de", "model_path": "models/opus-mt-en-de", "model_id": "Helsinki-NLP/opus-mt-en-de",},
+    "英文->法文 (Helsinki-NLP)": {"src": "en", "tgt": "fr", "model_path": "models/opus-mt-en-fr", "model_id": "Helsinki-NLP/opus-mt-en-fr",},
+    "中文->英文 (Helsinki-NLP)": {"src": "zh", "tgt": "en", "model_path": "models/opus-mt-zh-en", "model_id": "Helsinki-NLP/opus-mt-zh-en",},
+    "日文->英文 (Helsinki-NLP)": {"src": "ja", "tgt": "en", "model_path": "models/opus-mt-ja-en", "model_id": "Helsinki-NLP/opus-mt-ja-en",},
+    "日文->中文 (经英文中转)": {"src": "ja", "tgt": "zh", "chain": ["日文->英文 (Helsinki-NLP)", "英文->中文 (Helsinki-NLP)"],},
+    "中文->日文 (经英文中转)": {"src": "zh", "tgt": "ja", "chain": ["中文->英文 (Helsinki-NLP)", "英文->日文 (Helsinki-NLP)"],},
+    "中文->德文 (经英文中转)": {"src": "zh", "tgt": "de", "chain": ["中文->英文 (Helsinki-NLP)", "英文->德文 (Helsinki-NLP)"],},
+    "中文->法文 (经英文中转)": {"src": "zh", "tgt": "fr", "chain": ["中文->英文 (Helsinki-NLP)", "英文->法文 (Helsinki-NLP)"],},
 
 }
+MT_DEFAULT_BACKEND = "transformers"
+
+# 翻译微批处理: 收到第一句后最多等待 MT_BATCH_WAIT_MS 毫秒，或凑满 MT_MAX_BATCH_SIZE 句，一次性翻译
+MT_MAX_BATCH_SIZE = 8
+MT_BATCH_WAIT_MS = 20
+
+# 多目标翻译 (cli.py / server.py 的 --mt 可以给多次)：同一句原文同时交给每个目标语言的翻译模型，
+# 所有目标语言共享一个线程池，MT_FANOUT_WORKERS 为同时进行的翻译批次数上限
+MT_FANOUT_WORKERS = 2
+
+# 翻译缓存: 按 "模型名 + 规范化原文" 缓存译文，重复的问候语/口头禅无需重新翻译
+MT_CACHE_ENABLED = True
+MT_CACHE_MAX_ENTRIES = 10000
+MT_CACHE_MAX_MB = 16
+# 持久化路径，设为 None 则只缓存在内存中；停止翻译时写入磁盘，下次启动直接命中
+MT_CACHE_PATH = "models/translation_cache.json"
+
+# 临时识别结果的增量翻译（可选）：说话过程中就显示逐步增长的译文
+TRANSLATE_PARTIALS = False
+# 两次临时翻译之间的最小间隔
+PARTIAL_TRANSLATION_INTERVAL_MS = 800
+# 连续多少次临时结果中都不变的前缀才被认为是稳定的
+PARTIAL_STABLE_UPDATES = 2
+# 复用上次译文作为解码前缀时，去掉末尾多少个 token（允许模型修正句尾）
+PARTIAL_TRANSLATION_MASK_TOKENS = 2
+
+# 已加载模型的缓存 (model_registry.py)：停止后再开始、或切换回之前用过的模型时直接复用，不再从磁盘重新加载
+# 不再使用的模型保留多少秒后卸载，设为 None 则一直保留
+MODEL_IDLE_TIMEOUT_SECONDS = 600
+# 所有已加载模型的估算内存上限，超出时优先卸载最久未使用的空闲模型；设为 None 则不限制
+MODEL_MEMORY_BUDGET_MB = 4096
+# 每个 Vosk 模型最多保留多少个空闲的识别器 (KaldiRecognizer)：停止后重置放回池中，下一路音频流直接取用
+VOSK_RECOGNIZER_POOL_SIZE = 8
+
+# 延迟统计 (metrics.py)：每隔多少秒打印一行各阶段延迟摘要（0 表示不打印），停止时把完整统计写入 JSON（None 表示不写）
+METRICS_LOG_INTERVAL_SECONDS = 60
+METRICS_DUMP_PATH = "logs/latency_metrics.json"
 
 # 默认设置
 DEFAULT_INPUT_LANGUAGE_MODEL = "Whisper 英文 (small)"  # 默认的STT模型显示名称
@@ -48,9 +116,97 @@ DEFAULT_TRANSLATION_MODEL = "英文->中文 (Helsinki-NLP)"  # 默认的MT模型
 
 # 音频配置 (通常无需修改)
 SAMPLE_RATE = 16000
+# 未指定延迟档位时（文件回放、离线处理）的默认块大小；实时录音的块大小由 LATENCY_PROFILES 决定
 BLOCK_SIZE = 8000
 CHANNELS = 1
 
+# 录音环形缓冲区配置
+# 缓冲区容量（秒），消费者线程卡在 Whisper/翻译调用上时，最多能暂存这么长的音频
+AUDIO_RING_BUFFER_SECONDS = 30
+# 缓冲区满时的策略: "drop_oldest" 覆盖最旧的音频（优先保证实时性）, "drop_newest" 丢弃新到达的音频
+AUDIO_OVERFLOW_POLICY = "drop_oldest"
+# 处理线程阻塞等待下一块音频的最长时间（秒），超时后检查是否已停止
+AUDIO_READ_TIMEOUT_SECONDS = 0.5
+# 以设备原生的采样率和声道数录音（不少设备，尤其是"立体声混音"等回环设备只支持 44.1/48 kHz 立体声），
+# 再在处理线程中降混为单声道并重采样到 16 kHz；设为 False 则直接以 16 kHz 单声道打开设备（依赖系统/PortAudio 重采样）
+AUDIO_CAPTURE_NATIVE_FORMAT = True
+# 原生格式录音时最多使用的声道数（降混前）
+AUDIO_CAPTURE_MAX_CHANNELS = 2
+# 多相重采样滤波器每相的抽头数，越大过渡带越窄、CPU 开销越大。
+# 96 时 48/44.1 kHz -> 16 kHz 对 8.5 kHz 以上会混叠进来的频率衰减约 90 dB，7 kHz 以下基本无衰减
+RESAMPLER_TAPS = 96
+# 重采样耗时占音频时长的比例上限，超过时自动减少抽头数
+RESAMPLER_MAX_LOAD = 0.02
+
 WHISPER_SILENCE_THRESHOLD = 0.5
 
 WHISPER_MAX_AUDIO_SECONDS = 20
+
+# Whisper 流式识别 (LocalAgreement): 说话过程中每隔 WHISPER_STREAM_INTERVAL_MS 重新解码一次窗口，
+# 连续两次结果一致的前缀即确认并以临时结果显示，语句结束 (VAD) 时输出最终结果
+WHISPER_STREAMING = False
+WHISPER_STREAM_INTERVAL_MS = 500
+# 窗口内未确认音频的最大时长，超过后强制确认
+WHISPER_STREAM_MAX_WINDOW_SECONDS = 15
+
+# 延迟 / CPU 档位，可在每次启动时选择（cli.py --latency-profile）:
+#   capture_ms                  录音回调的块大小，越小唤醒越频繁
+#   vosk_chunk_ms               每次送给 Vosk 的音频长度范围 (最小, 最大)，决定临时结果的更新频率
+#   whisper_chunk_ms            Whisper 循环每次送入 VAD 的音频长度范围，决定判定语句结束的反应时间
+#   whisper_stream_interval_ms  流式 Whisper 重新解码窗口的间隔
+# 块大小从最小值开始，按识别耗时在范围内自动调整：跟不上时加大（减少调用次数），余量充足时减小
+LATENCY_PROFILES = {
+    "low_latency": {"capture_ms": 20, "vosk_chunk_ms": (40, 320), "whisper_chunk_ms": (60, 480),
+                    "whisper_stream_interval_ms": 300},
+    "balanced": {"capture_ms": 60, "vosk_chunk_ms": (120, 500), "whisper_chunk_ms": (120, 960),
+                 "whisper_stream_interval_ms": WHISPER_STREAM_INTERVAL_MS},
+    "power_saver": {"capture_ms": 250, "vosk_chunk_ms": (500, 1000), "whisper_chunk_ms": (500, 2000),
+                    "whisper_stream_interval_ms": 1000},
+}
+LATENCY_PROFILE = "balanced"
+# 处理一块音频的平均耗时超过其时长的这个比例时加大块，低于四分之一时减小块
+ADAPTIVE_CHUNK_TARGET_LOAD = 0.5
+
+# 离线批量处理 (batch_transcribe.py) 的切块方式: "vad" 按语音段切分, "fixed" 按固定窗口切分（相邻窗口有重叠）
+BATCH_SPLIT_MODE = "vad"
+# vad 模式下为单块最大时长，fixed 模式下为窗口长度
+BATCH_CHUNK_SECONDS = 30
+BATCH_CHUNK_OVERLAP_SECONDS = 2
+
+# 多会话 WebSocket 服务 (server.py)：所有连接共享同一套已加载的模型
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+# 同时在线的会话数上限，超出的连接会被拒绝
+SERVER_MAX_SESSIONS = 64
+# 共享的识别线程数（Vosk 逐块识别和 VAD 分段在这些线程中执行；Whisper 语音段由批量调度器统一识别）
+SERVER_STT_WORKERS = 4
+
+# Whisper 推理执行器配置
+# 等待识别的语音段队列长度上限
+WHISPER_QUEUE_SIZE = 4
+# 队列满时的策略: "merge" 合并到队尾的语音段, "drop_oldest" 丢弃最旧的语音段
+WHISPER_QUEUE_POLICY = "merge"
+
+# Whisper 批量推理调度 (stt_model.WhisperBatchScheduler)：多个会话或积压的语音段按补齐后的长度 (30 秒窗口数) 分组，
+# 一次前向计算识别整批。最早的语音段最多等待 WHISPER_BATCH_WAIT_MS 毫秒凑批；WHISPER_MAX_BATCH_SIZE = 1 表示不合批
+WHISPER_MAX_BATCH_SIZE = 4
+WHISPER_BATCH_WAIT_MS = 50
+# 执行器的工作线程数。这些线程只负责提交语音段并等待结果，实际推理都在批量调度器的线程中进行；
+# 同一路音频积压的语音段要能合成一批，就需要同样多的线程同时等待，所以默认等于 WHISPER_MAX_BATCH_SIZE。
+# 小于批大小时，单路音频的批次最多只有 WHISPER_WORKERS 段
+WHISPER_WORKERS = WHISPER_MAX_BATCH_SIZE
+
+# 语音活动检测 (VAD) 配置，Whisper 按 VAD 的起止事件切分语音段
+# 可选: "energy" (无额外依赖), "webrtc" (需 webrtcvad), "silero" (需 silero-vad)
+VAD_BACKEND = "energy"
+VAD_FRAME_MS = 30
+# 连续语音达到该时长才认为开始说话，用于过滤键盘声等短促噪声
+VAD_MIN_SPEECH_MS = 150
+# 连续静音达到该时长才认为一句话结束
+VAD_HANGOVER_MS = int(WHISPER_SILENCE_THRESHOLD * 1000)
+# 语音段首尾各额外保留的音频
+VAD_SPEECH_PAD_MS = 200
+# energy 后端参数: 高于噪声底的分贝数、绝对能量下限 (dBFS)、频谱平坦度上限
+VAD_ENERGY_MARGIN_DB = 10
+VAD_MIN_ENERGY_DB = -50
+VAD_MAX_SPECTRAL_FLATNESS = 0.5
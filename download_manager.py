@@ -4,7 +4,6 @@ import sys
 import zipfile
 import requests
 from tqdm import tqdm
-from huggingface_hub import snapshot_download
 
 
 # --- 这是一个辅助类，让tqdm进度条能输出到我们的UI日志窗口 ---
@@ -23,6 +22,66 @@ class TqdmToGUILog:
             self.logger.write(self.buffer + '\n')
 
 
+def converted_model_path(model_path: str, suffix: str) -> str:
+    """转换/量化后的模型缓存目录，与原模型放在同一个 models/ 目录下，例如 models/opus-mt-en-zh-ct2-int8。"""
+    return f"{os.path.normpath(model_path)}-{suffix}"
+
+
+def _checkpoint_fingerprint(model_path: str) -> dict:
+    """原模型目录中各文件的大小和修改时间，原模型更新后据此判断量化缓存已经过期。"""
+    fingerprint = {}
+    for name in sorted(os.listdir(model_path)):
+        path = os.path.join(model_path, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            fingerprint[name] = [stat.st_size, stat.st_mtime_ns]
+    return fingerprint
+
+
+def load_torch_int8_model(model_class, model_path: str, description: str):
+    """
+    torch 动态 int8 量化（Linear 层）的 transformers 模型，量化后的权重缓存到 models/<模型名>-torch-int8/。
+    缓存有效时按 config.json 建立模型结构后直接量化并载入缓存的 int8 权重（weights_only=True），
+    不再加载 fp32 权重；原模型目录中的文件有变化时重新量化。
+    """
+    import json
+    import torch
+    from transformers import AutoConfig, GenerationConfig
+
+    cache_dir = converted_model_path(model_path, "torch-int8")
+    cache_file = os.path.join(cache_dir, "state_dict.pt")
+    source_file = os.path.join(cache_dir, "source.json")
+    fingerprint = _checkpoint_fingerprint(model_path)
+    cached_fingerprint = None
+    if os.path.exists(cache_file) and os.path.exists(source_file):
+        with open(source_file, "r", encoding="utf-8") as f:
+            cached_fingerprint = json.load(f)
+
+    if cached_fingerprint == fingerprint:
+        print(f"Loading int8-quantized {description} from '{cache_file}'...")
+        model = model_class.from_config(AutoConfig.from_pretrained(model_path))
+        try:
+            # from_config 不会读取 generation_config.json（Whisper 的语言/任务 token 等都在里面）
+            model.generation_config = GenerationConfig.from_pretrained(model_path)
+        except OSError:
+            pass
+        model.eval()
+        quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        quantized.load_state_dict(torch.load(cache_file, weights_only=True))
+        return quantized
+
+    print(f"Quantizing {description} '{model_path}' to int8 (one-time step)...")
+    model = model_class.from_pretrained(model_path)
+    model.eval()
+    quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    os.makedirs(cache_dir, exist_ok=True)
+    torch.save(quantized.state_dict(), cache_file)
+    with open(source_file, "w", encoding="utf-8") as f:
+        json.dump(fingerprint, f)
+    print(f"Quantized {description} cached at '{cache_file}'.")
+    return quantized
+
+
 def download_hf_model_if_not_exists(model_id: str, local_path: str):
     """
     检查Hugging Face模型是否存在于本地路径，如果不存在则下载。
@@ -32,6 +91,7 @@ def download_hf_model_if_not_exists(model_id: str, local_path: str):
         return
 
     print(f"Model '{model_id}' not found locally. Downloading to '{local_path}'...")
+    from huggingface_hub import snapshot_download
 
     # 确保目标目录存在
     os.makedirs(local_path, exist_ok=True)
@@ -0,0 +1,140 @@
+# inference_pool.py
+# 有界队列 + 固定数量工作线程的推理执行器，结果按提交顺序回调
+import collections
+import threading
+
+QUEUE_POLICIES = ("drop_oldest", "merge")
+
+
+class OrderedResultDispatcher:
+    """
+    重排序缓冲区：工作线程可能乱序完成任务，这里按序号从小到大依次调用 on_result(seq, result, error)。
+    被丢弃的任务需要调用 skip(seq)，否则后面的结果会一直等待它。
+    """
+
+    def __init__(self, on_result):
+        self.on_result = on_result
+        self._lock = threading.Lock()
+        self._next_seq = 0
+        self._pending = {}
+
+    def deliver(self, seq: int, result=None, error=None):
+        self._complete(seq, (result, error))
+
+    def skip(self, seq: int):
+        self._complete(seq, None)
+
+    def _complete(self, seq: int, outcome):
+        with self._lock:
+            self._pending[seq] = outcome
+            while self._next_seq in self._pending:
+                outcome = self._pending.pop(self._next_seq)
+                if outcome is not None:
+                    try:
+                        self.on_result(self._next_seq, *outcome)
+                    except Exception as e:
+                        print(f"Result callback failed for task #{self._next_seq}: {e}")
+                self._next_seq += 1
+
+
+class InferenceExecutor:
+    """
+    单个推理执行器：所有任务进入一个有界队列，由 num_workers 个常驻线程串行/并行处理，
+    不再为每个语音段新建线程，同一个模型也不会被无限多的线程同时调用。
+
+    队列满时的策略:
+      - "drop_oldest": 丢弃队列里最旧的任务（对应的序号会被跳过）
+      - "merge": 用 merge_fn(旧负载, 新负载) 把新任务合并进队尾任务，不丢失音频
+    """
+
+    def __init__(self, handler, on_result, num_workers=1, max_queue_size=4, overflow_policy="drop_oldest",
+                 merge_fn=None, name="inference"):
+        if overflow_policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy: {overflow_policy}. Expected one of {QUEUE_POLICIES}.")
+        if overflow_policy == "merge" and merge_fn is None:
+            raise ValueError("Queue policy 'merge' requires a merge_fn.")
+
+        self.handler = handler
+        self.max_queue_size = max(1, int(max_queue_size))
+        self.overflow_policy = overflow_policy
+        self.merge_fn = merge_fn
+        self.name = name
+        self.dispatcher = OrderedResultDispatcher(on_result)
+
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._next_seq = 0
+        self._shutdown = False
+        self._running_tasks = 0
+        self.dropped_count = 0
+        self.merged_count = 0
+
+        self._workers = [threading.Thread(target=self._worker_loop, name=f"{name}-worker-{i}", daemon=True)
+                         for i in range(max(1, int(num_workers)))]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, payload) -> int:
+        """提交一个任务，返回它的序号（合并时返回被合并任务的序号）。"""
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError(f"Executor '{self.name}' has been shut down.")
+
+            if len(self._queue) >= self.max_queue_size:
+                if self.overflow_policy == "merge":
+                    seq, queued_payload = self._queue[-1]
+                    self._queue[-1] = (seq, self.merge_fn(queued_payload, payload))
+                    self.merged_count += 1
+                    return seq
+                dropped_seq, _ = self._queue.popleft()
+                self.dropped_count += 1
+                print(f"Warning: {self.name} queue full, dropped task #{dropped_seq}.")
+                self.dispatcher.skip(dropped_seq)
+
+            seq = self._next_seq
+            self._next_seq += 1
+            self._queue.append((seq, payload))
+            self._cond.notify()
+            return seq
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def in_flight(self) -> int:
+        """排队中和正在处理的任务总数。"""
+        with self._cond:
+            return len(self._queue) + self._running_tasks
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._shutdown:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                seq, payload = self._queue.popleft()
+                self._running_tasks += 1
+
+            try:
+                result = self.handler(payload)
+            except Exception as e:
+                self.dispatcher.deliver(seq, error=e)
+            else:
+                self.dispatcher.deliver(seq, result=result)
+            finally:
+                with self._cond:
+                    self._running_tasks -= 1
+
+    def shutdown(self, wait=True, cancel_pending=False, timeout=None):
+        """停止接收新任务。默认处理完队列中剩余的任务后工作线程退出。"""
+        with self._cond:
+            self._shutdown = True
+            if cancel_pending:
+                while self._queue:
+                    seq, _ = self._queue.popleft()
+                    self.dispatcher.skip(seq)
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join(timeout)
@@ -0,0 +1,108 @@
+# mel_features.py
+# Whisper 的 log-mel 特征：向量化 STFT（与 transformers 的 WhisperFeatureExtractor 数值一致），
+# 以及随音频到达增量计算、在流式识别反复解码重叠窗口时复用的特征缓存
+import numpy as np
+
+N_FFT = 400
+HOP_LENGTH = 160
+# Whisper 编码器的固定输入长度：30 秒 = 3000 帧
+N_FRAMES = 3000
+# 功率谱的下限，log10 后为 -10
+MEL_FLOOR = 1e-10
+
+_HANN = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(N_FFT) / N_FFT)).astype(np.float32)  # 周期 Hann 窗
+
+
+def _log_mel_frames(padded: np.ndarray, mel_filters: np.ndarray, count: int) -> np.ndarray:
+    """padded[i * HOP_LENGTH : i * HOP_LENGTH + N_FFT] 为第 i 帧，返回 (n_mels, count) 的 log10 mel 能量（未归一化）。"""
+    if count <= 0:
+        return np.zeros((mel_filters.shape[1], 0), dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(padded[:(count - 1) * HOP_LENGTH + N_FFT], N_FFT)[::HOP_LENGTH]
+    power = np.abs(np.fft.rfft(frames * _HANN, axis=1)) ** 2
+    mel = power.astype(np.float32) @ mel_filters
+    return np.log10(np.maximum(mel, MEL_FLOOR)).T
+
+
+def normalize_log_mel(log_mel: np.ndarray) -> np.ndarray:
+    """Whisper 的动态范围压缩：低于最大值 8 (即 80 dB) 的部分截断，再缩放到大约 [-1, 1]。"""
+    log_mel = np.maximum(log_mel, log_mel.max() - 8.0)
+    return (log_mel + 4.0) / 4.0
+
+
+def log_mel_spectrogram(audio: np.ndarray, mel_filters: np.ndarray, n_frames: int = N_FRAMES) -> np.ndarray:
+    """一次性计算一段音频（补齐到 n_frames 帧）的归一化 log-mel 特征，形状 (n_mels, n_frames)。"""
+    features = IncrementalLogMel(mel_filters, n_frames)
+    features.append(audio)
+    return features.features()
+
+
+class IncrementalLogMel:
+    """
+    随音频到达增量计算 log-mel 帧。第 i 帧以第 i * HOP_LENGTH 个采样为中心，完整数据到齐后才计算并缓存，
+    因此流式识别每次重新解码窗口时只需补算最后几帧；trim() 从窗口开头裁掉音频时，保留的帧直接复用。
+    features() 返回补齐到 n_frames 帧并归一化后的编码器输入。
+    """
+
+    def __init__(self, mel_filters: np.ndarray, n_frames: int = N_FRAMES):
+        self.mel_filters = np.asarray(mel_filters, dtype=np.float32)
+        self.n_frames = n_frames
+        self.n_mels = self.mel_filters.shape[1]
+        self.reset()
+
+    def reset(self):
+        self._audio = np.zeros(0, dtype=np.float32)
+        self._frames = np.zeros((self.n_mels, 0), dtype=np.float32)
+
+    @property
+    def num_samples(self) -> int:
+        return len(self._audio)
+
+    @property
+    def cached_frames(self) -> int:
+        return self._frames.shape[1]
+
+    def append(self, samples: np.ndarray):
+        self._audio = np.concatenate((self._audio, np.asarray(samples, dtype=np.float32)))
+        # 第 i 帧需要 [i*HOP - N_FFT/2, i*HOP + N_FFT/2) 的采样，开头不足的部分按 reflect 方式补齐
+        complete = min((len(self._audio) - N_FFT // 2) // HOP_LENGTH + 1, self.n_frames)
+        if complete <= self.cached_frames or len(self._audio) <= N_FFT // 2:
+            return
+        first = self.cached_frames
+        padded = self._padded(first)
+        self._frames = np.concatenate((self._frames, _log_mel_frames(padded, self.mel_filters, complete - first)), axis=1)
+
+    def trim(self, num_samples: int) -> int:
+        """
+        从开头裁掉音频，裁掉的采样数向下取整到 HOP_LENGTH 的整数倍，使保留的帧对齐；返回实际裁掉的采样数。
+        保留的开头两帧沿用裁剪前的真实上下文（而不是 reflect 补齐），与对裁剪后的音频重新计算只差这两帧。
+        """
+        num_samples = max(0, min(num_samples, len(self._audio))) // HOP_LENGTH * HOP_LENGTH
+        self._audio = self._audio[num_samples:]
+        self._frames = self._frames[:, num_samples // HOP_LENGTH:]
+        return num_samples
+
+    def features(self) -> np.ndarray:
+        """(n_mels, n_frames) 的编码器输入：已缓存的帧 + 结尾附近的帧（用补零的音频临时计算）+ 纯补零帧。"""
+        total = self.n_frames
+        first = self.cached_frames
+        # 中心落在音频结尾之后 N_FFT/2 以内的帧仍然覆盖部分音频，需要补零后计算
+        partial_end = min(total, -(-(len(self._audio) + N_FFT // 2) // HOP_LENGTH))
+        tail = np.zeros((self.n_mels, 0), dtype=np.float32)
+        if partial_end > first and len(self._audio) > 0:
+            padded = self._padded(first, zero_pad=N_FFT)
+            tail = _log_mel_frames(padded, self.mel_filters, partial_end - first)
+        silence = np.full((self.n_mels, total - first - tail.shape[1]), np.log10(MEL_FLOOR), dtype=np.float32)
+        return normalize_log_mel(np.concatenate((self._frames, tail, silence), axis=1))
+
+    def _padded(self, first_frame: int, zero_pad: int = 0) -> np.ndarray:
+        """
+        返回从第 first_frame 帧的窗口起点开始的音频（开头 reflect 补齐，结尾可补零）。
+        与参考实现一样先补零再 reflect：音频不足 N_FFT/2 个采样时，开头 reflect 进来的部分包括补的零。
+        """
+        audio = self._audio
+        if zero_pad:
+            audio = np.concatenate((audio, np.zeros(zero_pad, dtype=np.float32)))
+        start = first_frame * HOP_LENGTH - N_FFT // 2
+        if start >= 0:
+            return audio[start:]
+        return np.concatenate((audio[1:1 - start][::-1], audio))
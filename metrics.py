@@ -0,0 +1,205 @@
+# metrics.py
+# 端到端延迟统计：每个语音段携带各阶段的单调时间戳，汇总成分阶段延迟直方图和各模型的实时率 (RTF)
+import json
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from config import METRICS_LOG_INTERVAL_SECONDS, METRICS_DUMP_PATH
+
+# 直方图桶上限（毫秒），大致按 1-2-5 递增，最后一个桶收纳所有更大的值
+LATENCY_BUCKETS_MS = (5, 10, 20, 50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000, 20000, math.inf)
+
+# SegmentTrace 中相邻时间戳之间的阶段名称
+TRACE_STAGES = (
+    ("vad", "capture", "vad"),  # 语音段最后一个采样被采集 -> VAD 判定语句结束
+    ("stt_queue", "vad", "stt_start"),  # 等待识别线程
+    ("stt", "stt_start", "stt_end"),
+    ("mt_queue", "stt_end", "mt_start"),  # 等待翻译服务凑批
+    ("mt", "mt_start", "mt_end"),
+    ("render", "mt_end", "render"),  # 译文交给界面 -> 界面显示完成
+    ("e2e_final", "capture", "final_render"),  # 说完到原文显示
+    ("e2e", "capture", "render"),  # 说完到译文显示
+)
+
+
+@dataclass
+class SegmentTrace:
+    """
+    一个语音段在流水线中经过各阶段的时间戳，未经过的阶段为 None。
+    所有字段必须来自同一个时钟：流水线中为 Pipeline.clock.now()（默认 SystemClock，即 time.perf_counter()），
+    识别和翻译批次的时刻也由传入同一个 clock 的调度器/翻译服务记录。
+    """
+    segment_id: int
+    audio_seconds: float = 0.0
+    capture: float = None
+    vad: float = None
+    stt_start: float = None
+    stt_end: float = None
+    mt_start: float = None
+    mt_end: float = None
+    final_render: float = None
+    render: float = None
+
+    def stage_latencies(self) -> dict:
+        latencies = {}
+        for stage, start_attr, end_attr in TRACE_STAGES:
+            start, end = getattr(self, start_attr), getattr(self, end_attr)
+            if start is not None and end is not None:
+                latencies[stage] = max(0.0, end - start)
+        return latencies
+
+
+class LatencyHistogram:
+    """固定桶的延迟直方图，分位数按桶内线性插值估算。"""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * len(self.buckets_ms)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        ms = seconds * 1000.0
+        for i, upper in enumerate(self.buckets_ms):
+            if ms <= upper:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """返回第 q 百分位（0-100）的估计值，单位秒。"""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        lower = 0.0
+        for upper, n in zip(self.buckets_ms, self.counts):
+            if n and seen + n >= rank:
+                upper = self.max * 1000.0 if math.isinf(upper) else upper
+                fraction = (rank - seen) / n
+                value = (lower + (upper - lower) * fraction) / 1000.0
+                return min(max(value, self.min), self.max)
+            seen += n
+            lower = upper
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000.0 if self.count else 0.0,
+            "min_ms": self.min * 1000.0 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000.0,
+            "p95_ms": self.percentile(95) * 1000.0,
+            "p99_ms": self.percentile(99) * 1000.0,
+            "max_ms": self.max * 1000.0,
+            "buckets": {("inf" if math.isinf(upper) else str(upper)): n
+                        for upper, n in zip(self.buckets_ms, self.counts)},
+        }
+
+
+class LatencyMetrics:
+    """
+    线程安全的延迟/实时率汇总。
+    record() 记录单个阶段的耗时，record_trace() 拆分一个完整的 SegmentTrace，
+    record_model() 累加某个模型的处理耗时和对应音频时长，RTF = 处理耗时 / 音频时长（小于 1 才跟得上实时）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._models = {}
+        self._started = time.monotonic()
+        self._log_thread = None
+        self._log_stop = threading.Event()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def record_trace(self, trace: SegmentTrace):
+        for stage, seconds in trace.stage_latencies().items():
+            self.record(stage, seconds)
+
+    def record_model(self, model_name: str, processing_seconds: float, audio_seconds: float):
+        with self._lock:
+            stats = self._models.setdefault(model_name, {"calls": 0, "processing_seconds": 0.0, "audio_seconds": 0.0})
+            stats["calls"] += 1
+            stats["processing_seconds"] += processing_seconds
+            stats["audio_seconds"] += audio_seconds
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._models.clear()
+            self._started = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            models = {}
+            for name, stats in self._models.items():
+                rtf = stats["processing_seconds"] / stats["audio_seconds"] if stats["audio_seconds"] else None
+                models[name] = {**stats, "rtf": rtf}
+            return {
+                "uptime_seconds": time.monotonic() - self._started,
+                "stages": {stage: histogram.summary() for stage, histogram in self._histograms.items()},
+                "models": models,
+            }
+
+    def format_summary(self) -> str:
+        """一行文字摘要，用于周期性日志。"""
+        snapshot = self.snapshot()
+        parts = [f"{stage} p50={s['p50_ms']:.0f}ms p95={s['p95_ms']:.0f}ms (n={s['count']})"
+                 for stage, s in snapshot["stages"].items()]
+        parts += [f"{name} RTF={m['rtf']:.2f}" for name, m in snapshot["models"].items() if m["rtf"] is not None]
+        return "Latency: " + ("; ".join(parts) if parts else "no data yet")
+
+    def dump_json(self, path: str = METRICS_DUMP_PATH):
+        if not path:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        print(f"Latency metrics written to '{path}'.")
+
+    def start_periodic_log(self, interval_seconds: float = METRICS_LOG_INTERVAL_SECONDS):
+        """每隔 interval_seconds 打印一次摘要；interval 为 0 或 None 时不启动。"""
+        if not interval_seconds or (self._log_thread and self._log_thread.is_alive()):
+            return
+        stop = self._log_stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval_seconds):
+                print(self.format_summary())
+
+        self._log_thread = threading.Thread(target=run, name="metrics-log", daemon=True)
+        self._log_thread.start()
+
+    def stop_periodic_log(self):
+        self._log_stop.set()
+        self._log_thread = None
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_latency_metrics() -> LatencyMetrics:
+    """进程内共享的延迟统计。"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = LatencyMetrics()
+        return _metrics
@@ -0,0 +1,173 @@
+# model_registry.py
+# 进程内共享的模型注册表：按 (类型, 模型路径, 后端) 缓存已加载的模型，引用计数 + 空闲超时回收 + 内存预算
+import os
+import threading
+import time
+
+from config import MODEL_IDLE_TIMEOUT_SECONDS, MODEL_MEMORY_BUDGET_MB
+
+
+def estimate_model_bytes(model=None, path: str = None) -> int:
+    """估算模型占用的内存：torch 模型按 state_dict 中的张量大小计算，其他引擎（Vosk、CTranslate2）按模型文件大小估算。"""
+    for attr in ("model", "pipe"):
+        module = getattr(model, attr, None)
+        if module is not None and not hasattr(module, "state_dict"):
+            module = getattr(module, "model", None)
+        if module is None or not hasattr(module, "state_dict"):
+            continue
+        size = 0
+        for value in module.state_dict().values():
+            # 动态量化的 Linear 层以 (int8 权重, 偏置) 元组的形式保存
+            for tensor in (value if isinstance(value, tuple) else (value,)):
+                if hasattr(tensor, "element_size"):
+                    size += tensor.numel() * tensor.element_size()
+        if size:
+            return size
+    if not path or not os.path.exists(path):
+        return 0
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+class _Entry:
+    def __init__(self):
+        self.model = None
+        self.refcount = 0
+        self.size_bytes = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()  # 同一个模型只加载一次，其他线程等待加载结果
+
+
+class ModelRegistry:
+    """
+    acquire() 返回已缓存的模型（没有则调用 loader 加载）并增加引用计数，用完后 release()。
+    引用计数为 0 的模型不会立即卸载，而是保留 idle_timeout 秒，期间再次 acquire 可直接复用；
+    加载新模型后所有模型的估算大小超过内存预算时，按最久未使用的顺序卸载空闲模型。
+    """
+
+    def __init__(self, idle_timeout=MODEL_IDLE_TIMEOUT_SECONDS, memory_budget_mb=MODEL_MEMORY_BUDGET_MB):
+        self.idle_timeout = idle_timeout
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024) if memory_budget_mb else None
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def acquire(self, key: tuple, loader, path: str = None):
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+            entry.refcount += 1
+
+        try:
+            with entry.lock:
+                if entry.model is None:
+                    print(f"Loading model {key}...")
+                    entry.model = loader()
+                    entry.size_bytes = estimate_model_bytes(entry.model, path)
+                    with self._lock:
+                        self.loads += 1
+                else:
+                    print(f"Reusing loaded model {key}.")
+                    with self._lock:
+                        self.hits += 1
+        except Exception:
+            with self._lock:
+                entry.refcount -= 1
+                if entry.model is None and entry.refcount == 0 and self._entries.get(key) is entry:
+                    del self._entries[key]
+            raise
+
+        entry.last_used = time.monotonic()
+        self._enforce_budget()
+        return entry.model
+
+    def release(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refcount == 0:
+                return
+            entry.refcount -= 1
+            entry.last_used = time.monotonic()
+            idle = entry.refcount == 0
+        if idle and self.idle_timeout is not None:
+            timer = threading.Timer(self.idle_timeout + 0.1, self.evict_idle)
+            timer.daemon = True
+            timer.start()
+
+    def evict_idle(self, max_idle_seconds: float = None):
+        """卸载空闲时间超过 max_idle_seconds（默认 idle_timeout）的模型。传 0 则卸载所有空闲模型。"""
+        max_idle = self.idle_timeout if max_idle_seconds is None else max_idle_seconds
+        if max_idle is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, entry in self._entries.items()
+                       if entry.refcount == 0 and entry.model is not None and now - entry.last_used >= max_idle]
+        for key in expired:
+            self._evict(key)
+
+    def _enforce_budget(self):
+        if self.memory_budget is None:
+            return
+        with self._lock:
+            total = sum(entry.size_bytes for entry in self._entries.values())
+            idle = sorted((entry.last_used, key) for key, entry in self._entries.items()
+                          if entry.refcount == 0 and entry.model is not None)
+        for _, key in idle:
+            if total <= self.memory_budget:
+                break
+            total -= self._evict(key)
+        if total > self.memory_budget:
+            print(f"Warning: loaded models use ~{total / 1024 / 1024:.0f} MB, "
+                  f"over the {self.memory_budget / 1024 / 1024:.0f} MB budget, but all of them are in use.")
+
+    def _evict(self, key: tuple) -> int:
+        with self._lock:
+            entry = self._entries.get(key)
+            # 等待期间可能又被 acquire 了
+            if entry is None or entry.refcount > 0 or entry.model is None:
+                return 0
+            del self._entries[key]
+            self.evictions += 1
+        print(f"Unloading idle model {key} (~{entry.size_bytes / 1024 / 1024:.0f} MB).")
+        if hasattr(entry.model, "unload"):
+            entry.model.unload()
+        entry.model = None
+        _empty_cuda_cache()
+        return entry.size_bytes
+
+    def clear(self):
+        """卸载所有空闲模型。"""
+        self.evict_idle(0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "models": len(self._entries),
+                "in_use": sum(1 for entry in self._entries.values() if entry.refcount > 0),
+                "memory_mb": sum(entry.size_bytes for entry in self._entries.values()) / 1024 / 1024,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+def _empty_cuda_cache():
+    import torch
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """进程内共享的模型注册表。"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -0,0 +1,210 @@
+# mt_backends.py
+# 翻译模型推理后端：transformers (fp32)、torch 动态 int8 量化、CTranslate2 int8
+import os
+import threading
+import time
+
+import torch
+
+from config import MT_DEFAULT_BACKEND
+from download_manager import converted_model_path, load_torch_int8_model
+
+
+class MTBackend:
+    """
+    翻译后端接口。所有后端共用 Hugging Face 的 tokenizer，只是编码/解码的推理引擎不同。
+    token id 序列（不含起始符和结束符）用于增量翻译时的解码器前缀。
+    """
+    name = None
+
+    def __init__(self, model_path: str, device: str):
+        self.model_path = model_path
+        self.device = device
+        self.tokenizer = None
+        # 同一个后端实例可能被多个 MachineTranslator 共享（见 model_registry），推理串行执行
+        self.generate_lock = threading.Lock()
+
+    def load(self):
+        raise NotImplementedError
+
+    def translate_batch(self, texts: list) -> list:
+        raise NotImplementedError
+
+    def translate_with_prefix(self, text: str, prefix_ids=None):
+        """返回 (译文, 译文 token id 列表)。"""
+        raise NotImplementedError
+
+    def encode_target(self, translated_text: str) -> list:
+        return self.tokenizer(text_target=translated_text, add_special_tokens=False).input_ids
+
+    def unload(self):
+        self.tokenizer = None
+
+
+class TransformersMTBackend(MTBackend):
+    """原有的 transformers 路径：AutoModelForSeq2SeqLM + generate()。"""
+    name = "transformers"
+
+    def __init__(self, model_path: str, device: str):
+        super().__init__(model_path, device)
+        self.model = None
+
+    def load(self):
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+        self.model = self._load_model()
+        self.model.to(self.device)
+        self.model.eval()
+
+    def _load_model(self):
+        from transformers import AutoModelForSeq2SeqLM
+
+        return AutoModelForSeq2SeqLM.from_pretrained(self.model_path)
+
+    def translate_batch(self, texts: list) -> list:
+        inputs = self.tokenizer(texts, return_tensors="pt", padding=True, truncation=True).to(self.device)
+        with torch.no_grad():
+            outputs = self.model.generate(**inputs, max_length=512)
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+    def translate_with_prefix(self, text: str, prefix_ids=None):
+        inputs = self.tokenizer([text], return_tensors="pt", truncation=True).to(self.device)
+        decoder_input_ids = torch.tensor([[self.model.config.decoder_start_token_id] + list(prefix_ids or [])],
+                                         device=self.device)
+        with torch.no_grad():
+            outputs = self.model.generate(**inputs, decoder_input_ids=decoder_input_ids, max_length=512)
+
+        special_ids = {self.tokenizer.pad_token_id, self.tokenizer.eos_token_id}
+        output_ids = [token_id for token_id in outputs[0].tolist()[1:] if token_id not in special_ids]
+        return self.tokenizer.decode(output_ids, skip_special_tokens=True), output_ids
+
+    def unload(self):
+        super().unload()
+        self.model = None
+
+
+class TorchInt8MTBackend(TransformersMTBackend):
+    """
+    torch 动态量化：Linear 层权重转为 int8，只支持 CPU。
+    量化后的 int8 权重缓存到 models/<模型名>-torch-int8/，之后不再加载 fp32 权重（见 download_manager.load_torch_int8_model）。
+    """
+    name = "torch-int8"
+
+    def __init__(self, model_path: str, device: str):
+        super().__init__(model_path, "cpu")
+
+    def _load_model(self):
+        from transformers import AutoModelForSeq2SeqLM
+
+        return load_torch_int8_model(AutoModelForSeq2SeqLM, self.model_path, "translation model")
+
+
+class CTranslate2MTBackend(MTBackend):
+    """
+    CTranslate2 int8 推理引擎（需 pip install ctranslate2）。
+    首次使用时把 transformers 模型转换到 models/<模型名>-ct2-int8/，之后直接加载转换结果。
+    """
+    name = "ctranslate2"
+
+    def __init__(self, model_path: str, device: str):
+        super().__init__(model_path, "cuda" if device == "cuda" else "cpu")
+        self.translator = None
+
+    def load(self):
+        try:
+            import ctranslate2
+        except ImportError:
+            raise Exception("MT backend 'ctranslate2' requires the 'ctranslate2' package: pip install ctranslate2")
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+        ct2_path = converted_model_path(self.model_path, "ct2-int8")
+        if not os.path.exists(os.path.join(ct2_path, "model.bin")):
+            print(f"Converting translation model '{self.model_path}' to CTranslate2 int8 (one-time step)...")
+            converter = ctranslate2.converters.TransformersConverter(self.model_path)
+            converter.convert(ct2_path, quantization="int8", force=True)
+            print(f"Converted model cached at '{ct2_path}'.")
+        compute_type = "int8_float16" if self.device == "cuda" else "int8"
+        self.translator = ctranslate2.Translator(ct2_path, device=self.device, compute_type=compute_type)
+
+    def _source_tokens(self, text: str) -> list:
+        return self.tokenizer.convert_ids_to_tokens(self.tokenizer.encode(text, truncation=True))
+
+    def _decode(self, tokens: list):
+        output_ids = [token_id for token_id in self.tokenizer.convert_tokens_to_ids(tokens)
+                      if token_id not in (self.tokenizer.pad_token_id, self.tokenizer.eos_token_id)]
+        return self.tokenizer.decode(output_ids, skip_special_tokens=True), output_ids
+
+    def translate_batch(self, texts: list) -> list:
+        results = self.translator.translate_batch([self._source_tokens(text) for text in texts],
+                                                  max_decoding_length=512)
+        return [self._decode(result.hypotheses[0])[0] for result in results]
+
+    def translate_with_prefix(self, text: str, prefix_ids=None):
+        target_prefix = [self.tokenizer.convert_ids_to_tokens(list(prefix_ids))] if prefix_ids else None
+        result = self.translator.translate_batch([self._source_tokens(text)], target_prefix=target_prefix,
+                                                 max_decoding_length=512)[0]
+        return self._decode(result.hypotheses[0])
+
+    def unload(self):
+        super().unload()
+        self.translator = None
+
+
+MT_BACKENDS = {
+    TransformersMTBackend.name: TransformersMTBackend,
+    TorchInt8MTBackend.name: TorchInt8MTBackend,
+    CTranslate2MTBackend.name: CTranslate2MTBackend,
+}
+
+
+def create_mt_backend(model_info: dict, device: str) -> MTBackend:
+    backend_name = model_info.get("backend", MT_DEFAULT_BACKEND)
+    backend_cls = MT_BACKENDS.get(backend_name)
+    if backend_cls is None:
+        raise Exception(f"Unknown MT backend: {backend_name}. Available: {', '.join(MT_BACKENDS)}")
+    return backend_cls(model_info["model_path"], device)
+
+
+# 用于核对不同后端输出是否一致的参考句子
+REFERENCE_SENTENCES = [
+    "Hello, how are you today?",
+    "Thank you very much for joining the meeting.",
+    "Let's move on to the next item on the agenda.",
+    "Could you please share your screen?",
+    "I think we should finish this by the end of the week.",
+    "The quarterly results were better than expected.",
+]
+
+if __name__ == "__main__":
+    # 用法: python mt_backends.py [翻译模型显示名称]
+    # 用参考句子比较各后端与 transformers 基准的输出和速度
+    import sys
+    from config import HF_TRANSLATION_MODELS, DEFAULT_TRANSLATION_MODEL
+    from download_manager import download_hf_model_if_not_exists
+
+    model_name = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TRANSLATION_MODEL
+    model_info = HF_TRANSLATION_MODELS[model_name]
+    download_hf_model_if_not_exists(model_info["model_id"], model_info["model_path"])
+
+    reference = None
+    for name, backend_cls in MT_BACKENDS.items():
+        backend = backend_cls(model_info["model_path"], "cpu")
+        try:
+            backend.load()
+        except Exception as e:
+            print(f"[{name}] skipped: {e}")
+            continue
+        start = time.perf_counter()
+        outputs = [backend.translate_batch([sentence])[0] for sentence in REFERENCE_SENTENCES]
+        per_sentence_ms = (time.perf_counter() - start) / len(REFERENCE_SENTENCES) * 1000
+        if reference is None:
+            reference = outputs
+        matches = sum(a == b for a, b in zip(outputs, reference))
+        print(f"[{name}] {per_sentence_ms:.1f} ms/sentence, identical to transformers: "
+              f"{matches}/{len(REFERENCE_SENTENCES)}")
+        for source, output, expected in zip(REFERENCE_SENTENCES, outputs, reference):
+            if output != expected:
+                print(f"    {source}\n      transformers: {expected}\n      {name}: {output}")
+        backend.unload()
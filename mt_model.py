@@ -1,17 +1,33 @@
 # mt_model.py
 import os
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 import torch
-from config import HF_TRANSLATION_MODELS
+from config import (HF_TRANSLATION_MODELS, MT_MAX_BATCH_SIZE, MT_BATCH_WAIT_MS, MT_CACHE_ENABLED, MT_FANOUT_WORKERS,
+                    PARTIAL_TRANSLATION_INTERVAL_MS, PARTIAL_STABLE_UPDATES, PARTIAL_TRANSLATION_MASK_TOKENS)
+from translation_cache import get_translation_cache
+from mt_backends import create_mt_backend
+from model_registry import get_model_registry
+from audio_source import SystemClock
 
 # 从我们自己的下载管理器导入函数
 from download_manager import download_hf_model_if_not_exists
 
 
 class MachineTranslator:
-    def __init__(self, model_name: str):
-        self.tokenizer = None
-        self.model = None
+    def __init__(self, model_name: str, cache=None):
+        self.model_name = model_name
+        self.backend = None
+        self._registry_key = None
+        # 译文缓存中区分模型的键：模型路径 + 推理后端，更换后端后不会再用到旧后端的译文
+        self.cache_key = None
+        # 译文缓存，默认使用进程内共享的 LRU 缓存；MT_CACHE_ENABLED=False 时不缓存
+        self.cache = cache if cache is not None else (get_translation_cache() if MT_CACHE_ENABLED else None)
+        # 翻译服务和增量翻译可能在不同线程中调用同一个模型，推理串行执行（锁属于共享的后端实例）
+        self._generate_lock = threading.Lock()
 
         if torch.cuda.is_available():
             self.device = "cuda"
@@ -31,32 +47,469 @@ class MachineTranslator:
         model_path = model_info["model_path"]
 
         print(f"Initializing translation model: {model_name}")
+        self.model_name = model_name
 
-        if self.tokenizer: del self.tokenizer
-        if self.model: del self.model
-        if self.device == "cuda": torch.cuda.empty_cache()
+        self.release()
+        self.backend = None
 
         # 1. 调用下载器确保翻译模型存在
         print(f"Checking for translation model '{model_id}'...")
         download_hf_model_if_not_exists(model_id, model_path)
 
-        print(f"Loading translation model from local path: '{model_path}'...")
+        # 2. 按配置的后端从本地路径加载（必要时先做一次性的量化/转换）；已加载过的同一模型直接复用
+        backend = create_mt_backend(model_info, self.device)
+        key = ("mt", os.path.normpath(model_path), backend.name, backend.device)
 
-        # 2. 从本地路径加载
-        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-        self.model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
-        self.model.to(self.device)
-        self.model.eval()
+        def load():
+            print(f"Loading translation model from local path: '{model_path}' (backend: {backend.name})...")
+            backend.load()
+            return backend
+
+        self.backend = get_model_registry().acquire(key, load, model_path)
+        self._registry_key = key
+        self.cache_key = f"{os.path.normpath(model_path)}|{backend.name}"
+        self._generate_lock = self.backend.generate_lock
         print(f"Translation model '{model_name}' loaded successfully.")
 
+    def release(self):
+        """
+        Returns the model to the registry; it stays loaded for reuse until it is evicted.
+        The backend reference is kept so that already-queued translations can still finish.
+        """
+        if self._registry_key:
+            get_model_registry().release(self._registry_key)
+            self._registry_key = None
+
     def translate_text(self, text: str) -> str:
-        if not text.strip() or not self.model:
+        if not text.strip() or not self.backend:
             return ""
+        return self.translate_batch([text])[0]
+
+    def translate_batch(self, texts: list) -> list:
+        """Translates several sentences in a single batched backend call, skipping cached ones."""
+        results = [""] * len(texts)
+        if not self.backend:
+            return results
+
+        # 命中缓存的句子直接返回；未命中的句子去重后再送进模型
+        pending = {}
+        for i, text in enumerate(texts):
+            if not text.strip():
+                continue
+            cached = self.cache.get(self.cache_key, text) if self.cache else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.setdefault(text, []).append(i)
+        if not pending:
+            return results
+
+        sources = list(pending)
+        with self._generate_lock:
+            translations = self.backend.translate_batch(sources)
+
+        for text, translated_text in zip(sources, translations):
+            if self.cache:
+                self.cache.put(self.cache_key, text, translated_text)
+            for i in pending[text]:
+                results[i] = translated_text
+        return results
+
+    def translate_with_prefix(self, text: str, prefix_ids=None):
+        """
+        Translates text with the decoder forced to start from prefix_ids (tokens of an earlier translation),
+        so only the new tail has to be decoded. Returns (translated_text, output_token_ids).
+        """
+        if not text.strip() or not self.backend:
+            return "", []
+
+        cached = self.cache.get(self.cache_key, text) if self.cache else None
+        if cached is not None:
+            return cached, self.backend.encode_target(cached)
+
+        with self._generate_lock:
+            return self.backend.translate_with_prefix(text, prefix_ids)
+
+
+def translation_hops(model_name: str, _seen=()) -> list:
+    """
+    依次经过的直接翻译模型名称：普通模型就是它自己，链式模型按 "chain" 展开（可以嵌套），
+    并检查每一跳的目标语言与下一跳的源语言一致。
+    """
+    model_info = HF_TRANSLATION_MODELS.get(model_name)
+    if not model_info:
+        raise Exception(f"Unknown translation model name: {model_name}.")
+    if "chain" not in model_info:
+        return [model_name]
+    if model_name in _seen:
+        raise Exception(f"Configuration error: translation chain '{model_name}' refers to itself.")
+
+    hops = [hop for step in model_info["chain"] for hop in translation_hops(step, _seen + (model_name,))]
+    languages = [model_info["src"]] + [lang for hop in hops for lang in
+                                       (HF_TRANSLATION_MODELS[hop]["src"], HF_TRANSLATION_MODELS[hop]["tgt"])]
+    languages.append(model_info["tgt"])
+    # 相邻两项应两两相等: 链的源语言 = 第一跳的源语言，第 i 跳的目标语言 = 第 i+1 跳的源语言，……
+    for previous, following in zip(languages[::2], languages[1::2]):
+        if previous != following and "multilingual" not in (previous, following):
+            raise Exception(f"Configuration error: translation chain '{model_name}' "
+                            f"({' -> '.join(hops)}) does not connect {previous} to {following}.")
+    return hops
+
+
+class ChainedTranslator:
+    """
+    经中转语言的链式翻译（config 中带 "chain" 的模型，例如 日文->英文->中文），接口与 MachineTranslator 相同。
+    每一跳都是普通的 MachineTranslator，通过模型注册表共享已加载的直接翻译模型；
+    中间译文按每一跳的模型名写入译文缓存，同一原文再次出现时不必重新翻译。
+    """
+
+    def __init__(self, model_name: str, cache=None):
+        self.model_name = model_name
+        self.hops = []
+        try:
+            for hop in translation_hops(model_name):
+                self.hops.append(MachineTranslator(model_name=hop, cache=cache))
+        except Exception:
+            self.release()
+            raise
+        self.cache = self.hops[0].cache
+        print(f"Translation chain '{model_name}' ready: {' -> '.join(hop.model_name for hop in self.hops)}.")
+
+    def release(self):
+        for hop in self.hops:
+            hop.release()
+
+    def translate_text(self, text: str) -> str:
+        return self.translate_batch([text])[0]
+
+    def translate_batch(self, texts: list) -> list:
+        for hop in self.hops:
+            texts = hop.translate_batch(texts)
+        return texts
+
+    def translate_with_prefix(self, text: str, prefix_ids=None):
+        """只有最后一跳沿用上次译文的前缀，前面几跳整句翻译（命中缓存时不需要推理）。"""
+        for hop in self.hops[:-1]:
+            text = hop.translate_text(text)
+        return self.hops[-1].translate_with_prefix(text, prefix_ids)
+
+
+def create_translator(model_name: str, cache=None):
+    """按配置创建直接翻译模型 (MachineTranslator) 或经中转语言的链式翻译 (ChainedTranslator)。"""
+    if "chain" in HF_TRANSLATION_MODELS.get(model_name, {}):
+        return ChainedTranslator(model_name, cache=cache)
+    return MachineTranslator(model_name, cache=cache)
+
+
+class TranslationService:
+    """
+    MachineTranslator 外的异步微批处理服务。
+    submit() 立即返回 Future；后台线程在收到第一句后最多再等 batch_wait_ms 或凑满 max_batch_size 句，
+    然后用一次 generate() 翻译整批，并按提交顺序完成各自的 Future。识别线程因此不会再等待翻译。
+    完成的 Future 带有 batch_started / batch_finished (clock.now()，默认 time.perf_counter()) 和 batch_size 属性，用于延迟统计。
+    给了 executor 时整批翻译在该线程池中执行（多个服务共享，限制同时进行的翻译数），仍然一批完成后才开始下一批。
+    """
+
+    def __init__(self, translator: MachineTranslator, max_batch_size=MT_MAX_BATCH_SIZE,
+                 batch_wait_ms=MT_BATCH_WAIT_MS, executor=None, clock=None):
+        self.translator = translator
+        self.executor = executor
+        self.clock = clock or SystemClock()
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.batch_wait = batch_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._shutdown = False
+        # 检查 _shutdown 与放入队列必须一起完成，否则 shutdown() 的结束标记之后放入的句子永远不会被翻译
+        self._shutdown_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._batch_loop, name="translation-service", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        with self._shutdown_lock:
+            shut_down = self._shutdown
+            if not shut_down and text.strip():
+                self._queue.put((text, future))
+        if shut_down:
+            future.set_exception(RuntimeError("Translation service has been shut down."))
+        elif not text.strip():
+            future.set_result("")
+        return future
+
+    def translate(self, text: str, timeout=None) -> str:
+        """Synchronous helper: submits and waits for the result."""
+        return self.submit(text).result(timeout)
+
+    def _collect_batch(self, first_item) -> list:
+        batch = [first_item]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _batch_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = self._collect_batch(item)
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            if self.executor is not None:
+                try:
+                    self.executor.submit(self._run_batch, batch).result()
+                    continue
+                except RuntimeError:
+                    # 共享线程池已关闭，剩下的批次在本线程中完成
+                    pass
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list):
+        started = self.clock.now()
+        try:
+            results = self.translator.translate_batch([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            finished = self.clock.now()
+            for (_, future), translated_text in zip(batch, results):
+                future.batch_started, future.batch_finished, future.batch_size = started, finished, len(batch)
+                future.set_result(translated_text)
+
+    def shutdown(self, wait=True, timeout=None):
+        """停止接收新句子，已排队的句子仍会被翻译完。"""
+        with self._shutdown_lock:
+            if not self._shutdown:
+                self._shutdown = True
+                self._queue.put(None)
+        if wait:
+            self._thread.join(timeout)
+
+
+class TranslationFanout:
+    """
+    一路识别结果同时翻译成多个目标语言，识别只做一次。
+    每个目标语言展开成一串直接翻译模型（链式翻译有多跳），每一跳一个 TranslationService（各自微批处理、按提交顺序完成）；
+    前几跳相同的目标（例如都先翻译成英文）共用同一个服务，每句原文的中间译文只算一次，再分别交给下一跳。
+    所有批次在同一个线程池中并发执行，线程池大小 max_workers 限制同时进行的翻译数。
+    每个目标语言只能对应一个模型，第一个模型为主目标。
+    """
+
+    def __init__(self, translators: list, max_workers=MT_FANOUT_WORKERS, clock=None):
+        targets = [translation_target(translator.model_name) for translator in translators]
+        for translator, target in zip(translators, targets):
+            if targets.count(target) > 1:
+                raise ValueError(f"Translation model '{translator.model_name}' duplicates target language "
+                                 f"'{target}'; use one model per target language.")
+        # 目标语言 -> 翻译模型，按给出的顺序
+        self.translators = dict(zip(targets, translators))
+
+        # 每一跳按 (从原文开始经过的模型名, ...) 建立服务；_routes 为每个目标语言依次经过的各跳
+        stages, self._routes = {}, {}
+        for target, translator in self.translators.items():
+            route, prefix = [], ()
+            for hop in getattr(translator, "hops", [translator]):
+                prefix += (hop.model_name,)
+                stages.setdefault(prefix, hop)
+                route.append(prefix)
+            self._routes[target] = route
+
+        self._executor = None
+        if len(stages) > 1:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)),
+                                                thread_name_prefix="translation-fanout")
+        self._stages = {prefix: TranslationService(hop, executor=self._executor, clock=clock)
+                        for prefix, hop in stages.items()}
+
+    @property
+    def primary_target(self) -> str:
+        return next(iter(self.translators))
+
+    @property
+    def targets(self) -> list:
+        return list(self.translators)
+
+    def submit(self, text: str) -> dict:
+        """把一句原文提交给所有目标语言，返回 {目标语言: Future}。"""
+        futures = {}
+        for route in self._routes.values():
+            for i, prefix in enumerate(route):
+                if prefix not in futures:
+                    service = self._stages[prefix]
+                    futures[prefix] = service.submit(text) if i == 0 else _chain_future(futures[route[i - 1]], service)
+        return {target: futures[route[-1]] for target, route in self._routes.items()}
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        停止接收新句子，已排队的句子仍会被翻译完；wait=False 时在后台等待它们完成后关闭线程池。
+        按跳数从前往后依次关闭，前一跳排队的句子完成后还要交给下一跳。
+        """
+        depths = sorted({len(prefix) for prefix in self._stages})
+        levels = [[service for prefix, service in self._stages.items() if len(prefix) == depth] for depth in depths]
+        executor = self._executor
+
+        def close():
+            for level in levels:
+                for service in level:
+                    service.shutdown(wait=True)
+            if executor:
+                executor.shutdown(wait=False)
+
+        for service in levels[0]:
+            service.shutdown(wait=False)
+        if wait:
+            close()
+        else:
+            threading.Thread(target=close, name="translation-fanout-shutdown", daemon=True).start()
+
+
+def _chain_future(previous: Future, service: TranslationService) -> Future:
+    """previous 完成后把它的译文提交给下一跳 service，返回最终译文的 Future。"""
+    result = Future()
+
+    def forward(f):
+        # 调用方取消了最终译文（例如客户端已断开）时不必再翻译下一跳
+        if f.cancelled() or result.cancelled():
+            result.cancel()
+            return
+        try:
+            intermediate = f.result()
+        except Exception as e:
+            result.set_exception(e)
+            return
+        service.submit(intermediate).add_done_callback(finish)
+
+    def finish(f):
+        if result.cancelled():
+            return
+        try:
+            translated_text = f.result()
+        except Exception as e:
+            result.set_exception(e)
+            return
+        # 延迟统计：从第一跳开始翻译算到最后一跳完成，按最后一跳的批大小平摊
+        if hasattr(f, "batch_started"):
+            result.batch_started = getattr(previous, "batch_started", f.batch_started)
+            result.batch_finished, result.batch_size = f.batch_finished, f.batch_size
+        result.set_result(translated_text)
+
+    previous.add_done_callback(forward)
+    return result
+
+
+def translation_target(model_name: str) -> str:
+    """翻译模型的目标语言代码（config.HF_TRANSLATION_MODELS 中的 "tgt"）。"""
+    return HF_TRANSLATION_MODELS.get(model_name, {}).get("tgt", model_name)
+
+
+class IncrementalTranslator:
+    """
+    临时识别结果的增量翻译（可选功能）。
+
+    - 只翻译连续 stable_updates 次临时结果中都没有变化的词前缀，不追着抖动的尾巴翻译
+    - 最多每 interval_ms 翻译一次，期间只保留最新的一条待翻译文本
+    - 原文在上次翻译的基础上继续增长时，把上次译文去掉末尾 mask_tokens 个 token 后作为解码器前缀复用，
+      只需解码新增部分；完全相同的原文直接命中翻译缓存
+    结果通过 on_translation(timestamp, source_text, translated_text) 在后台线程中回调。
+    """
+
+    def __init__(self, translator: MachineTranslator, on_translation, interval_ms=PARTIAL_TRANSLATION_INTERVAL_MS,
+                 stable_updates=PARTIAL_STABLE_UPDATES, mask_tokens=PARTIAL_TRANSLATION_MASK_TOKENS):
+        self.translator = translator
+        self.on_translation = on_translation
+        self.interval = interval_ms / 1000.0
+        self.mask_tokens = max(0, int(mask_tokens))
+
+        self._cond = threading.Condition()
+        self._history = collections.deque(maxlen=max(1, int(stable_updates)))
+        self._generation = 0  # 每句话结束时加一，丢弃过时的临时译文
+        self._latest = None  # (generation, timestamp, words)
+        self._queued_words = []
+        self._last_run = 0.0
+        self._shutdown = False
+
+        # 仅由工作线程访问：上一次翻译的原文与译文 token，用作下一次的解码前缀
+        self._state_generation = -1
+        self._last_source_words = []
+        self._last_output_ids = []
+
+        self._thread = threading.Thread(target=self._worker_loop, name="partial-translation", daemon=True)
+        self._thread.start()
+
+    def submit(self, timestamp: str, partial_text: str):
+        """由识别线程调用，只做轻量的前缀比较，不会阻塞。"""
+        with self._cond:
+            self._history.append(partial_text.split())
+            if len(self._history) < self._history.maxlen:
+                return
+            stable = list(self._history[0])
+            for words in self._history:
+                n = 0
+                while n < min(len(stable), len(words)) and stable[n] == words[n]:
+                    n += 1
+                stable = stable[:n]
+            if not stable or stable == self._queued_words:
+                return
+            self._queued_words = stable
+            self._latest = (self._generation, timestamp, stable)
+            self._cond.notify()
+
+    def reset(self):
+        """当前这句话已经得到最终结果，丢弃其临时状态。"""
+        with self._cond:
+            self._generation += 1
+            self._history.clear()
+            self._latest = None
+            self._queued_words = []
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._shutdown and \
+                        (self._latest is None or time.monotonic() < self._last_run + self.interval):
+                    timeout = None if self._latest is None else self._last_run + self.interval - time.monotonic()
+                    self._cond.wait(timeout)
+                if self._shutdown:
+                    return
+                generation, timestamp, words = self._latest
+                self._latest = None
+                self._last_run = time.monotonic()
+
+            if generation != self._state_generation:
+                self._state_generation = generation
+                self._last_source_words = []
+                self._last_output_ids = []
+
+            prefix_ids = None
+            if self._last_source_words and words[:len(self._last_source_words)] == self._last_source_words:
+                keep = len(self._last_output_ids) - self.mask_tokens
+                prefix_ids = self._last_output_ids[:keep] if keep > 0 else None
 
-        inputs = self.tokenizer(text, return_tensors="pt", padding=True, truncation=True).to(self.device)
+            source_text = " ".join(words)
+            try:
+                translated_text, output_ids = self.translator.translate_with_prefix(source_text, prefix_ids)
+            except Exception as e:
+                print(f"Partial translation failed: {e}")
+                continue
+            self._last_source_words = words
+            self._last_output_ids = output_ids
 
-        with torch.no_grad():
-            outputs = self.model.generate(**inputs, max_length=512)
+            with self._cond:
+                # 在锁内回调，保证 reset() 之后不会再冒出这句话的临时译文
+                if translated_text and generation == self._generation:
+                    self.on_translation(timestamp, source_text, translated_text)
 
-        translated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        return translated_text
+    def shutdown(self):
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
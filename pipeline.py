@@ -0,0 +1,715 @@
+# pipeline.py
+# 与界面无关的 录音 -> 识别 -> 翻译 流水线，通过类型化事件向订阅者（Tk 界面、命令行、服务端）输出结果
+import itertools
+import json
+import queue
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import ClassVar
+
+import numpy as np
+
+from audio_io import AudioRecorder
+from audio_source import AudioSource, SystemClock, AdaptiveChunkSize, get_latency_profile, ms_to_samples
+from vad import create_vad, SpeechSegmenter
+from inference_pool import InferenceExecutor
+from model_registry import get_model_registry
+from metrics import SegmentTrace, get_latency_metrics
+from config import (STT_MODELS, HF_TRANSLATION_MODELS, SAMPLE_RATE, WHISPER_MAX_AUDIO_SECONDS, VAD_BACKEND,
+                    WHISPER_WORKERS, WHISPER_QUEUE_SIZE, WHISPER_QUEUE_POLICY, WHISPER_STREAMING,
+                    TRANSLATE_PARTIALS, METRICS_DUMP_PATH, AUDIO_READ_TIMEOUT_SECONDS)
+
+# 等待界面确认显示的语音段延迟记录上限，订阅者从不调用 mark_rendered() 时防止无限增长
+MAX_PENDING_TRACES = 256
+# Whisper 识别一个语音段期间显示的临时结果占位，不是真正的识别内容
+PROCESSING_PLACEHOLDER = "(Processing...)"
+
+
+@dataclass
+class PartialEvent:
+    """临时识别结果，会被后续的 PartialEvent / FinalEvent 覆盖。"""
+    kind: ClassVar[str] = "partial"
+    timestamp: str
+    text: str
+
+
+@dataclass
+class FinalEvent:
+    """一句话的最终识别结果。text 为空表示该语音段没有识别出内容。segment_id 用于延迟统计（见 Pipeline.mark_rendered）。"""
+    kind: ClassVar[str] = "final"
+    timestamp: str
+    text: str
+    segment_id: int = None
+
+
+@dataclass
+class TranslationEvent:
+    """译文。partial=True 表示基于临时识别结果的临时译文。target_lang 为目标语言代码，同时翻译成多个目标语言时用于区分。"""
+    kind: ClassVar[str] = "translation"
+    timestamp: str
+    source_text: str
+    text: str
+    partial: bool = False
+    segment_id: int = None
+    target_lang: str = None
+
+
+@dataclass
+class TimingEvent:
+    """某个处理阶段的耗时。audio_seconds 为该次处理对应的音频时长（用于计算实时率）。"""
+    kind: ClassVar[str] = "timing"
+    stage: str
+    seconds: float
+    audio_seconds: float = 0.0
+
+
+@dataclass
+class ModelLoadEvent:
+    """模型加载进度。stage 为 "stt" 或 "mt"，status 依次为 "loading"、"ready"（或 "failed"）。"""
+    kind: ClassVar[str] = "model_load"
+    stage: str
+    model_name: str
+    status: str
+    seconds: float = 0.0
+    message: str = ""
+
+
+@dataclass
+class ErrorEvent:
+    kind: ClassVar[str] = "error"
+    source: str
+    message: str
+
+
+def event_to_dict(event) -> dict:
+    """把事件转换成可 JSON 序列化的字典，"type" 字段为事件类型。"""
+    return {"type": event.kind, **asdict(event)}
+
+
+class Pipeline:
+    """
+    实时翻译流水线：管理录音、识别、翻译各组件及其工作线程。
+    所有事件都在后台线程中同步回调给订阅者，订阅者应尽快返回（例如转发到自己的事件循环或队列）。
+    clock 用于时间戳和延迟统计，测试时可以传入 audio_source.ManualClock 配合文件/合成音源全速运行。
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock or SystemClock()
+        self.latency_profile = get_latency_profile()
+        self.recorder = None
+        self.stt = None
+        # 可以同时加载多个翻译模型（每个目标语言一个），self.translator 为第一个（主目标）
+        self.translators = {}
+        self.translator = None
+        self.translation_fanout = None
+        self.partial_translator = None
+
+        self._running = False
+        self._audio_thread = None
+        self._whisper_executor = None
+        self._whisper_scheduler = None
+        self._subscribers = []
+        self._load_lock = threading.Lock()
+
+        # 延迟统计：segment_id -> SegmentTrace，界面显示译文后汇总到 metrics
+        self.metrics = get_latency_metrics()
+        self._traces = {}
+        self._traces_lock = threading.Lock()
+        self._segment_ids = itertools.count(1)
+        self._pending_translations = 0
+
+        self.current_input_device_id = None
+        self.current_stt_model_name = None
+        self.current_mt_model_name = None
+        self.current_mt_model_names = []
+        self._current_input_lang_code = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def subscribe(self, callback):
+        """注册事件回调 callback(event)。"""
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def subscribe_queue(self, maxsize=0, target_lang: str = None) -> queue.Queue:
+        """
+        以队列方式订阅事件，适合在自己的线程/事件循环中消费。
+        给了 target_lang 时只接收该目标语言的译文（其他事件照常接收），每个目标语言可以各自订阅一路事件流。
+        """
+        event_queue = queue.Queue(maxsize)
+        if target_lang is None:
+            self.subscribe(event_queue.put)
+        else:
+            self.subscribe(lambda event: None if isinstance(event, TranslationEvent)
+                           and event.target_lang != target_lang else event_queue.put(event))
+        return event_queue
+
+    def _emit(self, event):
+        for callback in list(self._subscribers):
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Pipeline event subscriber failed: {e}")
+
+    @property
+    def input_finished(self) -> bool:
+        """音频来源已经放完（文件回放、合成音源），且处理线程已处理完最后一块音频。实时录音永远不会结束。"""
+        return bool(self.recorder and self.recorder.finished
+                    and not (self._audio_thread and self._audio_thread.is_alive()))
+
+    def is_idle(self) -> bool:
+        """没有排队或正在识别的语音段、也没有未完成的翻译时返回 True（用于回放/基准测试判断处理完毕）。"""
+        if self._whisper_executor and self._whisper_executor.in_flight():
+            return False
+        with self._traces_lock:
+            return self._pending_translations == 0
+
+    def mark_rendered(self, event):
+        """
+        订阅者显示完 FinalEvent / TranslationEvent 后调用，用于记录该语音段的显示时刻并结束它的延迟记录。
+        不调用也没关系，只是统计里缺少 render / e2e 两个阶段。
+        """
+        segment_id = getattr(event, "segment_id", None)
+        if segment_id is None or getattr(event, "partial", False):
+            return
+        now = self.clock.now()
+        with self._traces_lock:
+            trace = self._traces.get(segment_id)
+            if trace is None:
+                return
+            if isinstance(event, FinalEvent):
+                trace.final_render = now
+                # 没有识别出内容时不会再有译文
+                done = not event.text
+            elif event.target_lang not in (None, self._primary_target):
+                # 延迟记录只跟踪主目标语言的译文
+                return
+            else:
+                trace.render = now
+                done = True
+            if done:
+                del self._traces[segment_id]
+        if done:
+            self.metrics.record_trace(trace)
+
+    def _new_trace(self, end_position: int, audio_seconds: float) -> SegmentTrace:
+        """为一个语音段开始延迟记录；capture 为该段最后一个采样被采集的时刻。"""
+        capture = self.recorder.capture_time(end_position) if self.recorder else None
+        trace = SegmentTrace(next(self._segment_ids), audio_seconds, capture=capture)
+        with self._traces_lock:
+            self._traces[trace.segment_id] = trace
+            overflow = self._traces.pop(next(iter(self._traces))) if len(self._traces) > MAX_PENDING_TRACES else None
+        if overflow:
+            self.metrics.record_trace(overflow)
+        return trace
+
+    def _finish_trace(self, trace: SegmentTrace):
+        """不会再有后续阶段（没有译文、翻译失败）时直接汇总。"""
+        with self._traces_lock:
+            trace = self._traces.pop(trace.segment_id, None)
+        if trace:
+            self.metrics.record_trace(trace)
+
+    def load_models(self, input_device_id, stt_model_name: str, mt_model_name):
+        """
+        Initializes models and recorder, ensuring they are loaded only when needed.
+        input_device_id 为录音设备 ID（None 为系统默认设备），也可以直接传入一个 AudioSource（文件回放、合成音源）。
+        mt_model_name 可以是一个翻译模型名称，也可以是多个名称的列表（每个目标语言一个，第一个为主目标）。
+        """
+        print(
+            f"Initializing translator. Input Device ID: {input_device_id}, STT Model: {stt_model_name}, MT Model: {mt_model_name}")
+
+        if isinstance(input_device_id, AudioSource):
+            if self.recorder and self.recorder is not input_device_id:
+                self.recorder.stop_recording()
+            self.recorder = input_device_id
+        else:
+            block_size = ms_to_samples(self.latency_profile["capture_ms"])
+            if (not isinstance(self.recorder, AudioRecorder) or self.recorder.device_id != input_device_id
+                    or self.recorder.block_size != block_size):
+                if self.recorder:
+                    self.recorder.stop_recording()
+                self.recorder = AudioRecorder(device_id=input_device_id, sample_rate=SAMPLE_RATE,
+                                              block_size=block_size, clock=self.clock)
+        self.current_input_device_id = input_device_id
+
+        self._load_models(stt_model_name, mt_model_name)
+
+    def preload(self, stt_model_name: str, mt_model_name) -> threading.Thread:
+        """
+        在后台线程中预先加载模型（不打开录音设备），进度通过 ModelLoadEvent 通知订阅者。
+        之后 start() 使用同样的模型时直接复用；预加载尚未完成时 start() 会等待它完成。
+        """
+        def run():
+            try:
+                self._load_models(stt_model_name, mt_model_name)
+            except Exception as e:
+                print(f"Model preload failed: {e}")
+
+        thread = threading.Thread(target=run, name="model-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def _load_models(self, stt_model_name: str, mt_model_name):
+        mt_model_names = [mt_model_name] if isinstance(mt_model_name, str) else list(mt_model_name)
+        if not mt_model_names:
+            raise Exception("Configuration error: No translation model selected.")
+
+        # 先检查配置，语言不匹配时不必加载任何模型
+        input_lang_code = STT_MODELS.get(stt_model_name, {}).get("code")
+        targets = set()
+        for mt_model_name in mt_model_names:
+            mt_model_info = HF_TRANSLATION_MODELS.get(mt_model_name)
+            if not mt_model_info:
+                raise Exception(
+                    f"Configuration error: Could not find information for translation model '{mt_model_name}'.")
+            mt_src_lang = mt_model_info["src"]
+            if input_lang_code and mt_src_lang != "multilingual" and mt_src_lang != input_lang_code:
+                raise Exception(
+                    f"Language mismatch: Recognition model '{stt_model_name}' (Language: {input_lang_code}) "
+                    f"is incompatible with translation model '{mt_model_name}' (Source Language: {mt_src_lang}). Please select again.")
+            if mt_model_info["tgt"] in targets:
+                raise Exception(f"Translation models must have different target languages; "
+                                f"'{mt_model_name}' duplicates '{mt_model_info['tgt']}'.")
+            targets.add(mt_model_info["tgt"])
+
+        # 在这里才导入 torch / transformers / vosk，界面启动时不需要等待这些重量级模块
+        from stt_model import SpeechToText
+        from mt_model import create_translator
+
+        with self._load_lock:
+            if self.stt is None or self.current_stt_model_name != stt_model_name:
+                if self.stt:
+                    self.stt.release()
+                    self.stt = None
+                self.stt = self._load_model("stt", stt_model_name,
+                                            lambda: SpeechToText(model_name=stt_model_name, sample_rate=SAMPLE_RATE))
+                self.current_stt_model_name = stt_model_name
+                self._current_input_lang_code = input_lang_code
+
+            # 已加载且仍然需要的翻译模型直接沿用，不再需要的交还给注册表
+            for name in [name for name in self.translators if name not in mt_model_names]:
+                self.translators.pop(name).release()
+            for name in mt_model_names:
+                if name not in self.translators:
+                    self.translators[name] = self._load_model("mt", name, lambda: create_translator(name))
+            self.translators = {name: self.translators[name] for name in mt_model_names}
+            self.translator = self.translators[mt_model_names[0]]
+            self.current_mt_model_name = mt_model_names[0]
+            self.current_mt_model_names = mt_model_names
+
+    def _load_model(self, stage: str, model_name: str, loader):
+        self._emit(ModelLoadEvent(stage, model_name, "loading"))
+        started = time.perf_counter()
+        try:
+            model = loader()
+        except Exception as e:
+            self._emit(ModelLoadEvent(stage, model_name, "failed", time.perf_counter() - started, str(e)))
+            raise
+        self._emit(ModelLoadEvent(stage, model_name, "ready", time.perf_counter() - started))
+        return model
+
+    def start(self, input_device_id, stt_model_name: str, mt_model_name, latency_profile: str = None):
+        """
+        Loads the models (if needed) and starts recording and processing.
+        mt_model_name 给多个翻译模型时，每句原文只识别一次，同时翻译成各个目标语言，译文按 target_lang 区分。
+        latency_profile 为 config.LATENCY_PROFILES 中的档位名称，决定录音块大小和送给识别器的块大小，None 为默认档位。
+        """
+        if self._running:
+            return
+
+        self.latency_profile = get_latency_profile(latency_profile)
+        self.load_models(input_device_id, stt_model_name, mt_model_name)
+
+        from mt_model import TranslationFanout, IncrementalTranslator
+        self.translation_fanout = TranslationFanout(list(self.translators.values()), clock=self.clock)
+        if TRANSLATE_PARTIALS:
+            # 临时译文只翻译成主目标语言
+            target = self._primary_target
+            self.partial_translator = IncrementalTranslator(
+                self.translator,
+                lambda ts, original, translated: self._emit(
+                    TranslationEvent(ts, original, translated, partial=True, target_lang=target)))
+        if self.stt.model_type == "whisper" and not WHISPER_STREAMING:
+            from stt_model import WhisperBatchScheduler
+            self._whisper_scheduler = WhisperBatchScheduler(self.stt, clock=self.clock)
+            self._whisper_executor = self._create_whisper_executor()
+
+        self.recorder.start_recording()
+        self.metrics.start_periodic_log()
+        self._running = True
+        self._audio_thread = threading.Thread(target=self._audio_processing_loop, daemon=True)
+        self._audio_thread.start()
+        print("Real-time translator started.")
+
+    def stop(self):
+        """Stops processing and releases the models."""
+        if not self._running:
+            return
+
+        print("Stopping real-time translator...")
+        self._running = False
+        # 先停止音频来源，让阻塞在 read() 上的处理线程立即返回
+        if self.recorder:
+            self.recorder.stop_recording()
+        audio_thread, self._audio_thread = self._audio_thread, None
+        if audio_thread:
+            audio_thread.join(timeout=2)
+            if audio_thread.is_alive():
+                print("Warning: Audio processing thread did not stop in time.")
+
+        if self.partial_translator:
+            self.partial_translator.shutdown()
+            self.partial_translator = None
+
+        fanout, self.translation_fanout = self.translation_fanout, None
+        executor, scheduler = self._whisper_executor, self._whisper_scheduler
+        self._whisper_executor = None
+        self._whisper_scheduler = None
+
+        if self.translator and self.translator.cache:
+            stats = self.translator.cache.stats()
+            print(f"Translation cache: {stats['entries']} entries, {stats['hits']} hits, {stats['misses']} misses "
+                  f"(hit rate {stats['hit_rate']:.0%}).")
+            self.translator.cache.save()
+
+        self.metrics.stop_periodic_log()
+        with self._traces_lock:
+            pending_traces = list(self._traces.values())
+            self._traces.clear()
+        for trace in pending_traces:
+            self.metrics.record_trace(trace)
+        print(self.metrics.format_summary())
+        try:
+            self.metrics.dump_json(METRICS_DUMP_PATH)
+        except OSError as e:
+            print(f"Failed to write latency metrics: {e}")
+
+        # 模型交还给注册表：空闲一段时间后才会卸载，再次开始时直接复用。
+        # 交还后模型可能被卸载、Vosk 识别器会被其他音频流取用，所以要等仍在使用它们的工作都结束：
+        # 处理线程退出 -> Whisper 执行器处理完已排队的语音段（结果仍交给创建执行器时绑定的翻译服务，见
+        # _create_whisper_executor）-> 翻译服务翻译完已排队的句子。这些都在后台等待，不阻塞调用线程
+        stt, translators = self.stt, list(self.translators.values())
+
+        def release_models():
+            if audio_thread:
+                audio_thread.join()
+            if executor:
+                executor.shutdown(wait=True)
+                scheduler.shutdown(wait=False)
+            if fanout:
+                fanout.shutdown(wait=True)
+            if stt:
+                stt.release()
+            for translator in translators:
+                translator.release()
+
+        if (audio_thread and audio_thread.is_alive()) or executor or fanout:
+            threading.Thread(target=release_models, name="pipeline-release", daemon=True).start()
+        else:
+            release_models()
+        self.stt = None
+        self.translators = {}
+        self.translator = None
+        stats = get_model_registry().stats()
+        print(f"Model registry: {stats['models']} models (~{stats['memory_mb']:.0f} MB) kept loaded, "
+              f"{stats['hits']} reuses, {stats['loads']} loads, {stats['evictions']} evictions.")
+        print("Real-time translator stopped.")
+
+    def _audio_processing_loop(self):
+        """Audio processing loop running in a separate thread."""
+        # 绑定本次运行的模型：stop() 清空 self.stt 后，尚未退出的线程仍使用自己的识别器，直到退出后才交还（见 stop()）
+        stt = self.stt
+        if stt.model_type == "vosk":
+            self._vosk_processing_loop(stt)
+        elif stt.model_type == "whisper" and WHISPER_STREAMING:
+            self._whisper_streaming_loop(stt)
+        elif stt.model_type == "whisper":
+            self._whisper_processing_loop()
+        else:
+            print("Error: Unknown STT model type.")
+
+    def _vosk_processing_loop(self, stt):
+        """Vosk streaming processing loop"""
+        stt_seconds = 0.0
+        audio_seconds = 0.0
+        position = 0
+        chunk = AdaptiveChunkSize(*(ms_to_samples(ms) for ms in self.latency_profile["vosk_chunk_ms"]))
+        while self._running:
+            audio_samples = self.recorder.read(timeout=AUDIO_READ_TIMEOUT_SECONDS, min_frames=chunk.samples)
+            if audio_samples is not None:
+                audio_chunk = audio_samples.tobytes()
+                timestamp = self.clock.timestamp()
+                started = self.clock.now()
+                recognized_final = stt.recognizer.AcceptWaveform(audio_chunk)
+                finished = self.clock.now()
+                chunk.update(finished - started, len(audio_samples))
+                stt_seconds += finished - started
+                audio_seconds += len(audio_chunk) / 2 / SAMPLE_RATE
+                position += len(audio_chunk) // 2
+
+                if recognized_final:
+                    result_json = json.loads(stt.recognizer.Result())
+                    final_text = result_json.get("text", "").strip()
+                    if final_text:
+                        # Vosk 在识别器内部判定语句结束，没有单独的 VAD 阶段
+                        trace = self._new_trace(position, audio_seconds)
+                        trace.stt_start, trace.stt_end = started, finished
+                        self._emit(FinalEvent(timestamp, final_text, trace.segment_id))
+                        self._emit(TimingEvent("stt", stt_seconds, audio_seconds))
+                        self.metrics.record_model(self.current_stt_model_name, stt_seconds, audio_seconds)
+                        stt_seconds = audio_seconds = 0.0
+                        if self.partial_translator:
+                            self.partial_translator.reset()
+                        self._translate_async(timestamp, final_text, trace)
+                else:
+                    partial_result_json = json.loads(stt.recognizer.PartialResult())
+                    partial_text = partial_result_json.get("partial", "").strip()
+                    if partial_text:
+                        self._emit(PartialEvent(timestamp, partial_text))
+                        if self.partial_translator:
+                            self.partial_translator.submit(timestamp, partial_text)
+            elif self.recorder.finished:
+                break
+
+    def _whisper_processing_loop(self):
+        """
+        Whisper 非流式处理循环。
+        由 VAD 的语音起止事件驱动分段（按采样位置而不是墙钟时间），超长语音按最大时长强制切分。
+        """
+        segmenter = SpeechSegmenter(create_vad(VAD_BACKEND, SAMPLE_RATE),
+                                    max_segment_samples=WHISPER_MAX_AUDIO_SECONDS * SAMPLE_RATE)
+        chunk = AdaptiveChunkSize(*(ms_to_samples(ms) for ms in self.latency_profile["whisper_chunk_ms"]))
+        # stop() 清空 self._whisper_executor 后仍要把剩下的语音段交给本次运行的执行器
+        executor = self._whisper_executor
+
+        while self._running:
+            audio_samples = self.recorder.read(timeout=AUDIO_READ_TIMEOUT_SECONDS, min_frames=chunk.samples)
+            if audio_samples is None:
+                if self.recorder.finished:
+                    break
+                continue
+
+            started = self.clock.now()
+            audio_np = audio_samples.astype(np.float32) / 32768.0
+            for segment in segmenter.push(audio_np):
+                self._process_whisper_segment(segment, executor)
+            chunk.update(self.clock.now() - started, len(audio_samples))
+
+        # 线程结束（停止或音频来源已放完）前，处理仍在进行中的语音段
+        for segment in segmenter.flush():
+            self._process_whisper_segment(segment, executor)
+
+    def _whisper_streaming_loop(self, stt):
+        """
+        Whisper 流式处理循环。
+        说话过程中每积累 whisper_stream_interval_ms（见延迟档位）的新音频就重新解码一次窗口，以临时结果输出；
+        VAD 判定语句结束时输出最终结果并翻译。
+        """
+        segmenter = SpeechSegmenter(create_vad(VAD_BACKEND, SAMPLE_RATE),
+                                    max_segment_samples=WHISPER_MAX_AUDIO_SECONDS * SAMPLE_RATE)
+        streamer = stt.create_streamer(language=self._current_input_lang_code)
+        decode_interval = ms_to_samples(self.latency_profile["whisper_stream_interval_ms"])
+        chunk = AdaptiveChunkSize(*(ms_to_samples(ms) for ms in self.latency_profile["whisper_chunk_ms"]))
+        samples_since_decode = 0
+        timestamp = None
+
+        while self._running:
+            audio_samples = self.recorder.read(timeout=AUDIO_READ_TIMEOUT_SECONDS, min_frames=chunk.samples)
+            if audio_samples is None:
+                if self.recorder.finished:
+                    break
+                continue
+
+            started = self.clock.now()
+            segments = segmenter.push(audio_samples.astype(np.float32) / 32768.0)
+            # 块大小只按 VAD 分段的耗时调整，解码频率由 decode_interval 决定
+            chunk.update(self.clock.now() - started, len(audio_samples))
+            for segment in segments:
+                # 语音段结束：补上还没送进窗口的尾巴，输出整句
+                streamer.insert_audio(segment.audio[max(segmenter.stream_position - segment.start, 0):])
+                self._finish_whisper_stream(streamer, timestamp, segment)
+                timestamp = None
+                samples_since_decode = 0
+
+            active_audio = segmenter.take_active_audio()
+            if active_audio is not None and len(active_audio):
+                if timestamp is None:
+                    timestamp = self.clock.timestamp()
+                streamer.insert_audio(active_audio)
+                samples_since_decode += len(active_audio)
+                if samples_since_decode >= decode_interval:
+                    samples_since_decode = 0
+                    started = self.clock.now()
+                    try:
+                        partial_text = streamer.process_iter()
+                    except Exception as e:
+                        print(f"Whisper streaming decode failed: {e}")
+                        continue
+                    self._emit(TimingEvent("stt_partial", self.clock.now() - started, streamer.buffered_seconds))
+                    if partial_text:
+                        self._emit(PartialEvent(timestamp, partial_text))
+                        if self.partial_translator:
+                            self.partial_translator.submit(timestamp, partial_text)
+
+        for segment in segmenter.flush():
+            streamer.insert_audio(segment.audio[max(segmenter.stream_position - segment.start, 0):])
+            self._finish_whisper_stream(streamer, timestamp, segment)
+
+    def _finish_whisper_stream(self, streamer, timestamp, segment):
+        """Finalizes the current streaming utterance and translates it."""
+        timestamp = timestamp or self.clock.timestamp()
+        trace = self._new_trace(segment.end, segment.num_samples / SAMPLE_RATE)
+        trace.vad = self.clock.now()
+        if self.partial_translator:
+            self.partial_translator.reset()
+        try:
+            trace.stt_start = self.clock.now()
+            final_text = streamer.finish()
+            trace.stt_end = self.clock.now()
+        except Exception as e:
+            self._emit(FinalEvent(timestamp, "", trace.segment_id))
+            self._emit(ErrorEvent("whisper", f"Whisper streaming finalize failed: {e}"))
+            return
+
+        self.metrics.record_model(self.current_stt_model_name, trace.stt_end - trace.stt_start, trace.audio_seconds)
+        self._emit(FinalEvent(timestamp, final_text, trace.segment_id))
+        if final_text:
+            self._translate_async(timestamp, final_text, trace)
+
+    def _process_whisper_segment(self, segment, executor):
+        """Queues a VAD speech segment on the Whisper inference executor."""
+        if segment.audio.size > 0:
+            timestamp = self.clock.timestamp()
+            # 使用一个指示符来显示正在处理
+            self._emit(PartialEvent(timestamp, PROCESSING_PLACEHOLDER))
+            trace = self._new_trace(segment.end, len(segment.audio) / SAMPLE_RATE)
+            trace.vad = self.clock.now()
+            executor.submit((segment.audio, timestamp, trace))
+
+    def _create_whisper_executor(self):
+        """Creates the bounded Whisper executor bound to the currently loaded models and translation fan-out."""
+        scheduler, language, fanout = self._whisper_scheduler, self._current_input_lang_code, self.translation_fanout
+
+        def run_whisper(payload):
+            # 在工作线程中等待 Whisper 识别，以避免阻塞录音循环；翻译交给翻译服务异步完成。
+            # 多个工作线程同时等待时，积压的语音段会被调度器合成一批识别
+            # 识别失败时把异常连同语音段一起返回，结果回调才能把失败对应到这个语音段
+            audio_data, timestamp, trace = payload
+            future = scheduler.submit(audio_data, language)
+            try:
+                text = future.result()
+            except Exception as e:
+                return timestamp, "", 0.0, len(audio_data) / SAMPLE_RATE, trace, e
+            trace.stt_start, trace.stt_end = future.batch_started, future.batch_finished
+            # 一批语音段共用一次推理，按段平摊耗时
+            stt_seconds = (trace.stt_end - trace.stt_start) / future.batch_size
+            return timestamp, text, stt_seconds, len(audio_data) / SAMPLE_RATE, trace, None
+
+        def merge_segments(queued, incoming):
+            # 队列已满时，把新语音段拼接到队尾的语音段上，沿用较早的时间戳；延迟从较晚语音段的结尾算起
+            with self._traces_lock:
+                self._traces.pop(queued[2].segment_id, None)
+            incoming[2].audio_seconds += queued[2].audio_seconds
+            return np.concatenate((queued[0], incoming[0])), queued[1], incoming[2]
+
+        def on_result(seq, result, error):
+            self._on_whisper_result(seq, result, error, fanout)
+
+        return InferenceExecutor(run_whisper, on_result,
+                                 num_workers=WHISPER_WORKERS,
+                                 max_queue_size=WHISPER_QUEUE_SIZE,
+                                 overflow_policy=WHISPER_QUEUE_POLICY, merge_fn=merge_segments, name="whisper")
+
+    def _on_whisper_result(self, seq, result, error, fanout=None):
+        """
+        Called by the executor strictly in submission order, so events never interleave.
+        fanout is the translation fan-out the executor was created with; it outlives stop() until the queue is drained.
+        """
+        if error is not None:
+            # 执行器本身出错，没有语音段信息
+            self._emit(FinalEvent("", ""))
+            self._emit(ErrorEvent("whisper", f"Whisper recognition failed: {error}"))
+            return
+
+        timestamp, final_text, stt_seconds, audio_seconds, trace, error = result
+        if error is not None:
+            # 空的 FinalEvent 带上 segment_id，替换掉该语音段的 "(Processing...)" 占位，并结束它的延迟记录
+            self._emit(ErrorEvent("whisper", f"Whisper recognition failed: {error}"))
+            self._emit(FinalEvent(timestamp, "", trace.segment_id))
+            self._finish_trace(trace)
+            return
+        self._emit(TimingEvent("stt", stt_seconds, audio_seconds))
+        self.metrics.record_model(self.current_stt_model_name, stt_seconds, audio_seconds)
+        self._emit(FinalEvent(timestamp, final_text, trace.segment_id))
+        if final_text:
+            # 按序号顺序提交翻译，翻译服务单线程按提交顺序完成，译文顺序与原文一致
+            self._translate_async(timestamp, final_text, trace, fanout)
+
+    @property
+    def _primary_target(self) -> str:
+        if self.translation_fanout:
+            return self.translation_fanout.primary_target
+        return HF_TRANSLATION_MODELS.get(self.current_mt_model_name, {}).get("tgt")
+
+    def _translate_async(self, timestamp, text, trace: SegmentTrace = None, fanout=None):
+        """
+        Queues text on the batching translation service of every target language
+        (fanout, or the current one when not given); a TranslationEvent tagged with target_lang is emitted
+        as each one is done. Only the primary target's translation is tracked in the segment's latency trace.
+        """
+        fanout = fanout or self.translation_fanout
+        if not fanout:
+            if trace:
+                self._finish_trace(trace)
+            return
+        submitted = self.clock.now()
+        audio_seconds = trace.audio_seconds if trace else 0.0
+        segment_id = trace.segment_id if trace else None
+        primary = fanout.primary_target
+        for target, future in fanout.submit(text).items():
+            self._deliver_translation(future, target, fanout.translators[target].model_name, timestamp, text,
+                                      submitted, audio_seconds, segment_id, trace if target == primary else None)
+
+    def _deliver_translation(self, future, target, mt_model_name, timestamp, text, submitted, audio_seconds,
+                             segment_id, trace):
+        """Emits the TranslationEvent for one target language when its future completes."""
+        with self._traces_lock:
+            self._pending_translations += 1
+
+        def on_translated(f):
+            try:
+                deliver(f)
+            finally:
+                with self._traces_lock:
+                    self._pending_translations -= 1
+
+        def deliver(f):
+            try:
+                translated_text = f.result()
+            except Exception as e:
+                self._emit(ErrorEvent("translation", f"Translation to '{target}' failed: {e}"))
+                if trace:
+                    self._finish_trace(trace)
+                return
+            self._emit(TimingEvent("mt", self.clock.now() - submitted))
+            if hasattr(f, "batch_started"):
+                # 一批句子共用一次推理，按句平摊耗时
+                self.metrics.record_model(mt_model_name, (f.batch_finished - f.batch_started) / f.batch_size,
+                                          audio_seconds)
+                if trace:
+                    trace.mt_start, trace.mt_end = f.batch_started, f.batch_finished
+            if translated_text:
+                self._emit(TranslationEvent(timestamp, text, translated_text, segment_id=segment_id,
+                                            target_lang=target))
+            elif trace:
+                self._finish_trace(trace)
+
+        future.add_done_callback(on_translated)
@@ -0,0 +1,102 @@
+# replay_client.py
+# server.py 的本地测试客户端：把 WAV/FLAC 文件按实时速度（或加速）回放给服务端，可同时打开多个会话
+# 用法: python replay_client.py meeting.wav --sessions 16 --speed 1.0
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+
+from batch_transcribe import iter_audio_blocks
+from config import SAMPLE_RATE, SERVER_HOST, SERVER_PORT
+
+
+def load_pcm(path: str) -> bytes:
+    """解码并重采样为服务端要求的 16 kHz 单声道 int16 PCM。"""
+    audio = np.concatenate(list(iter_audio_blocks(path)) or [np.zeros(0, dtype=np.float32)])
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+
+async def replay_session(uri: str, index: int, pcm: bytes, chunk_ms: int, speed: float, quiet: bool) -> dict:
+    import websockets
+
+    chunk_bytes = int(SAMPLE_RATE * chunk_ms / 1000) * 2
+    stats = {"session": index, "finals": 0, "translations": 0, "errors": 0, "final_delay": None}
+    async with websockets.connect(uri, max_size=2 ** 22) as websocket:
+        ended_at = None
+
+        async def receive():
+            nonlocal ended_at
+            async for message in websocket:
+                event = json.loads(message)
+                kind = event.get("type")
+                if kind == "done":
+                    stats["final_delay"] = time.perf_counter() - ended_at
+                    return
+                if kind == "final" and event["text"]:
+                    stats["finals"] += 1
+                elif kind == "translation" and not event.get("partial"):
+                    stats["translations"] += 1
+                elif kind == "error":
+                    stats["errors"] += 1
+                if not quiet and kind in ("final", "translation", "error") and event.get("text", True):
+                    label = {"final": "原文", "translation": "译文"}.get(kind, "错误")
+                    if event.get("target_lang"):
+                        label += f"[{event['target_lang']}]"
+                    print(f"[session {index}] {event.get('timestamp', '')}{label}: "
+                          f"{event.get('text', event.get('message'))}", flush=True)
+
+        receiver = asyncio.create_task(receive())
+        started = time.perf_counter()
+        for offset in range(0, len(pcm), chunk_bytes):
+            await websocket.send(pcm[offset:offset + chunk_bytes])
+            if speed > 0:
+                # 按音频时长节流，模拟麦克风实时输入
+                due = started + (offset + chunk_bytes) / 2 / SAMPLE_RATE / speed
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        ended_at = time.perf_counter()
+        await websocket.send(json.dumps({"type": "end"}))
+        await receiver
+    return stats
+
+
+async def run(args) -> list:
+    pcms = [load_pcm(path) for path in args.files]
+    tasks = [replay_session(args.uri, i, pcms[i % len(pcms)], args.chunk_ms, args.speed, args.quiet)
+             for i in range(args.sessions)]
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay audio files to the WebSocket translation server.")
+    parser.add_argument("files", nargs="+", help="WAV/FLAC files, assigned round-robin to the sessions")
+    parser.add_argument("--uri", default=f"ws://{SERVER_HOST}:{SERVER_PORT}")
+    parser.add_argument("--sessions", type=int, default=1, help="number of concurrent sessions")
+    parser.add_argument("--chunk-ms", type=int, default=100, help="audio per WebSocket message")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed, 0 = as fast as possible")
+    parser.add_argument("--quiet", action="store_true", help="only print the per-session summary")
+    args = parser.parse_args(argv)
+
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        print("The replay client requires the 'websockets' package: pip install websockets", file=sys.stderr)
+        return 1
+
+    results = asyncio.run(run(args))
+    failed = 0
+    for result in results:
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"Session failed: {result}", file=sys.stderr)
+            continue
+        delay = f"{result['final_delay']:.2f}s" if result["final_delay"] is not None else "n/a"
+        print(f"session {result['session']}: {result['finals']} finals, {result['translations']} translations, "
+              f"{result['errors']} errors, results complete {delay} after end of audio")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+# resample.py
+# 流式多相 FIR 重采样与声道降混：把设备原生格式（如 48 kHz / 44.1 kHz 立体声）转换成流水线使用的 16 kHz 单声道
+import math
+import time
+
+import numpy as np
+
+from config import SAMPLE_RATE, RESAMPLER_TAPS, RESAMPLER_MAX_LOAD
+
+# 自动降低质量时每相抽头数的下限：64 时对 9 kHz 以上会混叠进来的频率仍有 60 dB 以上的衰减
+MIN_RESAMPLER_TAPS = 64
+# 每次向量化计算的最大输出采样数，限制临时矩阵 (输出数 x 抽头数) 的内存
+MAX_OUTPUTS_PER_PASS = 16384
+
+
+def design_polyphase_filter(up: int, down: int, taps_per_phase: int, rolloff: float = 0.85, beta: float = 8.6):
+    """
+    Kaiser 窗 sinc 低通原型滤波器，截止频率为输入/输出中较低的奈奎斯特频率 x rolloff，
+    返回形状为 (up, taps_per_phase) 的多相系数矩阵，第 p 行为第 p 相。
+    beta = 8.6 对应约 85 dB 的阻带衰减；截止频率留在奈奎斯特频率以下，让过渡带在混叠频率之前结束。
+    """
+    length = up * taps_per_phase
+    cutoff = rolloff * 0.5 / max(up, down)  # 以上采样后的采样率归一化（周期/采样）
+    n = np.arange(length) - (length - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, beta)
+    h *= up / h.sum()  # 插零上采样损失的增益补回来
+    return h.reshape(taps_per_phase, up).T.astype(np.float32).copy()
+
+
+class StreamingResampler:
+    """
+    有理数比例 (dst/src = up/down) 的流式多相重采样器，逐块输入 float32 单声道采样，块之间保持滤波器状态，
+    输出与一次性处理整段音频相同。每个输出采样只计算 taps_per_phase 次乘加，并在整块上向量化。
+    """
+
+    def __init__(self, src_rate: int, dst_rate: int = SAMPLE_RATE, taps_per_phase: int = RESAMPLER_TAPS):
+        g = math.gcd(int(src_rate), int(dst_rate))
+        self.src_rate, self.dst_rate = int(src_rate), int(dst_rate)
+        self.up, self.down = self.dst_rate // g, self.src_rate // g
+        self._in_count = 0
+        self._out_count = 0
+        self._history = np.zeros(0, dtype=np.float32)
+        self.set_taps(taps_per_phase)
+
+    def set_taps(self, taps_per_phase: int):
+        """更换滤波器长度（例如为了降低 CPU 开销），保留已输入的历史采样，输出不中断。"""
+        self.taps = int(taps_per_phase)
+        self._phases = design_polyphase_filter(self.up, self.down, self.taps)
+        history = self._history[-self.taps:]
+        self._history = np.concatenate((np.zeros(self.taps - len(history), dtype=np.float32), history))
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        if self.up == self.down:
+            return np.asarray(samples, dtype=np.float32)
+        buffer = np.concatenate((self._history, np.asarray(samples, dtype=np.float32)))
+        buffer_start = self._in_count - self.taps  # buffer[0] 对应的输入采样序号
+        self._in_count += len(samples)
+        # 输出采样 n 对应上采样序列中的位置 n*down，需要用到输入采样 (n*down)//up 及之前的 taps 个采样
+        out_end = (self._in_count * self.up - 1) // self.down + 1
+        pieces = []
+        offsets = np.arange(self.taps)
+        for first in range(self._out_count, out_end, MAX_OUTPUTS_PER_PASS):
+            n = np.arange(first, min(first + MAX_OUTPUTS_PER_PASS, out_end), dtype=np.int64) * self.down
+            phase = n % self.up
+            index = (n // self.up - buffer_start)[:, None] - offsets
+            pieces.append(np.einsum("ij,ij->i", buffer[index], self._phases[phase]))
+        self._out_count = max(self._out_count, out_end)
+        self._history = buffer[-self.taps:]
+        if not pieces:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(pieces) if len(pieces) > 1 else pieces[0]
+
+
+def downmix(interleaved: np.ndarray, channels: int) -> np.ndarray:
+    """交错的 int16 多声道采样 -> float32 单声道 (-1, 1)。"""
+    if channels == 1:
+        return interleaved.astype(np.float32) / 32768.0
+    return interleaved.reshape(-1, channels).mean(axis=1, dtype=np.float32) / 32768.0
+
+
+class AudioConverter:
+    """
+    设备原生格式 -> 16 kHz 单声道 float32，统计转换耗时。
+    耗时超过音频时长的 max_load 时，滤波器抽头数减半（最少 MIN_RESAMPLER_TAPS），把转换开销限制在预算内。
+    """
+
+    def __init__(self, src_rate: int, channels: int, dst_rate: int = SAMPLE_RATE, taps_per_phase: int = RESAMPLER_TAPS,
+                 max_load: float = RESAMPLER_MAX_LOAD):
+        self.src_rate = int(src_rate)
+        self.channels = int(channels)
+        self.resampler = StreamingResampler(src_rate, dst_rate, taps_per_phase)
+        self.max_load = max_load
+        self.processing_seconds = 0.0
+        self.audio_seconds = 0.0
+        self._window_processing = 0.0
+        self._window_audio = 0.0
+
+    @property
+    def load(self) -> float:
+        """转换耗时 / 音频时长。"""
+        return self.processing_seconds / self.audio_seconds if self.audio_seconds else 0.0
+
+    def process(self, interleaved: np.ndarray) -> np.ndarray:
+        started = time.perf_counter()
+        out = self.resampler.process(downmix(interleaved, self.channels))
+        elapsed = time.perf_counter() - started
+        seconds = len(interleaved) / self.channels / self.src_rate
+        self.processing_seconds += elapsed
+        self.audio_seconds += seconds
+
+        # 每积累 1 秒音频检查一次，超出预算就降低滤波器质量
+        self._window_processing += elapsed
+        self._window_audio += seconds
+        if self._window_audio >= 1.0:
+            if (self.max_load and self._window_processing / self._window_audio > self.max_load
+                    and self.resampler.taps > MIN_RESAMPLER_TAPS):
+                taps = max(MIN_RESAMPLER_TAPS, self.resampler.taps // 2)
+                print(f"Resampling {self.src_rate} Hz x{self.channels} uses "
+                      f"{self._window_processing / self._window_audio:.1%} of real time, "
+                      f"reducing the filter to {taps} taps per phase.")
+                self.resampler.set_taps(taps)
+            self._window_processing = self._window_audio = 0.0
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "src_rate": self.src_rate,
+            "channels": self.channels,
+            "taps": self.resampler.taps,
+            "processing_seconds": self.processing_seconds,
+            "audio_seconds": self.audio_seconds,
+            "load": self.load,
+        }
@@ -0,0 +1,408 @@
+# server.py
+# 多会话 WebSocket 服务：所有连接共享同一套识别/翻译模型，每个会话只保存自己的识别状态
+# 用法: python server.py --stt "Vosk 美式英文 (小)" --mt "英文->中文 (Helsinki-NLP)" --port 8765
+#
+# 协议:
+#   客户端 -> 服务端: 二进制消息为 16 kHz 单声道 int16 小端 PCM；
+#                     文本消息 {"type": "end"} 表示音频结束，服务端输出剩余结果后回复 {"type": "done"}；
+#                     {"type": "metrics"} 请求服务端的延迟统计，回复 {"type": "metrics", ...}（格式同 metrics.py 的 snapshot()）
+#   服务端 -> 客户端: 连接建立后发送 {"type": "ready", "session": 会话号, "sample_rate": 16000}，
+#                     之后每个事件一条 JSON 文本消息，格式同 pipeline.event_to_dict()；
+#                     启动时给了多个 --mt 时，每句原文对每个目标语言各有一条译文，用 "target_lang" 区分
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from pipeline import (PartialEvent, FinalEvent, TranslationEvent, TimingEvent, ErrorEvent, event_to_dict,
+                      PROCESSING_PLACEHOLDER)
+from vad import create_vad, SpeechSegmenter
+from metrics import SegmentTrace, get_latency_metrics
+from config import (STT_MODELS, HF_TRANSLATION_MODELS, SAMPLE_RATE, WHISPER_MAX_AUDIO_SECONDS, WHISPER_QUEUE_SIZE,
+                    VAD_BACKEND, TRANSLATE_PARTIALS, DEFAULT_INPUT_LANGUAGE_MODEL, DEFAULT_TRANSLATION_MODEL,
+                    SERVER_HOST, SERVER_PORT, SERVER_MAX_SESSIONS, SERVER_STT_WORKERS, METRICS_DUMP_PATH)
+
+
+class SharedModels:
+    """
+    所有会话共享的模型和推理资源：一个 SpeechToText、每个目标语言一个翻译模型（直接或经中转语言）及其微批处理翻译服务，
+    一个 Whisper 批量识别调度器，以及一个固定大小的识别线程池。会话之间只有 Vosk 识别器 / VAD 分段器等轻量状态是独立的。
+    """
+
+    def __init__(self, stt_model_name: str, mt_model_names, stt_workers: int = SERVER_STT_WORKERS):
+        from stt_model import SpeechToText, WhisperBatchScheduler
+        from mt_model import create_translator, TranslationFanout
+
+        mt_model_names = [mt_model_names] if isinstance(mt_model_names, str) else list(mt_model_names)
+        self.language = STT_MODELS.get(stt_model_name, {}).get("code")
+        for mt_model_name in mt_model_names:
+            mt_model_info = HF_TRANSLATION_MODELS.get(mt_model_name)
+            if not mt_model_info:
+                raise Exception(
+                    f"Configuration error: Could not find information for translation model '{mt_model_name}'.")
+            if self.language and mt_model_info["src"] not in ("multilingual", self.language):
+                raise Exception(f"Language mismatch: Recognition model '{stt_model_name}' (Language: {self.language}) "
+                                f"is incompatible with translation model '{mt_model_name}' "
+                                f"(Source Language: {mt_model_info['src']}).")
+
+        self.stt_model_name = stt_model_name
+        self.mt_model_name = mt_model_names[0]
+        self.metrics = get_latency_metrics()
+        self.stt = SpeechToText(model_name=stt_model_name, sample_rate=SAMPLE_RATE)
+        self.translators = [create_translator(name) for name in mt_model_names]
+        self.translator = self.translators[0]
+        # 每句原文同时交给所有目标语言；各目标语言的翻译服务本身就会把多个会话同时提交的句子合并成一批
+        self.translation_fanout = TranslationFanout(self.translators)
+        self.stt_pool = ThreadPoolExecutor(max_workers=stt_workers, thread_name_prefix="stt")
+        # 所有会话的 Whisper 语音段交给同一个批量调度器，同时到达的语音段合成一批识别
+        self.whisper_scheduler = WhisperBatchScheduler(self.stt) if self.stt.model_type == "whisper" else None
+
+    @property
+    def model_type(self) -> str:
+        return self.stt.model_type
+
+    def create_vosk_recognizer(self):
+        """每个会话一个 KaldiRecognizer，从共享 vosk.Model 的识别器池中取用；会话结束时用 release_vosk_recognizer() 放回。"""
+        return self.stt.acquire_recognizer()
+
+    def release_vosk_recognizer(self, recognizer):
+        self.stt.release_recognizer(recognizer)
+
+    def transcribe_whisper(self, audio: np.ndarray, trace: SegmentTrace) -> Future:
+        """提交给批量调度器，返回结果为识别文本的 Future；完成时记录该语音段所在批次的推理时间。"""
+        future = self.whisper_scheduler.submit(audio, language=self.language)
+
+        def on_done(f):
+            if f.cancelled() or f.exception() is not None:
+                return
+            trace.stt_start, trace.stt_end = f.batch_started, f.batch_finished
+            self.metrics.record_model(self.stt_model_name, (f.batch_finished - f.batch_started) / f.batch_size,
+                                      trace.audio_seconds)
+
+        future.add_done_callback(on_done)
+        return future
+
+    def shutdown(self):
+        self.stt_pool.shutdown(wait=False)
+        if self.whisper_scheduler:
+            self.whisper_scheduler.shutdown(wait=False)
+        self.translation_fanout.shutdown(wait=False)
+        if self.translator.cache:
+            self.translator.cache.save()
+        self.stt.release()
+        for translator in self.translators:
+            translator.release()
+
+
+class ClientSession:
+    """单个 WebSocket 连接的识别状态。所有耗时的推理都交给 SharedModels 的线程池和翻译服务。"""
+
+    def __init__(self, session_id: int, models: SharedModels, websocket):
+        self.session_id = session_id
+        self.models = models
+        self.websocket = websocket
+        self.loop = asyncio.get_running_loop()
+        self._outgoing = asyncio.Queue()
+
+        self.recognizer = None
+        self.segmenter = None
+        # 已提交、尚未输出的 Whisper 识别任务；队列满时暂停读取该连接的音频（TCP 反压），不影响其他会话
+        self._whisper_pending = None
+        self.partial_translator = None
+        self._translations = set()
+        # 最近一条音频消息的到达时刻，作为语音段的采集时刻
+        self._received_at = None
+        self._segment_ids = itertools.count(1)
+        # 连接关闭后不再输出事件，仍在进行的识别和翻译的结果直接丢弃
+        self.closed = False
+
+        if models.model_type == "vosk":
+            self.recognizer = models.create_vosk_recognizer()
+        else:
+            self.segmenter = SpeechSegmenter(create_vad(VAD_BACKEND, SAMPLE_RATE),
+                                             max_segment_samples=WHISPER_MAX_AUDIO_SECONDS * SAMPLE_RATE)
+            self._whisper_pending = asyncio.Queue(maxsize=WHISPER_QUEUE_SIZE)
+
+        if TRANSLATE_PARTIALS:
+            from mt_model import IncrementalTranslator
+            # 临时译文只翻译成主目标语言
+            target = models.translation_fanout.primary_target
+            self.partial_translator = IncrementalTranslator(
+                models.translator,
+                lambda ts, original, translated: self.emit_threadsafe(
+                    TranslationEvent(ts, original, translated, partial=True, target_lang=target)))
+
+    def emit(self, event):
+        if not self.closed:
+            self._outgoing.put_nowait(event_to_dict(event))
+
+    def emit_threadsafe(self, event):
+        if not self.closed and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.emit, event)
+
+    async def run(self):
+        sender = asyncio.create_task(self._send_loop())
+        results = asyncio.create_task(self._whisper_result_loop()) if self._whisper_pending else None
+        self._outgoing.put_nowait({"type": "ready", "session": self.session_id, "sample_rate": SAMPLE_RATE})
+        try:
+            async for message in self.websocket:
+                if isinstance(message, bytes):
+                    self._received_at = time.perf_counter()
+                    await self._on_audio(message)
+                    continue
+                try:
+                    command = json.loads(message)
+                except ValueError:
+                    self.emit(ErrorEvent("server", "Expected binary PCM audio or a JSON control message."))
+                    continue
+                if command.get("type") == "end":
+                    await self._finish()
+                    self._outgoing.put_nowait({"type": "done"})
+                elif command.get("type") == "metrics":
+                    self._outgoing.put_nowait({"type": "metrics", **self.models.metrics.snapshot()})
+        finally:
+            # 客户端已断开（或发送过 end 且结果都已输出）：取消还没完成的识别和翻译，不再把结果放进发送队列
+            self.closed = True
+            if results:
+                results.cancel()
+                while not self._whisper_pending.empty():
+                    self._whisper_pending.get_nowait()[2].cancel()
+                await asyncio.gather(results, return_exceptions=True)
+            for future in list(self._translations):
+                future.cancel()
+            await self._outgoing.put(None)
+            await sender
+            if self.partial_translator:
+                self.partial_translator.shutdown()
+            if self.recognizer is not None:
+                self.models.release_vosk_recognizer(self.recognizer)
+                self.recognizer = None
+
+    async def _send_loop(self):
+        while True:
+            message = await self._outgoing.get()
+            if message is None:
+                return
+            try:
+                await self.websocket.send(json.dumps(message, ensure_ascii=False))
+            except Exception:
+                # 连接已断开，丢弃剩余消息
+                pass
+
+    async def _on_audio(self, pcm: bytes):
+        if len(pcm) % 2:
+            pcm = pcm[:-1]
+        if not pcm:
+            return
+        if self.recognizer is not None:
+            await self._on_vosk_audio(pcm)
+        else:
+            audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+            segments = await self.loop.run_in_executor(self.models.stt_pool, self.segmenter.push, audio)
+            for segment in segments:
+                await self._submit_whisper_segment(segment)
+
+    async def _finish(self):
+        """音频结束：输出仍在识别中的语句，并等待所有译文发出。"""
+        if self.recognizer is not None:
+            timestamp = time.strftime("[%H:%M:%S] ")
+            trace = self._new_trace(0.0)
+            trace.stt_start = time.perf_counter()
+            result = await self.loop.run_in_executor(self.models.stt_pool, self.recognizer.FinalResult)
+            trace.stt_end = time.perf_counter()
+            final_text = json.loads(result).get("text", "").strip()
+            if final_text:
+                self._on_final(timestamp, final_text, trace)
+        else:
+            for segment in self.segmenter.flush():
+                await self._submit_whisper_segment(segment)
+            await self._whisper_pending.join()
+        if self._translations:
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in list(self._translations)), return_exceptions=True)
+
+    def _new_trace(self, audio_seconds: float) -> SegmentTrace:
+        return SegmentTrace(next(self._segment_ids), audio_seconds, capture=self._received_at)
+
+    # ---------------------------------------------------------------- Vosk
+
+    def _accept_vosk(self, pcm: bytes):
+        if self.recognizer.AcceptWaveform(pcm):
+            return True, json.loads(self.recognizer.Result()).get("text", "").strip()
+        return False, json.loads(self.recognizer.PartialResult()).get("partial", "").strip()
+
+    async def _on_vosk_audio(self, pcm: bytes):
+        timestamp = time.strftime("[%H:%M:%S] ")
+        audio_seconds = len(pcm) / 2 / SAMPLE_RATE
+        trace = self._new_trace(audio_seconds)
+        trace.stt_start = time.perf_counter()
+        is_final, text = await self.loop.run_in_executor(self.models.stt_pool, self._accept_vosk, pcm)
+        trace.stt_end = time.perf_counter()
+        self.models.metrics.record_model(self.models.stt_model_name, trace.stt_end - trace.stt_start, audio_seconds)
+        if not text:
+            return
+        if is_final:
+            self.emit(TimingEvent("stt", trace.stt_end - trace.stt_start, audio_seconds))
+            self._on_final(timestamp, text, trace)
+        else:
+            self.emit(PartialEvent(timestamp, text))
+            if self.partial_translator:
+                self.partial_translator.submit(timestamp, text)
+
+    # ---------------------------------------------------------------- Whisper
+
+    async def _submit_whisper_segment(self, segment):
+        if segment.audio.size == 0:
+            return
+        timestamp = time.strftime("[%H:%M:%S] ")
+        self.emit(PartialEvent(timestamp, PROCESSING_PLACEHOLDER))
+        trace = self._new_trace(len(segment.audio) / SAMPLE_RATE)
+        trace.vad = time.perf_counter()
+        future = asyncio.wrap_future(self.models.transcribe_whisper(segment.audio, trace))
+        await self._whisper_pending.put((timestamp, trace, future))
+
+    async def _whisper_result_loop(self):
+        """按提交顺序输出本会话的 Whisper 结果。"""
+        while True:
+            timestamp, trace, future = await self._whisper_pending.get()
+            try:
+                final_text = (await future).strip()
+            except Exception as e:
+                self.emit(ErrorEvent("whisper", f"Whisper recognition failed: {e}"))
+                self.emit(FinalEvent(timestamp, "", trace.segment_id))
+                self.models.metrics.record_trace(trace)
+            else:
+                self.emit(TimingEvent("stt", trace.stt_end - trace.stt_start, trace.audio_seconds))
+                self.emit(FinalEvent(timestamp, final_text, trace.segment_id))
+                trace.final_render = time.perf_counter()
+                if final_text:
+                    self._translate_async(timestamp, final_text, trace)
+                else:
+                    self.models.metrics.record_trace(trace)
+            self._whisper_pending.task_done()
+
+    # ---------------------------------------------------------------- 翻译
+
+    def _on_final(self, timestamp: str, text: str, trace: SegmentTrace):
+        self.emit(FinalEvent(timestamp, text, trace.segment_id))
+        trace.final_render = time.perf_counter()
+        if self.partial_translator:
+            self.partial_translator.reset()
+        self._translate_async(timestamp, text, trace)
+
+    def _translate_async(self, timestamp: str, text: str, trace: SegmentTrace):
+        """
+        同时翻译成所有目标语言，每个译文完成后带上 target_lang 放入发送队列。
+        延迟记录只跟踪主目标语言；服务端的 render 阶段指译文进入发送队列的时刻。
+        """
+        submitted = time.perf_counter()
+        fanout = self.models.translation_fanout
+        for target, future in fanout.submit(text).items():
+            self._translations.add(future)
+            future.add_done_callback(self._on_translated_callback(
+                timestamp, text, target, fanout.translators[target].model_name, submitted, trace,
+                primary=target == fanout.primary_target))
+
+    def _on_translated_callback(self, timestamp: str, text: str, target: str, mt_model_name: str, submitted: float,
+                                trace: SegmentTrace, primary: bool):
+        def on_translated(f):
+            if not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(self._translations.discard, f)
+            if f.cancelled():
+                return
+            try:
+                translated_text = f.result()
+            except Exception as e:
+                self.emit_threadsafe(ErrorEvent("translation", f"Translation to '{target}' failed: {e}"))
+                if primary:
+                    self.models.metrics.record_trace(trace)
+                return
+            self.emit_threadsafe(TimingEvent("mt", time.perf_counter() - submitted))
+            if hasattr(f, "batch_started"):
+                self.models.metrics.record_model(mt_model_name, (f.batch_finished - f.batch_started) / f.batch_size,
+                                                 trace.audio_seconds)
+                if primary:
+                    trace.mt_start, trace.mt_end = f.batch_started, f.batch_finished
+            if translated_text:
+                self.emit_threadsafe(TranslationEvent(timestamp, text, translated_text,
+                                                      segment_id=trace.segment_id, target_lang=target))
+                if primary:
+                    trace.render = time.perf_counter()
+            if primary:
+                self.models.metrics.record_trace(trace)
+
+        return on_translated
+
+
+class TranslationServer:
+    def __init__(self, models: SharedModels, max_sessions: int = SERVER_MAX_SESSIONS):
+        self.models = models
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self._session_ids = itertools.count(1)
+
+    async def handle_connection(self, websocket):
+        if len(self.sessions) >= self.max_sessions:
+            # 1013: Try Again Later
+            await websocket.close(1013, "Server is at capacity.")
+            return
+
+        session = ClientSession(next(self._session_ids), self.models, websocket)
+        self.sessions[session.session_id] = session
+        print(f"Session {session.session_id} connected ({len(self.sessions)} active).")
+        try:
+            await session.run()
+        except Exception as e:
+            print(f"Session {session.session_id} failed: {e}")
+        finally:
+            del self.sessions[session.session_id]
+            print(f"Session {session.session_id} closed ({len(self.sessions)} active).")
+
+    async def serve(self, host: str, port: int):
+        try:
+            import websockets
+        except ImportError:
+            raise Exception("Server mode requires the 'websockets' package: pip install websockets")
+
+        async with websockets.serve(self.handle_connection, host, port, max_size=2 ** 22):
+            print(f"Listening on ws://{host}:{port} (max {self.max_sessions} sessions).")
+            self.models.metrics.start_periodic_log()
+            await asyncio.Future()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-session WebSocket speech translation server.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--stt", default=DEFAULT_INPUT_LANGUAGE_MODEL, help="STT model display name from config.py")
+    parser.add_argument("--mt", action="append", default=None,
+                        help="MT model display name from config.py; repeat to send every session translations "
+                             f"into several target languages (default: {DEFAULT_TRANSLATION_MODEL})")
+    parser.add_argument("--max-sessions", type=int, default=SERVER_MAX_SESSIONS)
+    parser.add_argument("--stt-workers", type=int, default=SERVER_STT_WORKERS,
+                        help="shared recognition threads across all sessions")
+    args = parser.parse_args(argv)
+
+    try:
+        models = SharedModels(args.stt, args.mt or [DEFAULT_TRANSLATION_MODEL], stt_workers=args.stt_workers)
+    except Exception as e:
+        print(f"Failed to load models: {e}", file=sys.stderr)
+        return 1
+
+    server = TranslationServer(models, max_sessions=args.max_sessions)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        models.shutdown()
+        models.metrics.dump_json(METRICS_DUMP_PATH)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
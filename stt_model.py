@@ -1,20 +1,81 @@
 # stt_model.py
 import os
+import re
 import json
-from vosk import Model, KaldiRecognizer
+import math
+import collections
+import threading
+import time
+from concurrent.futures import Future
 import torch
 import numpy as np
-from transformers import pipeline
-from config import STT_MODELS, SAMPLE_RATE
+from whisper_backends import create_whisper_backend, WHISPER_WINDOW_SECONDS
+from model_registry import get_model_registry
+from mel_features import IncrementalLogMel
+from audio_source import SystemClock
+from config import (STT_MODELS, SAMPLE_RATE, WHISPER_STREAM_MAX_WINDOW_SECONDS, WHISPER_MAX_BATCH_SIZE,
+                    WHISPER_BATCH_WAIT_MS, VOSK_RECOGNIZER_POOL_SIZE)
 from download_manager import download_hf_model_if_not_exists, download_and_unzip_vosk_model
 
+class VoskRecognizerPool:
+    """
+    一个 Vosk 模型目录对应一个池，由模型注册表缓存：vosk.Model（Kaldi 解码图，加载慢、占内存）每个进程只加载一次，
+    每路音频流 acquire() 一个 KaldiRecognizer，用完 release() 时 Reset() 后放回池中，下一路直接复用。
+    """
+
+    def __init__(self, model_path: str, max_idle: int = VOSK_RECOGNIZER_POOL_SIZE):
+        from vosk import Model
+
+        self.model = Model(model_path)
+        self.max_idle = max_idle
+        self._idle = collections.defaultdict(list)  # 采样率 -> 空闲的识别器
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, sample_rate=SAMPLE_RATE):
+        with self._lock:
+            idle = self._idle[sample_rate]
+            if idle:
+                self.reused += 1
+                return idle.pop()
+            self.created += 1
+
+        from vosk import KaldiRecognizer
+
+        recognizer = KaldiRecognizer(self.model, sample_rate)
+        recognizer.SetWords(False)
+        return recognizer
+
+    def release(self, recognizer, sample_rate=SAMPLE_RATE):
+        """清空识别器中未完成的语句后放回池中；池已满时直接丢弃。"""
+        recognizer.Reset()
+        with self._lock:
+            idle = self._idle[sample_rate]
+            if len(idle) < self.max_idle:
+                idle.append(recognizer)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"idle": sum(len(idle) for idle in self._idle.values()),
+                    "created": self.created, "reused": self.reused}
+
+    def unload(self):
+        with self._lock:
+            self._idle.clear()
+        self.model = None
+
+
 class SpeechToText:
     def __init__(self, model_name: str, sample_rate=SAMPLE_RATE):
         self.model_name = model_name
         self.sample_rate = sample_rate
         self.model_type = STT_MODELS.get(model_name, {}).get("type")
         self.recognizer = None
-        self.pipe = None
+        self.model = None
+        self.whisper = None
+        self.vosk_pool = None
+        self._registry_key = None
         if torch.cuda.is_available():
             self.device = "cuda"
         elif hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
@@ -32,19 +93,22 @@ class SpeechToText:
 
         print(f"Initializing STT model: {model_name}")
 
+        self.release()
         self.recognizer = None
-        self.pipe = None
-        if self.device == "cuda":
-            torch.cuda.empty_cache()
+        self.model = None
+        self.whisper = None
+        self.vosk_pool = None
 
         if self.model_type == "vosk":
             # 1. 调用下载器确保Vosk模型存在
             download_and_unzip_vosk_model(model_info)
             model_path = model_info.get("path")
-            # 2. 从本地路径加载
-            self.model = Model(model_path)
-            self.recognizer = KaldiRecognizer(self.model, self.sample_rate)
-            self.recognizer.SetWords(False)
+            # 2. 从本地路径加载；指向同一路径的 Vosk 模型只加载一次，识别器从该模型的池中取用
+            key = ("vosk", os.path.normpath(model_path))
+            self.vosk_pool = get_model_registry().acquire(key, lambda: VoskRecognizerPool(model_path), model_path)
+            self._registry_key = key
+            self.model = self.vosk_pool.model
+            self.recognizer = self.vosk_pool.acquire(self.sample_rate)
 
         elif self.model_type == "whisper":
             model_id = model_info.get("model_id")
@@ -54,16 +118,18 @@ class SpeechToText:
             print(f"Checking for Whisper model '{model_id}'...")
             download_hf_model_if_not_exists(model_id, model_path)
 
-            print(f"Loading Whisper model from local path: '{model_path}'...")
+            # 2. 按配置的后端从本地路径加载（必要时先做一次性的量化/转换）
+            backend = create_whisper_backend(model_info, self.device)
+            key = ("whisper", os.path.normpath(model_path), backend.name, backend.device)
+
+            def load():
+                print(f"Loading Whisper model from local path: '{model_path}' (backend: {backend.name})...")
+                backend.load()
+                return backend
+
             try:
-                # 2. 从本地路径加载
-                self.pipe = pipeline(
-                    "automatic-speech-recognition",
-                    model=model_path,
-                    chunk_length_s=30,
-                    device=self.device
-                )
-                self.pipe.model.config.forced_decoder_ids = None
+                self.whisper = get_model_registry().acquire(key, load, model_path)
+                self._registry_key = key
             except Exception as e:
                 raise Exception(f"Failed to load Whisper model from local path: {e}")
         else:
@@ -71,6 +137,19 @@ class SpeechToText:
 
         print(f"STT model '{model_name}' loaded successfully.")
 
+    def release(self):
+        """
+        Returns the model to the registry; it stays loaded for reuse until it is evicted.
+        References are kept so that already-queued work on this instance can still finish,
+        except for the Vosk recognizer, which is reset and handed back to the pool for the next stream.
+        """
+        if self.recognizer is not None and self.vosk_pool is not None:
+            self.vosk_pool.release(self.recognizer, self.sample_rate)
+            self.recognizer = None
+        if self._registry_key:
+            get_model_registry().release(self._registry_key)
+            self._registry_key = None
+
     def transcribe(self, audio_data: bytes) -> str:
         """Transcribes audio data using the Vosk model."""
         if self.model_type != "vosk":
@@ -83,15 +162,60 @@ class SpeechToText:
             partial_result = json.loads(self.recognizer.PartialResult())
             return partial_result.get("partial", "")
 
+    def acquire_recognizer(self):
+        """Takes an extra KaldiRecognizer from the shared pool, e.g. one per server session."""
+        if self.model_type != "vosk":
+            raise TypeError("This method is only for Vosk models.")
+        return self.vosk_pool.acquire(self.sample_rate)
+
+    def release_recognizer(self, recognizer):
+        """Resets a recognizer from acquire_recognizer() and returns it to the pool."""
+        self.vosk_pool.release(recognizer, self.sample_rate)
+
     def transcribe_full_audio_whisper(self, audio_data: list, language: str = None) -> str:
         if self.model_type != "whisper":
             raise TypeError("This method is only for Whisper models.")
 
-        if not self.pipe:
+        if not self.whisper:
             return ""
 
-        transcription = self.pipe(audio_data, generate_kwargs={"language": language})
-        return transcription.get('text', "")
+        return self.whisper.transcribe(audio_data, language=language)
+
+    def transcribe_batch_whisper(self, audios: list, language: str = None) -> list:
+        """Transcribes several segments in one batched forward pass; returns the texts in input order."""
+        if self.model_type != "whisper":
+            raise TypeError("This method is only for Whisper models.")
+
+        if not self.whisper:
+            return [""] * len(audios)
+
+        return self.whisper.transcribe_batch(audios, language=language)
+
+    def transcribe_words_whisper(self, audio_data: np.ndarray, language: str = None, features=None) -> list:
+        """
+        Transcribes audio with word-level timestamps. Returns [(start_sec, end_sec, word), ...].
+        features: optional log-mel features of audio_data (see create_feature_cache) to skip feature extraction.
+        """
+        if self.model_type != "whisper":
+            raise TypeError("This method is only for Whisper models.")
+
+        if not self.whisper:
+            return []
+
+        if features is not None and self.whisper.supports_features:
+            return self.whisper.transcribe_words_features(features, len(audio_data) / self.sample_rate,
+                                                          language=language)
+        return self.whisper.transcribe_words(audio_data, language=language)
+
+    def create_feature_cache(self):
+        """Creates an incremental log-mel feature cache, or None if the Whisper backend only accepts raw audio."""
+        if self.model_type != "whisper" or not self.whisper or not self.whisper.supports_features:
+            return None
+        return IncrementalLogMel(self.whisper.mel_filters)
+
+    def create_streamer(self, language: str = None):
+        """Creates a streaming Whisper session bound to this model."""
+        return WhisperStreamer(self, language=language)
 
     def finalize_transcription(self) -> str:
         """Gets the final result from the Vosk recognizer."""
@@ -100,3 +224,200 @@ class SpeechToText:
             return result.get("text", "")
         return ""
 
+
+
+class WhisperBatchScheduler:
+    """
+    SpeechToText 前的批量识别调度器。
+    submit() 立即返回 Future；后台线程取最早的语音段，等待同语言、补齐后长度相同（30 秒窗口数相同）的语音段，
+    凑满 max_batch_size 段或最早的语音段已等待 max_wait_ms 后，用一次批量推理识别整批，再把文本分别交给各自的 Future。
+    其他长度的语音段留在队列中等下一批。完成的 Future 带有 batch_started / batch_finished / batch_size 属性，
+    取自 clock.now()，与调用方的延迟记录使用同一个时钟。
+    """
+
+    def __init__(self, stt: SpeechToText, max_batch_size=WHISPER_MAX_BATCH_SIZE, max_wait_ms=WHISPER_BATCH_WAIT_MS,
+                 clock=None):
+        self.stt = stt
+        self.clock = clock or SystemClock()
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending = collections.deque()  # [(分组键, 音频, Future, 提交时刻)]
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._thread = threading.Thread(target=self._batch_loop, name="whisper-batch", daemon=True)
+        self._thread.start()
+
+    def _group_key(self, audio: np.ndarray, language: str):
+        windows = max(1, math.ceil(len(audio) / self.stt.sample_rate / WHISPER_WINDOW_SECONDS))
+        return language, windows
+
+    def submit(self, audio: np.ndarray, language: str = None) -> Future:
+        future = Future()
+        with self._cond:
+            if self._shutdown:
+                future.set_exception(RuntimeError("Whisper batch scheduler has been shut down."))
+                return future
+            self._pending.append((self._group_key(audio, language), audio, future, time.monotonic()))
+            self._cond.notify()
+        return future
+
+    def transcribe(self, audio: np.ndarray, language: str = None, timeout=None) -> str:
+        """Synchronous helper: submits and waits for the result."""
+        return self.submit(audio, language).result(timeout)
+
+    def _next_batch(self) -> list:
+        with self._cond:
+            while not self._pending and not self._shutdown:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            key, _, _, submitted = self._pending[0]
+            deadline = submitted + self.max_wait
+            while True:
+                batch = [item for item in self._pending if item[0] == key][:self.max_batch_size]
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.max_batch_size or remaining <= 0 or self._shutdown:
+                    break
+                self._cond.wait(remaining)
+            taken = {id(item) for item in batch}
+            self._pending = collections.deque(item for item in self._pending if id(item) not in taken)
+            return batch
+
+    def _batch_loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            language = batch[0][0][0]
+            started = self.clock.now()
+            try:
+                texts = self.stt.transcribe_batch_whisper([audio for _, audio, _, _ in batch], language=language)
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                finished = self.clock.now()
+                for (_, _, future, _), text in zip(batch, texts):
+                    future.batch_started, future.batch_finished, future.batch_size = started, finished, len(batch)
+                    future.set_result(text)
+
+    def shutdown(self, wait=True, timeout=None):
+        """停止接收新语音段，已排队的语音段仍会被识别完。"""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            self._thread.join(timeout)
+
+
+def _normalize_word(word: str) -> str:
+    return re.sub(r"[^\w]", "", word).lower()
+
+
+class WhisperStreamer:
+    """
+    Whisper 流式识别（LocalAgreement-2）。
+
+    每隔一段时间对滑动窗口内的音频重新解码，连续两次解码结果的最长公共前缀被视为稳定并确认，
+    已确认单词对应的音频随即从窗口中裁掉，下次只解码剩余部分。
+    后端支持直接输入特征时，窗口的 log-mel 特征随音频到达增量计算并缓存，每次重新解码只需补算结尾几帧。
+    """
+
+    def __init__(self, stt: SpeechToText, language: str = None,
+                 max_window_seconds: float = WHISPER_STREAM_MAX_WINDOW_SECONDS):
+        self.stt = stt
+        self.language = language
+        self.sample_rate = stt.sample_rate
+        self.max_window_seconds = max_window_seconds
+        self._features = stt.create_feature_cache()
+        self.reset()
+
+    def reset(self):
+        self._audio = np.zeros(0, dtype=np.float32)
+        if self._features is not None:
+            self._features.reset()
+        self._audio_offset = 0.0  # 窗口开头对应的时间（秒，相对于本句开始）
+        self._committed = []  # 本句已确认的单词 [(start, end, word)]
+        self._hypothesis = []  # 上一次解码中尚未确认的单词
+
+    @property
+    def buffered_seconds(self) -> float:
+        return len(self._audio) / self.sample_rate
+
+    @property
+    def committed_text(self) -> str:
+        return "".join(word for _, _, word in self._committed).strip()
+
+    @property
+    def partial_text(self) -> str:
+        return "".join(word for _, _, word in self._committed + self._hypothesis).strip()
+
+    def insert_audio(self, samples: np.ndarray):
+        self._audio = np.concatenate((self._audio, samples))
+        if self._features is not None:
+            self._features.append(samples)
+
+    def process_iter(self) -> str:
+        """解码当前窗口并确认稳定前缀，返回当前的临时文本（已确认 + 未确认）。"""
+        words = self._decode()
+
+        agreed = 0
+        while agreed < min(len(words), len(self._hypothesis)) and \
+                _normalize_word(words[agreed][2]) == _normalize_word(self._hypothesis[agreed][2]):
+            agreed += 1
+        if agreed:
+            self._committed.extend(words[:agreed])
+            self._trim(words[agreed - 1][1])
+        self._hypothesis = words[agreed:]
+
+        if self.buffered_seconds > self.max_window_seconds:
+            # 长时间没有稳定前缀时直接确认整个假设，防止窗口无限增长
+            self._committed.extend(self._hypothesis)
+            self._trim(self._hypothesis[-1][1] if self._hypothesis else self._audio_offset + self.buffered_seconds)
+            self._hypothesis = []
+        return self.partial_text
+
+    def finish(self) -> str:
+        """语句结束：对剩余音频做最后一次解码，返回整句的最终文本并重置状态。"""
+        if self.buffered_seconds >= 0.1:
+            self._committed.extend(self._decode())
+        text = self.committed_text
+        self.reset()
+        return text
+
+    def _decode(self) -> list:
+        if len(self._audio) == 0:
+            return []
+        # 特征缓存最多覆盖一个 30 秒窗口，更长时退回按音频识别
+        features = None
+        if self._features is not None and self.buffered_seconds <= WHISPER_WINDOW_SECONDS:
+            features = self._features.features()
+        words = [(start + self._audio_offset, end + self._audio_offset, word)
+                 for start, end, word in self.stt.transcribe_words_whisper(self._audio, language=self.language,
+                                                                           features=features)]
+        if not self._committed:
+            return words
+
+        # 丢弃落在已确认音频里的单词，以及与已确认结尾重复的 n-gram
+        last_end = self._committed[-1][1]
+        words = [w for w in words if w[0] > last_end - 0.1]
+        if words and words[0][0] - last_end < 1.0:
+            for n in range(min(5, len(words), len(self._committed)), 0, -1):
+                tail = [_normalize_word(w[2]) for w in self._committed[-n:]]
+                head = [_normalize_word(w[2]) for w in words[:n]]
+                if tail == head:
+                    words = words[n:]
+                    break
+        return words
+
+    def _trim(self, until_seconds: float):
+        cut = int((until_seconds - self._audio_offset) * self.sample_rate)
+        cut = max(0, min(cut, len(self._audio)))
+        if self._features is not None:
+            # 按特征帧移对齐裁剪位置，保留的帧才能直接复用
+            cut = self._features.trim(cut)
+        self._audio = self._audio[cut:]
+        self._audio_offset += cut / self.sample_rate
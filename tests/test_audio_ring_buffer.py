@@ -0,0 +1,107 @@
+# tests/test_audio_ring_buffer.py
+import numpy as np
+import pytest
+
+pytest.importorskip("sounddevice")  # audio_io 在导入时加载 sounddevice
+
+from audio_io import AudioRingBuffer
+
+
+def samples(start: int, count: int) -> np.ndarray:
+    return np.arange(start, start + count, dtype=np.int16)
+
+
+def test_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        AudioRingBuffer(0)
+    with pytest.raises(ValueError):
+        AudioRingBuffer(10, "drop_everything")
+
+
+def test_read_in_order_across_wraparound():
+    ring = AudioRingBuffer(10)
+    written = []
+    position = 0
+    for size in [3, 4, 5, 2, 7, 1, 6]:
+        ring.write(samples(position, size))
+        position += size
+        out = ring.read()
+        written.extend(out.tolist())
+    assert written == list(range(position))
+    assert ring.read() is None
+    assert ring.overrun_count == 0
+
+
+def test_read_respects_max_frames():
+    ring = AudioRingBuffer(10)
+    ring.write(samples(0, 8))
+    assert ring.read(max_frames=3).tolist() == [0, 1, 2]
+    assert ring.available() == 5
+    assert ring.read().tolist() == [3, 4, 5, 6, 7]
+
+
+def test_peek_views_split_at_wraparound_and_consume():
+    ring = AudioRingBuffer(10)
+    ring.write(samples(0, 8))
+    ring.read(max_frames=6)
+    ring.write(samples(8, 6))
+    views = ring.peek_views()
+    assert len(views) == 2
+    assert np.concatenate(views).tolist() == list(range(6, 14))
+    ring.consume(5)
+    assert ring.read().tolist() == [11, 12, 13]
+
+
+def test_drop_oldest_skips_overwritten_audio():
+    ring = AudioRingBuffer(10, "drop_oldest")
+    ring.write(samples(0, 8))
+    ring.write(samples(8, 7))
+    assert ring.read().tolist() == list(range(5, 15))
+    assert ring.overrun_count == 1
+    assert ring.dropped_samples == 5
+
+
+def test_drop_oldest_block_larger_than_capacity():
+    ring = AudioRingBuffer(10, "drop_oldest")
+    ring.write(samples(0, 25))
+    assert ring.read().tolist() == list(range(15, 25))
+    assert ring.dropped_samples == 15
+
+
+def test_drop_newest_keeps_unread_audio():
+    ring = AudioRingBuffer(10, "drop_newest")
+    ring.write(samples(0, 8))
+    assert ring.write(samples(8, 5)) == 2
+    assert ring.write(samples(13, 1)) == 0
+    assert ring.read().tolist() == list(range(10))
+    assert ring.overrun_count == 2
+    assert ring.dropped_samples == 4
+
+
+def test_torn_read_drops_samples_overwritten_during_copy():
+    ring = AudioRingBuffer(10, "drop_oldest")
+    ring.write(samples(0, 10))
+    peek_views = ring.peek_views
+
+    def peek_then_write(max_frames=None):
+        # 模拟消费者拿到视图、还没拷贝完时，生产者覆盖了开头 3 个采样
+        views = peek_views(max_frames)
+        ring.write(samples(100, 3))
+        return views
+
+    ring.peek_views = peek_then_write
+    assert ring.read().tolist() == list(range(3, 10))
+    assert ring.dropped_samples == 3
+    del ring.peek_views
+    assert ring.read().tolist() == [100, 101, 102]
+
+
+def test_clear_and_reset():
+    ring = AudioRingBuffer(10, "drop_oldest")
+    ring.write(samples(0, 15))
+    ring.clear()
+    assert ring.available() == 0
+    assert ring.read() is None
+    ring.reset()
+    assert ring.stats() == {"capacity": 10, "available": 0, "overrun_count": 0, "dropped_samples": 0,
+                            "policy": "drop_oldest"}
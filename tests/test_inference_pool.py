@@ -0,0 +1,139 @@
+# tests/test_inference_pool.py
+import random
+import threading
+import time
+
+import pytest
+
+from inference_pool import InferenceExecutor, OrderedResultDispatcher
+
+
+class Collector:
+    def __init__(self):
+        self.results = []
+        self.lock = threading.Lock()
+
+    def __call__(self, seq, result, error):
+        with self.lock:
+            self.results.append((seq, result, error))
+
+
+def test_dispatcher_reorders_and_skips():
+    collector = Collector()
+    dispatcher = OrderedResultDispatcher(collector)
+    dispatcher.deliver(2, "c")
+    dispatcher.deliver(1, "b")
+    assert collector.results == []
+    dispatcher.skip(0)
+    dispatcher.deliver(4, "e")
+    assert collector.results == [(1, "b", None), (2, "c", None)]
+    dispatcher.skip(3)
+    assert collector.results == [(1, "b", None), (2, "c", None), (4, "e", None)]
+
+
+def test_dispatcher_survives_callback_errors():
+    delivered = []
+
+    def on_result(seq, result, error):
+        delivered.append(seq)
+        if seq == 0:
+            raise RuntimeError("render failed")
+
+    dispatcher = OrderedResultDispatcher(on_result)
+    dispatcher.deliver(1, "b")
+    dispatcher.deliver(0, "a")
+    assert delivered == [0, 1]
+
+
+def test_results_arrive_in_submission_order_with_several_workers():
+    collector = Collector()
+    rng = random.Random(0)
+
+    def handler(payload):
+        # 乱序完成
+        time.sleep(rng.random() * 0.01)
+        return payload * 2
+
+    executor = InferenceExecutor(handler, collector, num_workers=4, max_queue_size=100)
+    for i in range(50):
+        executor.submit(i)
+    executor.shutdown(wait=True)
+    assert collector.results == [(i, i * 2, None) for i in range(50)]
+    assert executor.in_flight() == 0
+
+
+def test_handler_errors_are_delivered_in_order():
+    collector = Collector()
+
+    def handler(payload):
+        if payload == 1:
+            raise ValueError("bad segment")
+        return payload
+
+    executor = InferenceExecutor(handler, collector, num_workers=2)
+    for i in range(3):
+        executor.submit(i)
+    executor.shutdown(wait=True)
+    assert [seq for seq, _, _ in collector.results] == [0, 1, 2]
+    _, result, error = collector.results[1]
+    assert result is None and isinstance(error, ValueError)
+
+
+def blocked_executor(collector, **kwargs):
+    """第一个任务阻塞在 gate 上，之后提交的任务只能排队，用于构造队列满的情况。"""
+    gate, started = threading.Event(), threading.Event()
+
+    def handler(payload):
+        if payload == "block":
+            started.set()
+            gate.wait(5)
+        return payload
+
+    executor = InferenceExecutor(handler, collector, num_workers=1, **kwargs)
+    executor.submit("block")
+    assert started.wait(5)
+    return executor, gate
+
+
+def test_drop_oldest_skips_dropped_sequence_numbers():
+    collector = Collector()
+    executor, gate = blocked_executor(collector, max_queue_size=2, overflow_policy="drop_oldest")
+    for payload in ("a", "b", "c", "d"):
+        executor.submit(payload)
+    assert executor.dropped_count == 2
+    gate.set()
+    executor.shutdown(wait=True)
+    # 被丢弃的 a、b 的序号被跳过，其余结果不会一直等待它们
+    assert collector.results == [(0, "block", None), (3, "c", None), (4, "d", None)]
+
+
+def test_merge_combines_into_last_queued_task():
+    collector = Collector()
+    executor, gate = blocked_executor(collector, max_queue_size=2, overflow_policy="merge",
+                                      merge_fn=lambda old, new: old + new)
+    seqs = [executor.submit(payload) for payload in ("a", "b", "c", "d")]
+    assert seqs == [1, 2, 2, 2]
+    assert executor.merged_count == 2
+    gate.set()
+    executor.shutdown(wait=True)
+    assert collector.results == [(0, "block", None), (1, "a", None), (2, "bcd", None)]
+
+
+def test_shutdown_cancel_pending_skips_queued_tasks():
+    collector = Collector()
+    executor, gate = blocked_executor(collector, max_queue_size=4)
+    executor.submit("a")
+    executor.submit("b")
+    executor.shutdown(wait=False, cancel_pending=True)
+    gate.set()
+    executor.shutdown(wait=True)
+    assert collector.results == [(0, "block", None)]
+    with pytest.raises(RuntimeError):
+        executor.submit("c")
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        InferenceExecutor(lambda p: p, Collector(), overflow_policy="drop_everything")
+    with pytest.raises(ValueError):
+        InferenceExecutor(lambda p: p, Collector(), overflow_policy="merge")
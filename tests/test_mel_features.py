@@ -0,0 +1,84 @@
+# tests/test_mel_features.py
+import numpy as np
+import pytest
+
+from mel_features import HOP_LENGTH, N_FFT, N_FRAMES, IncrementalLogMel, log_mel_spectrogram
+
+
+def reference_log_mel(audio: np.ndarray, mel_filters: np.ndarray) -> np.ndarray:
+    """与 WhisperFeatureExtractor 相同的算法：补零到 30 秒后整体 reflect 补齐、做 STFT。"""
+    padded = np.zeros(N_FRAMES * HOP_LENGTH, dtype=np.float64)
+    padded[:len(audio)] = audio
+    padded = np.pad(padded, N_FFT // 2, mode="reflect")
+    window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(N_FFT) / N_FFT)
+    frames = np.lib.stride_tricks.sliding_window_view(padded, N_FFT)[::HOP_LENGTH][:N_FRAMES]
+    power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+    log_mel = np.log10(np.maximum(power @ mel_filters, 1e-10)).T
+    log_mel = np.maximum(log_mel, log_mel.max() - 8.0)
+    return (log_mel + 4.0) / 4.0
+
+
+@pytest.fixture
+def mel_filters():
+    rng = np.random.default_rng(0)
+    return (rng.random((N_FFT // 2 + 1, 80)) * 0.01).astype(np.float32)
+
+
+def ramp_noise(num_samples: int, seed: int = 1) -> np.ndarray:
+    # 音量逐渐增大，归一化用的最大值不会落在开头几帧
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(num_samples) * np.linspace(0.01, 0.5, num_samples)).astype(np.float32)
+
+
+@pytest.mark.parametrize("num_samples", [1, 50, 100, 200, 201, 399, 400, 401, 1000, 16000, 5 * 16000])
+def test_features_match_reference(mel_filters, num_samples):
+    audio = ramp_noise(num_samples)
+    features = IncrementalLogMel(mel_filters)
+    features.append(audio)
+    assert features.features().shape == (80, N_FRAMES)
+    np.testing.assert_allclose(features.features(), reference_log_mel(audio, mel_filters), atol=1e-5)
+
+
+def test_empty_buffer_is_silence(mel_filters):
+    features = IncrementalLogMel(mel_filters).features()
+    np.testing.assert_allclose(features, reference_log_mel(np.zeros(0, dtype=np.float32), mel_filters), atol=1e-5)
+
+
+@pytest.mark.parametrize("chunk_sizes", [(1, 7, 160, 199, 1000), (3200,), (100, 100, 100, 5000)])
+def test_appends_match_one_shot(mel_filters, chunk_sizes):
+    audio = ramp_noise(3 * 16000)
+    features = IncrementalLogMel(mel_filters)
+    position, i = 0, 0
+    while position < len(audio):
+        size = chunk_sizes[i % len(chunk_sizes)]
+        features.append(audio[position:position + size])
+        position += size
+        i += 1
+        # 每次追加后都与一次性计算的结果一致，包括只缓存了部分帧的时候
+        np.testing.assert_allclose(features.features(), log_mel_spectrogram(audio[:position], mel_filters),
+                                   atol=1e-5)
+
+
+def test_trim_reuses_aligned_frames(mel_filters):
+    audio = ramp_noise(4 * 16000)
+    features = IncrementalLogMel(mel_filters)
+    features.append(audio[:2 * 16000])
+    trimmed = features.trim(16000 + 37)
+    assert trimmed == 16000 // HOP_LENGTH * HOP_LENGTH
+    assert features.num_samples == 2 * 16000 - trimmed
+    features.append(audio[2 * 16000:3 * 16000])
+
+    expected = log_mel_spectrogram(audio[trimmed:3 * 16000], mel_filters)
+    # 保留的开头两帧沿用裁剪前的真实上下文（见 IncrementalLogMel.trim），其余各帧与重新计算一致
+    np.testing.assert_allclose(features.features()[:, 2:], expected[:, 2:], atol=1e-5)
+
+
+def test_trim_everything_then_append(mel_filters):
+    audio = ramp_noise(16000)
+    features = IncrementalLogMel(mel_filters)
+    features.append(audio)
+    features.trim(len(audio))
+    assert features.num_samples == len(audio) % HOP_LENGTH
+    features.reset()
+    features.append(audio[:150])
+    np.testing.assert_allclose(features.features(), reference_log_mel(audio[:150], mel_filters), atol=1e-5)
@@ -0,0 +1,80 @@
+# tests/test_resample.py
+import math
+
+import numpy as np
+import pytest
+
+from resample import MIN_RESAMPLER_TAPS, AudioConverter, StreamingResampler, downmix
+
+
+def tone(frequency: float, rate: int, seconds: float = 1.0) -> np.ndarray:
+    t = np.arange(int(rate * seconds)) / rate
+    return np.sin(2 * np.pi * frequency * t).astype(np.float32)
+
+
+def rms_db(samples: np.ndarray) -> float:
+    # 跳过开头滤波器的建立时间
+    samples = samples[len(samples) // 4:]
+    return 20 * math.log10(np.sqrt(np.mean(samples.astype(np.float64) ** 2)) + 1e-12)
+
+
+@pytest.mark.parametrize("src_rate", [48000, 44100, 22050, 8000])
+def test_chunked_matches_one_shot(src_rate):
+    audio = np.random.default_rng(0).standard_normal(src_rate).astype(np.float32)
+    expected = StreamingResampler(src_rate, 16000).process(audio)
+    assert len(expected) == math.ceil(len(audio) * 16000 / src_rate)
+
+    resampler = StreamingResampler(src_rate, 16000)
+    pieces, position = [], 0
+    for size in [1, 7, 441, 480, 1000, 3, 10000] * 10:
+        pieces.append(resampler.process(audio[position:position + size]))
+        position += size
+    pieces.append(resampler.process(audio[position:]))
+    np.testing.assert_allclose(np.concatenate(pieces), expected, atol=1e-5)
+
+
+def test_same_rate_passes_through():
+    audio = np.arange(100, dtype=np.float32)
+    np.testing.assert_array_equal(StreamingResampler(16000, 16000).process(audio), audio)
+
+
+@pytest.mark.parametrize("src_rate", [48000, 44100])
+@pytest.mark.parametrize("taps", [None, MIN_RESAMPLER_TAPS])
+def test_alias_rejection(src_rate, taps):
+    kwargs = {} if taps is None else {"taps_per_phase": taps}
+    # 8 kHz 以上的频率降采样后会混叠回语音频带，包括降质后的最少抽头数在内都要衰减 60 dB 以上
+    for frequency in (9000, 10000, 12000, 15000, 20000):
+        out = StreamingResampler(src_rate, 16000, **kwargs).process(tone(frequency, src_rate))
+        assert rms_db(out) - rms_db(tone(frequency, src_rate)) < -60, frequency
+
+
+@pytest.mark.parametrize("src_rate", [48000, 44100])
+def test_passband_is_flat(src_rate):
+    for frequency in (300, 1000, 3000, 5000):
+        out = StreamingResampler(src_rate, 16000).process(tone(frequency, src_rate))
+        assert abs(rms_db(out) - rms_db(tone(frequency, src_rate))) < 0.1, frequency
+
+
+def test_set_taps_keeps_stream_continuous():
+    audio = tone(440, 48000)
+    resampler = StreamingResampler(48000, 16000)
+    first = resampler.process(audio[:24000])
+    resampler.set_taps(MIN_RESAMPLER_TAPS)
+    second = resampler.process(audio[24000:])
+    # 输出采样数不变、不中断；换滤波器后仍是同一幅度的 440 Hz 正弦（群延迟变化带来的相位差除外）
+    assert len(first) + len(second) == 16000
+    assert abs(rms_db(second) - rms_db(audio)) < 0.1
+
+
+def test_downmix():
+    interleaved = np.array([32767, -32768, 16384, 16384], dtype=np.int16)
+    np.testing.assert_allclose(downmix(interleaved, 2), [-0.5 / 32768, 0.5], atol=1e-6)
+    np.testing.assert_allclose(downmix(interleaved, 1), interleaved / 32768.0)
+
+
+def test_converter_never_reduces_taps_below_floor():
+    converter = AudioConverter(48000, 2, taps_per_phase=4 * MIN_RESAMPLER_TAPS, max_load=1e-9)
+    block = np.zeros(48000 * 2 // 10, dtype=np.int16)
+    for _ in range(50):
+        converter.process(block)
+    assert converter.resampler.taps == MIN_RESAMPLER_TAPS
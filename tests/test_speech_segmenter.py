@@ -0,0 +1,120 @@
+# tests/test_speech_segmenter.py
+import numpy as np
+import pytest
+
+from vad import SpeechSegmenter, VoiceActivityDetector
+
+RATE = 16000
+FRAME = 160  # 10 ms
+
+
+class ScriptedVAD(VoiceActivityDetector):
+    """幅度大于 0.5 的帧判为语音，便于精确构造起止位置。"""
+
+    def __init__(self):
+        super().__init__(sample_rate=RATE, frame_ms=10, min_speech_ms=30, hangover_ms=50, speech_pad_ms=20)
+
+    def _classify_frames(self, frames: np.ndarray) -> np.ndarray:
+        return np.abs(frames).mean(axis=1) > 0.5
+
+
+def pattern(*runs) -> np.ndarray:
+    """runs 为 (是否语音, 帧数)，语音帧的采样值为 1 + 采样序号 * 1e-6，便于核对切出的位置。"""
+    pieces = [np.full(frames * FRAME, 1.0 if speech else 0.0, dtype=np.float32) for speech, frames in runs]
+    audio = np.concatenate(pieces)
+    return audio + np.arange(len(audio), dtype=np.float32) * 1e-6 * (audio > 0)
+
+
+def push_in_chunks(segmenter: SpeechSegmenter, audio: np.ndarray, sizes) -> list:
+    segments, position, i = [], 0, 0
+    while position < len(audio):
+        size = sizes[i % len(sizes)]
+        segments.extend(segmenter.push(audio[position:position + size]))
+        position += size
+        i += 1
+    return segments
+
+
+def test_segment_bounds_include_padding_and_hangover():
+    audio = pattern((False, 10), (True, 10), (False, 20))
+    segments = SpeechSegmenter(ScriptedVAD(), max_segment_samples=10 * RATE).push(audio)
+    assert len(segments) == 1
+    segment = segments[0]
+    # 起点：第 3 个语音帧确认开始说话，回溯到语音开头 (1600) 再向前扩展 20 ms (320)
+    assert segment.start == 1600 - 320
+    # 终点：连续 5 个静音帧确认结束，回到语音结尾 (3200) 再向后扩展 20 ms
+    assert segment.end == 3200 + 320
+    np.testing.assert_array_equal(segment.audio, audio[segment.start:segment.end])
+
+
+def test_short_noise_is_not_speech():
+    audio = pattern((False, 10), (True, 2), (False, 20))
+    segmenter = SpeechSegmenter(ScriptedVAD(), max_segment_samples=10 * RATE)
+    assert segmenter.push(audio) == []
+    assert segmenter.flush() == []
+
+
+@pytest.mark.parametrize("sizes", [(1,), (159, 161), (480,), (7, 1000, 33)])
+def test_chunk_size_does_not_change_segments(sizes):
+    audio = pattern((False, 5), (True, 12), (False, 3), (True, 4), (False, 30), (True, 8), (False, 10))
+    expected = SpeechSegmenter(ScriptedVAD(), max_segment_samples=10 * RATE).push(audio)
+    segments = push_in_chunks(SpeechSegmenter(ScriptedVAD(), max_segment_samples=10 * RATE), audio, sizes)
+    assert [(s.start, s.end) for s in segments] == [(s.start, s.end) for s in expected]
+    for segment, reference in zip(segments, expected):
+        np.testing.assert_array_equal(segment.audio, reference.audio)
+
+
+def test_pause_shorter_than_hangover_keeps_one_segment():
+    audio = pattern((False, 10), (True, 10), (False, 3), (True, 10), (False, 20))
+    segments = SpeechSegmenter(ScriptedVAD(), max_segment_samples=10 * RATE).push(audio)
+    assert len(segments) == 1
+
+
+def test_long_speech_is_cut_at_max_length():
+    max_samples = 20 * FRAME
+    audio = pattern((False, 10), (True, 75), (False, 20))
+    segments = push_in_chunks(SpeechSegmenter(ScriptedVAD(), max_segment_samples=max_samples), audio, (480,))
+    # 强制切分的各段首尾相接、长度不超过上限，合起来覆盖整句
+    assert all(s.num_samples <= max_samples for s in segments)
+    assert all(a.end == b.start for a, b in zip(segments, segments[1:]))
+    assert segments[0].start == 10 * FRAME - 320
+    assert segments[-1].end == 85 * FRAME + 320
+    np.testing.assert_array_equal(np.concatenate([s.audio for s in segments]),
+                                  audio[segments[0].start:segments[-1].end])
+
+
+def test_silence_is_not_buffered():
+    segmenter = SpeechSegmenter(ScriptedVAD(), max_segment_samples=10 * RATE)
+    for _ in range(100):
+        segmenter.push(np.zeros(RATE // 10, dtype=np.float32))
+    lookback = (segmenter.vad.min_speech_frames + 1) * FRAME + segmenter.vad.speech_pad
+    assert segmenter.buffered_samples <= lookback + RATE // 10
+
+
+def test_flush_returns_speech_in_progress_and_resets():
+    audio = pattern((False, 10), (True, 10))
+    segmenter = SpeechSegmenter(ScriptedVAD(), max_segment_samples=10 * RATE)
+    assert segmenter.push(audio) == []
+    segments = segmenter.flush()
+    assert [(s.start, s.end) for s in segments] == [(1600 - 320, 3200)]
+    assert segmenter.buffered_samples == 0
+    assert segmenter.vad.position == 0
+
+
+def test_take_active_audio_streams_the_segment_without_gaps():
+    audio = pattern((False, 10), (True, 30), (False, 20))
+    segmenter = SpeechSegmenter(ScriptedVAD(), max_segment_samples=10 * RATE)
+    taken, segments = [], []
+    for position in range(0, len(audio), 320):
+        segments.extend(segmenter.push(audio[position:position + 320]))
+        if segments:
+            break
+        active = segmenter.take_active_audio()
+        if active is not None:
+            taken.append(active)
+    assert len(segments) == 1
+    streamed = np.concatenate(taken)
+    # 流式取走的音频从语音段起点开始、没有间断；确认结束前已经取到了语音段结尾之后的静音
+    start = segments[0].start
+    np.testing.assert_array_equal(streamed, audio[start:start + len(streamed)])
+    assert segmenter.stream_position == start + len(streamed) >= segments[0].end
@@ -0,0 +1,129 @@
+# translation_cache.py
+# 翻译结果的 LRU 缓存：按 "模型键 (模型路径 + 推理后端，见 MachineTranslator.cache_key) + 规范化原文" 缓存译文，可选持久化到磁盘
+import collections
+import json
+import os
+import re
+import threading
+import unicodedata
+
+from config import MT_CACHE_MAX_ENTRIES, MT_CACHE_MAX_MB, MT_CACHE_PATH
+
+
+def normalize_text(text: str) -> str:
+    """缓存键的规范化：Unicode NFKC、合并空白。保留大小写，大小写不同的原文（专有名词、缩写）译文可能不同。"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class TranslationCache:
+    """
+    线程安全、带内存上限的 LRU 缓存。
+    条目数超过 max_entries 或估算内存超过 max_bytes 时，淘汰最久未使用的条目。
+    """
+
+    def __init__(self, max_entries=MT_CACHE_MAX_ENTRIES, max_mb=MT_CACHE_MAX_MB, path=MT_CACHE_PATH):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.path = path
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.path:
+            self.load()
+
+    @staticmethod
+    def _key(model_key: str, text: str) -> str:
+        return f"{model_key}\n{normalize_text(text)}"
+
+    @staticmethod
+    def _entry_size(key: str, value: str) -> int:
+        # Python str 每个字符最多占 4 字节，再加上对象本身的固定开销
+        return (len(key) + len(value)) * 4 + 200
+
+    def get(self, model_key: str, text: str):
+        key = self._key(model_key, text)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, model_key: str, text: str, translated_text: str):
+        self._put_key(self._key(model_key, text), translated_text)
+
+    def _put_key(self, key: str, value: str):
+        with self._lock:
+            old_value = self._entries.pop(key, None)
+            if old_value is not None:
+                self._bytes -= self._entry_size(key, old_value)
+            self._entries[key] = value
+            self._bytes += self._entry_size(key, value)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                old_key, old_value = self._entries.popitem(last=False)
+                self._bytes -= self._entry_size(old_key, old_value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def load(self):
+        """从磁盘加载缓存（按保存时的 LRU 顺序），文件不存在或损坏时忽略。"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Failed to load translation cache from '{self.path}': {e}")
+            return
+        for key, value in items:
+            self._put_key(key, value)
+        print(f"Loaded {len(self._entries)} cached translations from '{self.path}'.")
+
+    def save(self):
+        """把缓存写入磁盘，先写临时文件再替换，避免中途退出损坏缓存文件。"""
+        if not self.path:
+            return
+        with self._lock:
+            items = list(self._entries.items())
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(items, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Warning: Failed to save translation cache to '{self.path}': {e}")
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_translation_cache() -> TranslationCache:
+    """进程内共享的翻译缓存（键里包含模型名，不同模型之间不会串用）。"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = TranslationCache()
+        return _shared_cache
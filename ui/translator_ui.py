@@ -18,6 +18,8 @@ class TranslatorUI(tk.Tk):
 
         self.is_running = False
         self.last_recognized_text_is_final = True
+        # 翻译区末尾临时译文的起始位置，None 表示当前没有临时译文
+        self.partial_translation_index = None
 
         self._create_widgets()
         self._populate_device_dropdowns()
@@ -174,8 +176,8 @@ class TranslatorUI(tk.Tk):
 
         try:
             self.start_callback(selected_input_device_id, selected_stt_model_name, selected_mt_model_name)
+            # 模型在后台加载，状态栏由回调方根据加载进度更新
             self.is_running = True
-            self.status_label.config(text="状态: 监听中...", fg="blue")
             self.start_button.config(state=tk.DISABLED)
             self.stop_button.config(state=tk.NORMAL)
             self.save_button.config(state=tk.NORMAL)
@@ -251,8 +253,23 @@ class TranslatorUI(tk.Tk):
         self.recognized_text.see(tk.END)
         self.recognized_text.config(state=tk.DISABLED)
 
+    def _remove_partial_translation(self):
+        if self.partial_translation_index is not None:
+            self.translated_text.delete(self.partial_translation_index, tk.END)
+            self.partial_translation_index = None
+
+    def show_partial_translation(self, timestamp, original_text, translated_text):
+        """显示（或替换）末尾的临时译文，最终译文到达时会被移除。"""
+        self.translated_text.config(state=tk.NORMAL)
+        self._remove_partial_translation()
+        self.partial_translation_index = self.translated_text.index("end-1c")
+        self.translated_text.insert(tk.END, f"{timestamp}原文: {original_text} ...\n{timestamp}译文: {translated_text} ...")
+        self.translated_text.see(tk.END)
+        self.translated_text.config(state=tk.DISABLED)
+
     def append_translated_text(self, timestamp, original_text, translated_text):
         self.translated_text.config(state=tk.NORMAL)
+        self._remove_partial_translation()
         content_to_add = f"{timestamp}原文: {original_text}\n{timestamp}译文: {translated_text}\n\n"
         self.translated_text.insert(tk.END, content_to_add)
         self.translated_text.see(tk.END)
@@ -267,6 +284,7 @@ class TranslatorUI(tk.Tk):
         self.translated_text.config(state=tk.NORMAL)
         self.translated_text.delete(1.0, tk.END)
         self.translated_text.config(state=tk.DISABLED)
+        self.partial_translation_index = None
 
     def on_closing(self):
         if self.is_running:
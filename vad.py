@@ -0,0 +1,286 @@
+# vad.py
+# 帧级语音活动检测 (VAD)，以及基于 VAD 起止事件的语音分段
+import collections
+from dataclasses import dataclass
+
+import numpy as np
+
+from config import (SAMPLE_RATE, VAD_BACKEND, VAD_FRAME_MS, VAD_MIN_SPEECH_MS, VAD_HANGOVER_MS,
+                    VAD_SPEECH_PAD_MS, VAD_ENERGY_MARGIN_DB, VAD_MIN_ENERGY_DB, VAD_MAX_SPECTRAL_FLATNESS)
+
+
+@dataclass
+class VadEvent:
+    """语音起止事件。offset 是自 VAD 启动以来的绝对采样位置。"""
+    kind: str  # "start" 或 "end"
+    offset: int
+
+
+@dataclass
+class SpeechSegment:
+    """一段待识别的语音，start/end 为绝对采样位置，audio 为 float32 单声道采样。"""
+    start: int
+    end: int
+    audio: np.ndarray
+
+    @property
+    def num_samples(self) -> int:
+        return self.end - self.start
+
+
+class VoiceActivityDetector:
+    """
+    VAD 基类：把输入切成定长帧，由子类判断每一帧是否为语音，再通过状态机产生起止事件。
+
+    - 连续 min_speech_ms 的语音帧才算开始说话（过滤键盘声等短促噪声）
+    - 连续 hangover_ms 的非语音帧才算结束说话
+    - 起止位置各向外扩展 speech_pad_ms，避免切掉首尾的辅音
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=VAD_FRAME_MS, min_speech_ms=VAD_MIN_SPEECH_MS,
+                 hangover_ms=VAD_HANGOVER_MS, speech_pad_ms=VAD_SPEECH_PAD_MS):
+        self.sample_rate = sample_rate
+        self.frame_length = int(sample_rate * frame_ms / 1000)
+        self.min_speech_frames = max(1, int(round(min_speech_ms / frame_ms)))
+        self.hangover_frames = max(1, int(round(hangover_ms / frame_ms)))
+        self.speech_pad = int(sample_rate * speech_pad_ms / 1000)
+        self.reset()
+
+    def reset(self):
+        self._pending = np.zeros(0, dtype=np.float32)
+        self.position = 0  # 已经送入 VAD 的采样总数
+        self.in_speech = False
+        self._frames_done = 0
+        self._speech_run = 0
+        self._silence_run = 0
+        self._last_end = 0
+
+    def _classify_frames(self, frames: np.ndarray) -> np.ndarray:
+        """frames 形状为 (帧数, 帧长) 的 float32 矩阵，返回每帧是否为语音的布尔数组。"""
+        raise NotImplementedError
+
+    def process(self, samples: np.ndarray) -> list:
+        """送入一段 float32 采样，返回这段音频中产生的 VadEvent 列表。"""
+        self.position += len(samples)
+        data = np.concatenate((self._pending, samples)) if len(self._pending) else samples
+        n_frames = len(data) // self.frame_length
+        self._pending = data[n_frames * self.frame_length:].astype(np.float32, copy=True)
+        if n_frames == 0:
+            return []
+
+        frames = data[:n_frames * self.frame_length].reshape(n_frames, self.frame_length)
+        decisions = self._classify_frames(frames)
+
+        events = []
+        for is_speech in decisions:
+            frame_end = (self._frames_done + 1) * self.frame_length
+            self._frames_done += 1
+            if is_speech:
+                self._speech_run += 1
+                self._silence_run = 0
+                if not self.in_speech and self._speech_run >= self.min_speech_frames:
+                    self.in_speech = True
+                    start = frame_end - self._speech_run * self.frame_length - self.speech_pad
+                    events.append(VadEvent("start", max(start, self._last_end, 0)))
+            else:
+                self._speech_run = 0
+                if self.in_speech:
+                    self._silence_run += 1
+                    if self._silence_run >= self.hangover_frames:
+                        self.in_speech = False
+                        silence = self._silence_run * self.frame_length
+                        end = frame_end - silence + min(self.speech_pad, silence)
+                        self._last_end = end
+                        self._silence_run = 0
+                        events.append(VadEvent("end", end))
+        return events
+
+
+class EnergyVAD(VoiceActivityDetector):
+    """
+    纯 numpy 的能量 + 频谱 VAD，无额外依赖。
+
+    一帧被判为语音需要同时满足：
+      - 能量高于自适应噪声底 VAD_ENERGY_MARGIN_DB，且高于绝对下限 VAD_MIN_ENERGY_DB
+      - 频谱平坦度低于 VAD_MAX_SPECTRAL_FLATNESS（语音有谐波结构，键盘/风扇等宽带噪声接近平坦）
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, margin_db=VAD_ENERGY_MARGIN_DB, min_energy_db=VAD_MIN_ENERGY_DB,
+                 max_flatness=VAD_MAX_SPECTRAL_FLATNESS, **kwargs):
+        self.margin_db = margin_db
+        self.min_energy_db = min_energy_db
+        self.max_flatness = max_flatness
+        super().__init__(sample_rate=sample_rate, **kwargs)
+        self._window = np.hanning(self.frame_length).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.frame_length, d=1.0 / sample_rate)
+        self._band = (freqs >= 100) & (freqs <= 4000)
+
+    def reset(self):
+        super().reset()
+        self._noise_floor_db = None
+
+    def _classify_frames(self, frames: np.ndarray) -> np.ndarray:
+        energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1))[:, self._band] ** 2 + 1e-12
+        flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+        decisions = np.zeros(len(frames), dtype=bool)
+        for i, frame_db in enumerate(energy_db):
+            if self._noise_floor_db is None:
+                # 不能用第一帧初始化噪声底：音频可能一开始就是语音。从绝对下限开始，遇到更安静的帧会立即下调
+                self._noise_floor_db = self.min_energy_db - self.margin_db
+            threshold = max(self._noise_floor_db + self.margin_db, self.min_energy_db)
+            decisions[i] = frame_db > threshold and flatness[i] < self.max_flatness
+            # 噪声底：遇到更安静的帧立即下降，否则缓慢上升，以跟踪环境噪声的变化
+            if frame_db < self._noise_floor_db:
+                self._noise_floor_db = frame_db
+            elif not decisions[i]:
+                self._noise_floor_db += (frame_db - self._noise_floor_db) * 0.05
+            else:
+                self._noise_floor_db += 0.01
+        return decisions
+
+
+class WebRtcVAD(VoiceActivityDetector):
+    """基于 webrtcvad 包的 VAD（需 pip install webrtcvad）。帧长只能是 10/20/30 ms。"""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, aggressiveness=2, **kwargs):
+        try:
+            import webrtcvad
+        except ImportError:
+            raise Exception("VAD backend 'webrtc' requires the 'webrtcvad' package: pip install webrtcvad")
+        super().__init__(sample_rate=sample_rate, **kwargs)
+        self._vad = webrtcvad.Vad(aggressiveness)
+
+    def _classify_frames(self, frames: np.ndarray) -> np.ndarray:
+        pcm = (np.clip(frames, -1.0, 1.0) * 32767).astype(np.int16)
+        return np.array([self._vad.is_speech(frame.tobytes(), self.sample_rate) for frame in pcm], dtype=bool)
+
+
+class SileroVAD(VoiceActivityDetector):
+    """基于 Silero VAD 模型（需 pip install silero-vad）。16 kHz 下帧长固定为 512 采样。"""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, threshold=0.5, **kwargs):
+        try:
+            import torch
+            from silero_vad import load_silero_vad
+        except ImportError:
+            raise Exception("VAD backend 'silero' requires the 'silero-vad' package: pip install silero-vad")
+        kwargs["frame_ms"] = 512 * 1000 / sample_rate
+        super().__init__(sample_rate=sample_rate, **kwargs)
+        self._torch = torch
+        self._model = load_silero_vad()
+        self.threshold = threshold
+
+    def reset(self):
+        super().reset()
+        if hasattr(self, "_model"):
+            self._model.reset_states()
+
+    def _classify_frames(self, frames: np.ndarray) -> np.ndarray:
+        with self._torch.no_grad():
+            probs = [float(self._model(self._torch.from_numpy(frame.copy()), self.sample_rate)) for frame in frames]
+        return np.array(probs) >= self.threshold
+
+
+VAD_BACKENDS = {
+    "energy": EnergyVAD,
+    "webrtc": WebRtcVAD,
+    "silero": SileroVAD,
+}
+
+
+def create_vad(backend: str = VAD_BACKEND, sample_rate=SAMPLE_RATE, **kwargs) -> VoiceActivityDetector:
+    vad_cls = VAD_BACKENDS.get(backend)
+    if vad_cls is None:
+        raise Exception(f"Unknown VAD backend: {backend}. Available: {', '.join(VAD_BACKENDS)}")
+    return vad_cls(sample_rate=sample_rate, **kwargs)
+
+
+class SpeechSegmenter:
+    """
+    根据 VAD 起止事件把连续音频切成 SpeechSegment。
+    说话时间超过 max_segment_samples 时强制切一刀，避免单段过长；非语音部分的音频会被及时丢弃。
+    """
+
+    def __init__(self, vad: VoiceActivityDetector, max_segment_samples: int):
+        self.vad = vad
+        self.max_segment_samples = int(max_segment_samples)
+        self._chunks = collections.deque()  # [(起始绝对位置, float32 数组)]
+        self._segment_start = None
+        # 流式识别已经通过 take_active_audio() 取走的音频位置
+        self.stream_position = 0
+
+    @property
+    def buffered_samples(self) -> int:
+        # 缓冲的音频块是连续的，用首尾位置相减即可，不必每次遍历所有块
+        return self.vad.position - self._chunks[0][0] if self._chunks else 0
+
+    def push(self, samples: np.ndarray) -> list:
+        """送入 float32 采样，返回已完成的语音段列表。"""
+        offset = self.vad.position
+        self._chunks.append((offset, samples))
+        segments = []
+        for event in self.vad.process(samples):
+            if event.kind == "start":
+                self._segment_start = event.offset
+            elif self._segment_start is not None:
+                segments.extend(self._cut(self._segment_start, event.offset))
+                self._segment_start = None
+
+        if self._segment_start is not None:
+            while self.vad.position - self._segment_start >= self.max_segment_samples:
+                end = self._segment_start + self.max_segment_samples
+                segments.extend(self._cut(self._segment_start, end))
+                self._segment_start = end
+        else:
+            # 不在说话时，只保留起始事件可能回溯到的那一小段音频
+            lookback = (self.vad.min_speech_frames + 1) * self.vad.frame_length + self.vad.speech_pad
+            self._drop_before(self.vad.position - lookback)
+        return segments
+
+    def take_active_audio(self):
+        """
+        返回当前仍在进行中的语音段里尚未取走的音频，供流式识别边说边解码；不在说话时返回 None。
+        语音段结束后，push() 返回的完整语音段中 stream_position 之后的部分就是还没取走的尾巴。
+        """
+        if self._segment_start is None:
+            return None
+        start = max(self._segment_start, self.stream_position)
+        audio = self._slice(start, self.vad.position)
+        self.stream_position = self.vad.position
+        return audio
+
+    def flush(self) -> list:
+        """音频流结束时调用，输出仍在进行中的语音段。"""
+        segments = []
+        if self._segment_start is not None:
+            segments = self._cut(self._segment_start, self.vad.position)
+            self._segment_start = None
+        self._chunks.clear()
+        self.stream_position = 0
+        self.vad.reset()
+        return segments
+
+    def _slice(self, start: int, end: int):
+        pieces = []
+        for chunk_start, chunk in self._chunks:
+            chunk_end = chunk_start + len(chunk)
+            if chunk_end <= start or chunk_start >= end:
+                continue
+            pieces.append(chunk[max(start - chunk_start, 0):min(end, chunk_end) - chunk_start])
+        if not pieces:
+            return None
+        return np.concatenate(pieces) if len(pieces) > 1 else pieces[0]
+
+    def _cut(self, start: int, end: int) -> list:
+        audio = self._slice(start, end)
+        self._drop_before(end)
+        if audio is None:
+            return []
+        return [SpeechSegment(start, end, audio)]
+
+    def _drop_before(self, position: int):
+        while self._chunks and self._chunks[0][0] + len(self._chunks[0][1]) <= position:
+            self._chunks.popleft()
@@ -0,0 +1,224 @@
+# whisper_backends.py
+# Whisper 推理后端：transformers pipeline (fp32)、torch 动态 int8 量化、faster-whisper (CTranslate2 int8)
+import os
+
+import numpy as np
+import torch
+
+from config import WHISPER_DEFAULT_BACKEND, SAMPLE_RATE
+from download_manager import converted_model_path, load_torch_int8_model
+from mel_features import log_mel_spectrogram
+
+# Whisper 的输入窗口长度：短于 30 秒的音频会被补齐到 30 秒，更长的音频按窗口切分
+WHISPER_WINDOW_SECONDS = 30
+
+
+class WhisperBackend:
+    """
+    Whisper 后端接口。输入均为 16 kHz 单声道 float32 音频，
+    transcribe() 返回整段文本，transcribe_batch() 一次识别多段音频并按顺序返回各自的文本，
+    transcribe_words() 返回 [(开始秒, 结束秒, 单词)]。
+    supports_features 为 True 的后端还接受预先计算好的 log-mel 特征（见 mel_features.py），
+    流式识别据此复用重叠窗口的特征，不必每次从音频重新计算。
+    """
+    name = None
+    supports_features = False
+
+    def __init__(self, model_path: str, device: str):
+        self.model_path = model_path
+        self.device = device
+
+    def load(self):
+        raise NotImplementedError
+
+    def transcribe(self, audio_data: np.ndarray, language: str = None) -> str:
+        raise NotImplementedError
+
+    def transcribe_batch(self, audios: list, language: str = None) -> list:
+        """默认逐段识别；支持批量推理的后端重写此方法。"""
+        return [self.transcribe(audio, language=language) for audio in audios]
+
+    def transcribe_words(self, audio_data: np.ndarray, language: str = None) -> list:
+        raise NotImplementedError
+
+    @property
+    def mel_filters(self) -> np.ndarray:
+        """(1 + n_fft / 2, n_mels) 的 mel 滤波器组，只有 supports_features 的后端提供。"""
+        raise NotImplementedError
+
+    def transcribe_words_features(self, features: np.ndarray, duration: float, language: str = None) -> list:
+        """与 transcribe_words() 相同，输入为一个窗口 (n_mels, 3000) 的特征，duration 为其中实际音频的秒数。"""
+        raise NotImplementedError
+
+    def unload(self):
+        pass
+
+
+class TransformersWhisperBackend(WhisperBackend):
+    """
+    transformers 路径。不超过一个窗口的音频自己计算 log-mel 特征后直接调用 model.generate()，
+    更长的音频、以及没有预先计算特征的逐词时间戳识别，仍交给 pipeline("automatic-speech-recognition")。
+    """
+    name = "transformers"
+    supports_features = True
+
+    def __init__(self, model_path: str, device: str):
+        super().__init__(model_path, device)
+        self.pipe = None
+
+    def load(self):
+        from transformers import pipeline
+
+        self.pipe = pipeline(
+            "automatic-speech-recognition",
+            model=self._load_model(),
+            tokenizer=self.model_path,
+            feature_extractor=self.model_path,
+            chunk_length_s=WHISPER_WINDOW_SECONDS,
+            device=self.device
+        )
+        self.pipe.model.config.forced_decoder_ids = None
+
+    def _load_model(self):
+        # 直接传路径，由 pipeline 自己加载
+        return self.model_path
+
+    @property
+    def mel_filters(self) -> np.ndarray:
+        return self.pipe.feature_extractor.mel_filters
+
+    def transcribe(self, audio_data: np.ndarray, language: str = None) -> str:
+        if len(audio_data) <= WHISPER_WINDOW_SECONDS * SAMPLE_RATE:
+            return self.transcribe_batch([audio_data], language=language)[0]
+        transcription = self.pipe(audio_data, generate_kwargs={"language": language})
+        return transcription.get('text', "")
+
+    def transcribe_batch(self, audios: list, language: str = None) -> list:
+        if all(len(audio) <= WHISPER_WINDOW_SECONDS * SAMPLE_RATE for audio in audios):
+            # 不超过一个窗口的音频自己计算特征（向量化 STFT），所有音频放进同一批，编码器和解码器各做一次批量前向计算
+            features = [log_mel_spectrogram(audio, self.mel_filters) for audio in audios]
+            sequences = self._generate(features, language)
+            return self.pipe.tokenizer.batch_decode(sequences, skip_special_tokens=True)
+        # 更长的音频交给 pipeline 按 30 秒窗口切分
+        transcriptions = self.pipe(list(audios), batch_size=len(audios), generate_kwargs={"language": language})
+        return [transcription.get("text", "") for transcription in transcriptions]
+
+    def transcribe_words(self, audio_data: np.ndarray, language: str = None) -> list:
+        duration = len(audio_data) / SAMPLE_RATE
+        transcription = self.pipe(audio_data, return_timestamps="word", generate_kwargs={"language": language})
+        words = []
+        for chunk in transcription.get("chunks", []):
+            start, end = chunk.get("timestamp", (None, None))
+            start = 0.0 if start is None else start
+            end = duration if end is None else min(end, duration)
+            words.append((start, end, chunk.get("text", "")))
+        return words
+
+    def transcribe_words_features(self, features: np.ndarray, duration: float, language: str = None) -> list:
+        output = self._generate([features], language, return_token_timestamps=True, return_dict_in_generate=True)
+        tokens = output["sequences"][0].tolist()
+        times = output["token_timestamps"][0].tolist()
+        # 不同 transformers 版本的 sequences 可能去掉了开头的提示 token，两者按结尾对齐
+        n = min(len(tokens), len(times))
+        tokens, times = tokens[len(tokens) - n:], times[len(times) - n:]
+
+        # 第 i 个 token 占 [times[i], times[i + 1]]；特殊 token 与时间戳 token 的 id 都不小于 eos
+        tokenizer = self.pipe.tokenizer
+        groups = []
+        for i, token in enumerate(tokens):
+            if token >= tokenizer.eos_token_id:
+                continue
+            # 字节级 BPE 中以空格（"Ġ"）开头的 token 开始一个新单词
+            if not groups or tokenizer.convert_ids_to_tokens(token).startswith("Ġ"):
+                groups.append([])
+            groups[-1].append(i)
+
+        words = []
+        for indices in groups:
+            start = min(times[indices[0]], duration)
+            end = min(times[indices[-1] + 1] if indices[-1] + 1 < n else duration, duration)
+            words.append((start, max(start, end), tokenizer.decode([tokens[i] for i in indices])))
+        return words
+
+    def _generate(self, features: list, language: str = None, **kwargs):
+        model = self.pipe.model
+        input_features = torch.from_numpy(np.stack(features)).to(model.device, dtype=model.dtype)
+        with torch.inference_mode():
+            return model.generate(input_features=input_features, language=language, **kwargs)
+
+    def unload(self):
+        self.pipe = None
+
+
+class TorchInt8WhisperBackend(TransformersWhisperBackend):
+    """
+    torch 动态量化：Linear 层权重转为 int8，只支持 CPU。
+    量化后的 int8 权重缓存到 models/<模型名>-torch-int8/，之后不再加载 fp32 权重（见 download_manager.load_torch_int8_model）。
+    """
+    name = "torch-int8"
+
+    def __init__(self, model_path: str, device: str):
+        super().__init__(model_path, "cpu")
+
+    def _load_model(self):
+        from transformers import AutoModelForSpeechSeq2Seq
+
+        return load_torch_int8_model(AutoModelForSpeechSeq2Seq, self.model_path, "Whisper model")
+
+
+class FasterWhisperBackend(WhisperBackend):
+    """
+    faster-whisper (CTranslate2) int8 引擎（需 pip install faster-whisper）。
+    首次使用时把本地 transformers 模型转换到 models/<模型名>-ct2-int8/，之后直接加载。
+    """
+    name = "faster-whisper"
+
+    def __init__(self, model_path: str, device: str):
+        super().__init__(model_path, "cuda" if device == "cuda" else "cpu")
+        self.model = None
+
+    def load(self):
+        try:
+            import ctranslate2
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise Exception("Whisper backend 'faster-whisper' requires the 'faster-whisper' package: "
+                            "pip install faster-whisper")
+
+        ct2_path = converted_model_path(self.model_path, "ct2-int8")
+        if not os.path.exists(os.path.join(ct2_path, "model.bin")):
+            print(f"Converting Whisper model '{self.model_path}' to CTranslate2 int8 (one-time step)...")
+            copy_files = [f for f in ("tokenizer.json", "preprocessor_config.json")
+                          if os.path.exists(os.path.join(self.model_path, f))]
+            converter = ctranslate2.converters.TransformersConverter(self.model_path, copy_files=copy_files)
+            converter.convert(ct2_path, quantization="int8", force=True)
+            print(f"Converted model cached at '{ct2_path}'.")
+
+        compute_type = "int8_float16" if self.device == "cuda" else "int8"
+        self.model = WhisperModel(ct2_path, device=self.device, compute_type=compute_type)
+
+    def transcribe(self, audio_data: np.ndarray, language: str = None) -> str:
+        segments, _ = self.model.transcribe(audio_data, language=language, beam_size=5)
+        return "".join(segment.text for segment in segments)
+
+    def transcribe_words(self, audio_data: np.ndarray, language: str = None) -> list:
+        segments, _ = self.model.transcribe(audio_data, language=language, beam_size=5, word_timestamps=True)
+        return [(word.start, word.end, word.word) for segment in segments for word in (segment.words or [])]
+
+    def unload(self):
+        self.model = None
+
+
+WHISPER_BACKENDS = {
+    TransformersWhisperBackend.name: TransformersWhisperBackend,
+    TorchInt8WhisperBackend.name: TorchInt8WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+
+def create_whisper_backend(model_info: dict, device: str) -> WhisperBackend:
+    backend_name = model_info.get("backend", WHISPER_DEFAULT_BACKEND)
+    backend_cls = WHISPER_BACKENDS.get(backend_name)
+    if backend_cls is None:
+        raise Exception(f"Unknown Whisper backend: {backend_name}. Available: {', '.join(WHISPER_BACKENDS)}")
+    return backend_cls(model_info["model_path"], device)